@@ -14,8 +14,11 @@ setup(
 	long_description_content_type="text/markdown",
 	packages=find_packages() + ['systematic_review'],
 	scripts=['./'],
-	python_requires='>=3.6',
+	python_requires='>=3.7',
 	install_requires=open("requirements.txt").readlines(),
+	extras_require={
+		'parquet': ['pyarrow>=2.0.0'],
+	},
 	classifiers=[
 		'Intended Audience :: Developers',
 		'Intended Audience :: Researchers',
@@ -23,6 +26,6 @@ setup(
 		'Operating System :: OS Independent',
 		'Programming Language :: Python',
 		'Programming Language :: Python :: 3',
-		'Programming Language :: Python :: 3.6',
+		'Programming Language :: Python :: 3.7',
 	],
 )
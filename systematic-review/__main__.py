@@ -1,17 +1,28 @@
 import argparse
 import asyncio
+import contextlib
 import logging
 import os
+import urllib.parse
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from dotenv import load_dotenv
 from article import Article
 from cache import SearchCache
-from exporter import CSVExporter
+from dedup import Deduplicator
+from exporter import BibTeXExporter, CSVExporter, ExportPipeline, JSONLExporter, ParquetExporter, RISExporter
+from http_cache import HttpCache
+from http_pool import HttpPool
+from metrics import Metrics
+from rate_limiter import parse_rate
+from replay import Fixtures
 from search import SearchRequest, SearchToken
+from score import SCORES, rank
 from search_engine import SearchEngine
 from search_source import GoogleScholarSearch, IEEESearch, ACMSearch
+from source import Source
+from sqlite_cache import SQLiteSearchCache
 
 
 def parse_args():
@@ -29,7 +40,48 @@ def parse_args():
 
 	# Engine arguments
 	parser.add_argument(
-		'--sleep-between-calls', default=100.0, type=float, help='Time (ms) to sleep between calls'
+		'--sleep-between-calls', default=100.0, type=float,
+		help='Time (ms) between calls for sources without a --rate',
+	)
+	parser.add_argument('--rate', action='append', help='Calls allowed for a source, e.g. ieee=10/s or acm=100/m')
+	parser.add_argument('--rate-burst', action='append', help='Calls a source can burst after being idle, e.g. ieee=20')
+	parser.add_argument(
+		'--max-concurrency', default=8, type=int, help='Maximum number of streams fetching at the same time',
+	)
+	parser.add_argument(
+		'--max-concurrency-per-source', action='append',
+		help='Maximum number of streams fetching at the same time for a source, e.g. ieee=2',
+	)
+	parser.add_argument(
+		'--result-queue-size', default=1000, type=int, help='Maximum number of results waiting to be cached',
+	)
+	parser.add_argument('--http-connections', default=100, type=int, help='Maximum number of open HTTP connections')
+	parser.add_argument(
+		'--http-connections-per-host', default=10, type=int, help='Maximum number of open HTTP connections per host',
+	)
+	parser.add_argument('--http-dns-cache-ttl', default=300, type=int, help='Time (s) to cache DNS resolutions')
+	parser.add_argument(
+		'--http-keepalive-timeout', default=30.0, type=float, help='Time (s) to keep idle HTTP connections open',
+	)
+	parser.add_argument(
+		'--http-cache', default=False, action='store_true',
+		help='Keeps the IEEE and ACM responses on disk and revalidates them instead of downloading them again',
+	)
+	parser.add_argument('--http-cache-directory', help='HTTP cache directory, defaults to <cache file name>.http')
+	parser.add_argument(
+		'--record-fixtures', help='Saves the IEEE and ACM responses in this directory, for replay.py to serve',
+	)
+	parser.add_argument(
+		'--metrics-out',
+		help='Writes the latencies, throughput, errors, retries and dump timings of the crawl to this file',
+	)
+	parser.add_argument(
+		'--metrics-format', choices=['json', 'prometheus'],
+		help='Format of the metrics, defaults to prometheus for .prom and .txt files and json otherwise',
+	)
+	parser.add_argument(
+		'--http-cache-ttl', default=24 * 60 * 60, type=float,
+		help='Time (s) the cached responses are used without revalidation, 0 always revalidates',
 	)
 	parser.add_argument('--list-articles', default=False, help='List the articles found', action="store_true")
 	# Searches
@@ -39,10 +91,28 @@ def parse_args():
 
 	# Cache arguments
 	parser.add_argument(
-		'--cache-save-every', default=10, help='Saves cache every new requests',
+		'--cache-save-every', default=10, type=int, help='Appends the new results to the cache journal every new requests',
+	)
+	parser.add_argument(
+		'--cache-compact-ratio', default=1.0, type=float,
+		help='Rewrites the whole cache once the journal is larger than this share of it, 0 never does',
+	)
+	parser.add_argument(
+		'--cache-backend', default='pickle', choices=['pickle', 'sqlite'],
+		help='Cache storage, sqlite reads only what it needs instead of loading the whole cache',
 	)
 	parser.add_argument('--cache-compress', default=False, help='Compress cache', action="store_true")
-	parser.add_argument('--cache-file-name', default='data/cache.sr', help='Cache file name')
+	parser.add_argument(
+		'--cache-file-name', help='Cache file name, defaults to data/cache.sr, or data/cache.sqlite for sqlite',
+	)
+	parser.add_argument(
+		'--cache-raw', default='store', choices=['store', 'drop', 'inline'],
+		help='Raw source payloads: kept in a blob store loaded on demand, dropped, or kept in the cache',
+	)
+	parser.add_argument('--cache-raw-directory', help='Blob store directory, defaults to <cache file name>.raw')
+	parser.add_argument(
+		'--cache-cursors-file', help='Where each search stream stopped, defaults to <cache file name>.cursors',
+	)
 	parser.add_argument(
 		'--env-file-name', default=Path('..') / '.env', help='Environment file name',
 	)
@@ -51,6 +121,9 @@ def parse_args():
 	parser.add_argument('--cache-searches', default=False, help='Prints searches in the cache', action="store_true")
 	parser.add_argument('--cache-sources', default=False, help='Prints sources in the cache', action="store_true")
 	parser.add_argument('--cache-list', default=False, help='Lists the articles in the cache', action="store_true")
+	parser.add_argument('--cache-find-title', help='Lists the articles in the cache with the title')
+	parser.add_argument('--cache-find-doi', help='Lists the articles in the cache with the DOI')
+	parser.add_argument('--cache-find-author', help='Lists the articles in the cache with the author')
 
 	# Sources
 	parser.add_argument(
@@ -59,27 +132,120 @@ def parse_args():
 	parser.add_argument(
 		'--google-scholar-use-proxy', default=False, help='Google Scholar should use proxy', action="store_true",
 	)
+	parser.add_argument(
+		'--google-scholar-workers', default=4, type=int,
+		help='Threads filling the Google Scholar results, and reading their pages unless'
+		' --max-concurrency-per-source sets a limit for GoogleScholar',
+	)
+	parser.add_argument(
+		'--google-scholar-queue-size', default=10, type=int,
+		help='Google Scholar results a thread can get ahead of the search',
+	)
 	parser.add_argument(
 		'--source-ieee', default=False, help='Use IEEE as source (Requires API key)', action="store_true",
 	)
+	parser.add_argument('--ieee-base-url', help='IEEE API address, like the one of a replay.py stand-in server')
+	parser.add_argument('--ieee-prefetch-pages', default=4, type=int, help='IEEE pages fetched ahead of the search')
+	parser.add_argument('--ieee-max-retries', default=5, type=int, help='Retries for IEEE quota errors')
+	parser.add_argument(
+		'--ieee-backoff', default=1.0, type=float, help='Time (s) to wait on the first IEEE quota error, doubling after',
+	)
 	parser.add_argument(
 		'--source-acm', default=False, help='Use ACM as source', action="store_true",
 	)
+	parser.add_argument('--acm-base-url', help='ACM address, like the one of a replay.py stand-in server')
+	parser.add_argument('--acm-page-size', default=50, type=int, help='Results per ACM page')
+	parser.add_argument(
+		'--acm-max-concurrent-pages', default=4, type=int, help='ACM pages requested at the same time',
+	)
+	parser.add_argument(
+		'--acm-parser', default='lxml', choices=['lxml', 'html.parser'], help='Parser for the ACM result pages',
+	)
+	parser.add_argument(
+		'--acm-parser-processes', default=0, type=int, help='Processes parsing ACM pages, 0 parses in the event loop',
+	)
+	parser.add_argument(
+		'--acm-references', default=False, action='store_true',
+		help='Collects the references of the ACM papers for the citation graph, one more request per paper',
+	)
 	parser.add_argument(
 		'--ignore-cache', default=False, help='Ignore the cache for the selected sources', action="store_true",
 	)
 
+	# Deduplication
+	parser.add_argument(
+		'--dedup', default=False, help='Merge near duplicate articles when listing or exporting the cache',
+		action="store_true",
+	)
+	parser.add_argument(
+		'--dedup-threshold', default=0.75, type=float, help='Title similarity for two articles to be the same',
+	)
+	parser.add_argument(
+		'--dedup-author-threshold', default=0.3, type=float,
+		help='Author surname overlap for two articles with similar titles to be the same',
+	)
+	parser.add_argument(
+		'--dedup-report', default=False, help='Prints the groups of near duplicate articles in the cache',
+		action="store_true",
+	)
+
 	# Exporters
 	parser.add_argument('--export-csv', help='Filename for the CSV exporter')
+	parser.add_argument(
+		'--export-batch-size', default=1000, type=int, help='Articles written by the exporters at a time',
+	)
+	parser.add_argument(
+		'--export-threads', default=False, help='Each exporter writes in its own thread', action="store_true",
+	)
+	parser.add_argument(
+		'--export-flush-size', default=1 << 16, type=int, help='Characters buffered by the exporters before a write',
+	)
+	parser.add_argument('--export-jsonl', help='Filename for the JSON lines exporter')
+	parser.add_argument('--export-bibtex', help='Filename for the BibTeX exporter')
+	parser.add_argument('--export-ris', help='Filename for the RIS exporter')
+	parser.add_argument('--export-parquet', help='Filename for the Parquet exporter, needs pyarrow')
+	parser.add_argument(
+		'--export-parquet-row-group-size', default=1 << 16, type=int, help='Articles in each Parquet row group',
+	)
+	parser.add_argument(
+		'--export-parquet-compression', default='snappy', choices=['snappy', 'zstd', 'gzip', 'none'],
+		help='Parquet compression codec',
+	)
 
-	# TODO test score
+	# Score
+	parser.add_argument(
+		'--score', default='h_index', choices=sorted(SCORES), help='Score method',
+	)
+	parser.add_argument(
+		'--score-threshold', type=float, help='Lists and exports only the articles with at least this score',
+	)
+	parser.add_argument('--top-k', type=int, help='Lists and exports only the best scored articles, best first')
 	parser.add_argument(
-		'--score', default='h_index', choices=['citations', 'h_index', 'i10_index'],
-		help='Score method',
+		'--rank', choices=sorted(SCORES),
+		help='Lists and exports the articles ranked by this score, e.g. pagerank over the citation graph',
 	)
-	parser.add_argument('--score-threshold', default=0, help='Lower bound for the score')
 
-	return parser.parse_args()
+	args = parser.parse_args()
+	if not args.cache_file_name:
+		args.cache_file_name = 'data/cache.sqlite' if args.cache_backend == 'sqlite' else 'data/cache.sr'
+	return args
+
+
+def use_base_url(source, base_url: str):
+	"""
+	Points an HTTP source at another address, like http://127.0.0.1:8080.
+	"""
+	parts = urllib.parse.urlsplit(base_url)
+	source.protocol = parts.scheme or 'http'
+	source.host = parts.netloc or parts.path
+
+
+def parse_source_values(values: Optional[List[str]], value_type=int) -> Dict[Source, object]:
+	resp = {}
+	for value in values or []:
+		name, _, source_value = value.partition('=')
+		resp[Source.from_name(name)] = value_type(source_value)
+	return resp
 
 
 def article_simple_print(logger: logging.Logger, article: Article):
@@ -90,25 +256,82 @@ def article_simple_print(logger: logging.Logger, article: Article):
 	)
 
 
+def selected_articles(args, engine: SearchEngine) -> Iterable[Tuple[Optional[float], Article]]:
+	"""
+	The unique articles, scored and ranked when there is a rank, a score threshold or a top k.
+	The rank, when given, is the score used.
+	"""
+	articles = engine.cache.unique_articles(engine.deduplicator if args.dedup else None)
+	if args.rank is None and args.score_threshold is None and args.top_k is None:
+		return ((None, it) for it in articles)
+	score = SCORES[args.rank or args.score](engine.cache)
+	return rank(score, articles, threshold=args.score_threshold, top_k=args.top_k)
+
+
 def build_search_engine(logger: logging.Logger, args) -> Optional[SearchEngine]:
 	engine = SearchEngine(logger=logger)
 	engine.save_every = args.cache_save_every
+	engine.compact_ratio = args.cache_compact_ratio
 	engine.compress = args.cache_compress
+	engine.cache_backend = args.cache_backend
 	engine.cache_file_name = args.cache_file_name
+	if args.cache_backend == 'sqlite' and not SQLiteSearchCache.is_database(args.cache_file_name):
+		logger.critical(f"{args.cache_file_name} is not a SQLite cache, choose another --cache-file-name for sqlite")
+		return
+	engine.raw = args.cache_raw
+	engine.raw_directory = args.cache_raw_directory
+	engine.cursors_file_name = args.cache_cursors_file
 	engine.sleep_between_calls_ms = args.sleep_between_calls
+	engine.rates = parse_source_values(args.rate, parse_rate)
+	engine.bursts = parse_source_values(args.rate_burst)
+	engine.max_concurrency = args.max_concurrency
+	engine.max_concurrency_per_source = parse_source_values(args.max_concurrency_per_source)
+	engine.queue_size = args.result_queue_size
+	if args.dedup or args.dedup_report:
+		engine.deduplicator = Deduplicator(threshold=args.dedup_threshold, author_threshold=args.dedup_author_threshold)
+	engine.http_pool = HttpPool(
+		limit=args.http_connections, limit_per_host=args.http_connections_per_host,
+		dns_cache_ttl=args.http_dns_cache_ttl, keepalive_timeout=args.http_keepalive_timeout,
+	)
+	if args.http_cache:
+		engine.http_cache = HttpCache(
+			args.http_cache_directory or f"{args.cache_file_name}.http", ttl_s=args.http_cache_ttl,
+			compress=args.cache_compress,
+		)
+	if args.record_fixtures:
+		engine.fixtures = Fixtures(args.record_fixtures)
+	if args.metrics_out:
+		engine.metrics = Metrics()
 	if args.ignore_cache:
 		engine.ignore_cache = True
 
 	if args.source_google_scholar:
-		engine.sources.append(GoogleScholarSearch(use_proxy=args.google_scholar_use_proxy))
+		engine.sources.append(GoogleScholarSearch(
+			use_proxy=args.google_scholar_use_proxy, workers=args.google_scholar_workers,
+			queue_size=args.google_scholar_queue_size,
+			iterator_workers=engine.max_concurrency_per_source.get(Source.GoogleScholar),
+		))
 	if args.source_ieee:
 		ieee_api_key = os.getenv('IEE_API_KEY')
 		if not ieee_api_key:
 			logger.critical("Application is missing IEEE API key")
 			return
-		engine.sources.append(IEEESearch(api_key=ieee_api_key))
+		ieee = IEEESearch(
+			api_key=ieee_api_key, prefetch_pages=args.ieee_prefetch_pages, max_retries=args.ieee_max_retries,
+			backoff_s=args.ieee_backoff,
+		)
+		if args.ieee_base_url:
+			use_base_url(ieee, args.ieee_base_url)
+		engine.sources.append(ieee)
 	if args.source_acm:
-		engine.sources.append(ACMSearch())
+		acm = ACMSearch(
+			page_size=args.acm_page_size, max_concurrent_pages=args.acm_max_concurrent_pages,
+			parser=args.acm_parser, parser_processes=args.acm_parser_processes,
+			collect_references=args.acm_references,
+		)
+		if args.acm_base_url:
+			use_base_url(acm, args.acm_base_url)
+		engine.sources.append(acm)
 
 	for term in args.term or []:
 		engine.requests.add(SearchRequest(token=SearchToken.Term, value=term))
@@ -134,7 +357,13 @@ async def main():
 	if not engine:
 		return -1
 
-	await engine.run()
+	try:
+		await engine.run()
+	finally:
+		# Also for an interrupted crawl, where it is most useful
+		if engine.metrics is not None:
+			logger.info(f"Writing the metrics to {args.metrics_out}")
+			engine.metrics.write(args.metrics_out, format=args.metrics_format)
 	await generate_output(args, engine, logger)
 
 	if args.compact_cache_file:
@@ -158,27 +387,54 @@ async def generate_output(args, engine: SearchEngine, logger: logging.Logger):
 
 	if args.cache_list:
 		count_unique = 0
-		for article in engine.cache.unique_articles():
+		for score, article in selected_articles(args, engine):
 			count_unique += 1
+			if score is not None:
+				logger.info(f"Score: {score:g}")
 			article_simple_print(logger, article)
 		logger.info(f"{count_unique} unique articles in the cache")
 	logger.info(f"{len(engine.cache)} articles in the cache")
 
 	exporters = [
-		(args.export_csv, CSVExporter(';'))
+		(args.export_csv, lambda: CSVExporter(';', flush_size=args.export_flush_size)),
+		(args.export_parquet, lambda: ParquetExporter(
+			batch_size=args.export_parquet_row_group_size, compression=args.export_parquet_compression,
+			provenance=engine.cache.request_sources,
+		)),
+		(args.export_jsonl, JSONLExporter),
+		(args.export_bibtex, BibTeXExporter),
+		(args.export_ris, RISExporter),
 	]
-	for file_name, exporter in exporters:
-		if file_name:
-			with open(file_name, 'x') as export_csv:
-				# TODO test exporter
-				await exporter.write(export_csv, engine.cache.unique_articles())
-				# async for it in exporter.prefix():
-				# 	export_csv.write(it)
-				# for article in engine.cache.unique_articles():
-				# 	async for it in exporter.content(article):
-				# 		export_csv.write(it)
-				# async for it in exporter.suffix():
-				# 	export_csv.write(it)
+	exporters = [(file_name, create_exporter()) for file_name, create_exporter in exporters if file_name]
+	if exporters:
+		with contextlib.ExitStack() as stack:
+			targets = [
+				(exporter, stack.enter_context(
+					open(file_name, 'xb') if exporter.binary else open(file_name, 'x', newline='', encoding='utf-8')
+				))
+				for file_name, exporter in exporters
+			]
+			pipeline = ExportPipeline(targets, batch_size=args.export_batch_size, threads=args.export_threads)
+			count_exported = pipeline.write(it for _, it in selected_articles(args, engine))
+		logger.info(f"{count_exported} articles exported to {', '.join(it for it, _ in exporters)}")
+
+	if args.cache_find_title or args.cache_find_doi or args.cache_find_author:
+		count_found = 0
+		for article in engine.cache.find_articles(
+				title=args.cache_find_title, doi=args.cache_find_doi, author=args.cache_find_author,
+		):
+			count_found += 1
+			article_simple_print(logger, article)
+		logger.info(f"{count_found} articles found in the cache")
+
+	if args.dedup_report:
+		articles = list(engine.cache.unique_articles())
+		clusters = engine.deduplicator.clusters(articles)
+		for cluster in clusters:
+			logger.info(f"{len(cluster)} duplicates:")
+			for i in cluster:
+				article_simple_print(logger, articles[i])
+		logger.info(f"{len(clusters)} groups with {sum(len(it) for it in clusters)} near duplicate articles in the cache")
 
 	if args.cache_searches:
 		logger.info(f"Searches:")
@@ -0,0 +1,220 @@
+import re
+import urllib.parse
+from bs4 import BeautifulSoup
+from lxml import etree, html
+from typing import Dict, List, Optional, Tuple
+
+
+def find_class(soup, format):
+	tag_name = format[:format.index('.')]
+	if len(tag_name.strip()) > 0:
+		return soup.find_all(tag_name, class_=lambda x: format[format.index('.') + 1:] in (x or ''))
+	else:
+		return soup.find_all(class_=lambda x: format[format.index('.') + 1:] in (x or ''))
+
+
+def class_xpath(format: str, first: bool = False) -> etree.XPath:
+	"""
+	Compiles the `tag.class` format used by `find_class` into an XPath matching the descendants,
+	with the same substring semantics for the class.
+	"""
+	tag_name, class_name = format.split('.', 1)
+	path = f".//{tag_name.strip() or '*'}[contains(@class, '{class_name}')]"
+	return etree.XPath(f"({path})[1]" if first else path)
+
+
+_HITS = class_xpath('span.hitsLength', first=True)
+_BODY = class_xpath('ul.items-results')
+_ITEMS = class_xpath('div.issue-item__content')
+_TITLE = class_xpath('h5.issue-item__title', first=True)
+_ABSTRACT = class_xpath('div.issue-item__abstract', first=True)
+_CITATION = class_xpath('span.citation', first=True)
+_DOWNLOADS = class_xpath('span.metric', first=True)
+_DOI = class_xpath('a.issue-item__doi', first=True)
+_DETAILS = class_xpath('div.issue-item__detail', first=True)
+_YEAR = class_xpath('span.dot-separator', first=True)
+_JOURNAL = class_xpath('span.epub-section__title', first=True)
+_AUTHORS = class_xpath('ul.loa', first=True)
+_FIRST_SPAN = etree.XPath('(.//span)[1]')
+_FIRST_A = etree.XPath('(.//a)[1]')
+_FIRST_P = etree.XPath('(.//p)[1]')
+_LI = etree.XPath('.//li')
+_REFERENCES = class_xpath('li.references__item')
+_REFERENCE_NOTE = class_xpath('span.references__note', first=True)
+_LINKS = etree.XPath('.//a/@href')
+_DOI_PATTERN = re.compile(r'10\.\d{4,9}/[^\s?#&"]+')
+# Authors. Year. Title. Venue
+_CITATION_PATTERN = re.compile(r'^.+?\.\s+(\d{4})[a-z]?\.\s+(.+?[^A-Z])[.?!]\s')
+
+
+def _first(xpath: etree.XPath, element) -> Optional[etree.ElementBase]:
+	if element is None:
+		return None
+	found = xpath(element)
+	return found[0] if found else None
+
+
+def _text_in_span(element) -> Optional[str]:
+	span = _first(_FIRST_SPAN, element)
+	return span.text_content() if span is not None else None
+
+
+def _year(text: Optional[str]) -> Optional[int]:
+	if text and ' ' in text and ',' in text:
+		return int(text[text.index(' ') + 1:text.index(',')])
+	return None
+
+
+def _number(text: Optional[str]) -> Optional[int]:
+	return int(text.replace(',', '')) if text else None
+
+
+def parse_page(page: str) -> Tuple[int, List[Dict]]:
+	"""
+	Parses an ACM search result page with lxml, returning the number of hits and the fields of
+	each paper. Both are plain objects, so it can run in a process pool.
+	"""
+	root = html.fromstring(page)
+	hits = _first(_HITS, root)
+	hits = int(hits.text_content().strip().replace(',', '')) if hits is not None else 0
+
+	papers = []
+	body = _BODY(root)
+	if len(body) != 1:
+		return hits, papers
+	for it in _ITEMS(body[0]):
+		title = _first(_FIRST_A, _first(_FIRST_SPAN, _first(_TITLE, it)))
+		if title is None:
+			continue
+
+		abstract = _first(_FIRST_P, _first(_ABSTRACT, it))
+		details = _first(_DETAILS, it)
+		journal = _first(_JOURNAL, details)
+
+		author = []
+		authors_tag = _first(_AUTHORS, it)
+		for it_author in _LI(authors_tag) if authors_tag is not None else []:
+			name = _first(_FIRST_SPAN, _first(_FIRST_A, it_author))
+			if name is not None:
+				author.append(name.text_content())
+
+		papers.append({
+			'title': title.text_content(),
+			'author': author,
+			'year': _year(_text_in_span(_first(_YEAR, details))),
+			'abstract': abstract.text_content() if abstract is not None else None,
+			'journal': journal.text_content() if journal is not None else None,
+			'citations': _number(_text_in_span(_first(_CITATION, it))),
+			'downloads': _number(_text_in_span(_first(_DOWNLOADS, it))),
+			'doi': _text_in_span(_first(_DOI, it)),
+		})
+	return hits, papers
+
+
+def parse_references(page: str) -> List[Dict]:
+	"""
+	Parses the references of an ACM article page, the title of each one, read from the citation text
+	when it has the usual "Authors. Year. Title. Venue." form, and its DOI when it links to one.
+	"""
+	references = []
+	for it in _REFERENCES(html.fromstring(page)):
+		note = _first(_REFERENCE_NOTE, it)
+		if note is None:
+			continue
+		doi = None
+		for link in _LINKS(note):
+			match = _DOI_PATTERN.search(urllib.parse.unquote(link))
+			if match:
+				doi = match.group(0)
+				break
+		# The note ends with the links, like "Digital Library" and "Google Scholar"
+		text = ' '.join(' '.join(note.xpath('./text()')).split())
+		match = _CITATION_PATTERN.match(text + ' ')
+		references.append({
+			'title': match.group(2) if match else text,
+			'year': int(match.group(1)) if match else None,
+			'doi': doi,
+		})
+	return references
+
+
+def parse_page_soup(page: str) -> Tuple[int, List[Dict]]:
+	"""
+	Parses an ACM search result page with BeautifulSoup's html.parser, slower than `parse_page`.
+	"""
+	def text_in_span(tag_item) -> Optional[str]:
+		try:
+			tag_item = tag_item[0]
+		except KeyError:
+			pass
+		except IndexError:
+			return None
+		if tag_item and tag_item.span:
+			return tag_item.span.get_text()
+		return None
+
+	soup = BeautifulSoup(page, 'html.parser')
+	hits = find_class(soup, 'span.hitsLength')
+	hits = int(hits[0].get_text().strip().replace(',', '')) if hits else 0
+
+	papers = []
+	body = find_class(soup, 'ul.items-results')
+	if not body or len(body) != 1:
+		return hits, papers
+	body = body[0]
+	for it in find_class(body, 'div.issue-item__content'):
+		title = find_class(it, 'h5.issue-item__title')
+		if not title or not title[0].span or not title[0].span.a:
+			continue
+		title = title[0].span.a.get_text()
+
+		abstract = find_class(it, 'div.issue-item__abstract')
+		if abstract and abstract[0].p:
+			abstract = abstract[0].p.get_text()
+		else:
+			abstract = None
+
+		citation = text_in_span(find_class(it, 'span.citation'))
+		downloads = text_in_span(find_class(it, 'span.metric'))
+		doi = text_in_span(find_class(it, 'a.issue-item__doi'))
+		year = None
+		journal = None
+		details = find_class(it, 'div.issue-item__detail')
+		if details:
+			details = details[0]
+			it_year = find_class(details, 'span.dot-separator')
+			if it_year and len(it_year) > 0:
+				it_year = it_year[0]
+				year = text_in_span(it_year)
+				if year and ' ' in year and ',' in year:
+					year = year[year.index(' ') + 1:year.index(',')]
+				else:
+					year = None
+
+			journal = find_class(details, 'span.epub-section__title')
+			journal = journal[0].get_text() if journal else None
+
+		author = []
+		authors_tag = find_class(it, 'ul.loa')
+		if authors_tag:
+			for it_author in authors_tag[0].find_all('li'):
+				if it_author and it_author.a and it_author.a.span:
+					author.append(it_author.a.span.get_text())
+
+		papers.append({
+			'title': title,
+			'author': author,
+			'year': int(year) if year else None,
+			'abstract': abstract,
+			'journal': journal,
+			'citations': _number(citation),
+			'downloads': _number(downloads),
+			'doi': doi,
+		})
+	return hits, papers
+
+
+PARSERS = {
+	'lxml': parse_page,
+	'html.parser': parse_page_soup,
+}
@@ -0,0 +1,45 @@
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from acm_parser import parse_page, parse_page_soup
+
+
+def parse_args():
+	parser = argparse.ArgumentParser(description='ACM parser benchmark')
+	parser.add_argument('--pages', default='data/acm/*.html', help='Glob of saved ACM search result pages')
+	parser.add_argument('--repeat', default=20, type=int, help='Times each page is parsed')
+	parser.add_argument('--processes', default=4, type=int, help='Processes for the process pool run')
+	return parser.parse_args()
+
+
+def timed(name: str, run, pages: int):
+	start = time.perf_counter()
+	run()
+	elapsed = time.perf_counter() - start
+	print(f"{name}: {elapsed:.3f}s, {pages / elapsed:.1f} pages/s")
+	return elapsed
+
+
+def main():
+	args = parse_args()
+	pages = [it.read_text() for it in sorted(Path().glob(args.pages))] * args.repeat
+	if not pages:
+		raise ValueError(f"No page found for {args.pages}")
+	for page in set(pages):
+		if parse_page(page) != parse_page_soup(page):
+			raise AssertionError("The parsers extracted different papers")
+
+	soup = timed('html.parser + find_class', lambda: [parse_page_soup(it) for it in pages], len(pages))
+	lxml = timed('lxml + compiled XPath', lambda: [parse_page(it) for it in pages], len(pages))
+	with ProcessPoolExecutor(max_workers=args.processes) as executor:
+		list(executor.map(parse_page, pages[:args.processes]))
+		pool = timed(
+			f'lxml + compiled XPath, {args.processes} processes',
+			lambda: list(executor.map(parse_page, pages, chunksize=4)), len(pages),
+		)
+	print(f"Speedup: {soup / lxml:.1f}x serial, {soup / pool:.1f}x with processes")
+
+
+if __name__ == '__main__':
+	main()
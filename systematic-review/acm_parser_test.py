@@ -0,0 +1,36 @@
+import unittest
+from pathlib import Path
+from acm_parser import parse_page, parse_page_soup, parse_references
+
+
+class ACMParserTest(unittest.TestCase):
+	def test_same_papers_as_soup(self):
+		for file_name in Path('data/acm').glob('*.html'):
+			page = file_name.read_text()
+			self.assertEqual(parse_page_soup(page), parse_page(page))
+
+	def test_page(self):
+		hits, papers = parse_page(Path('data/acm/search-page-0.html').read_text())
+		self.assertEqual(1234, hits)
+		self.assertEqual(45, len(papers))
+		self.assertEqual(['José da Silva', 'Maria Souza'], papers[0]['author'])
+		self.assertEqual('Proceedings of BFT', papers[0]['journal'])
+		self.assertIsNone(papers[1]['citations'])
+		self.assertIsNone(papers[3]['abstract'])
+
+	def test_empty_page(self):
+		self.assertEqual((0, []), parse_page('<html><body><p>No results</p></body></html>'))
+		self.assertEqual((0, []), parse_page_soup('<html><body><p>No results</p></body></html>'))
+
+	def test_references(self):
+		references = parse_references(Path('data/acm/article-page.html').read_text())
+		self.assertEqual([
+			{'title': 'Practical Byzantine fault tolerance', 'year': 1999, 'doi': '10.5555/296806.296824'},
+			{'title': 'The Byzantine Generals Problem', 'year': 1982, 'doi': '10.1145/357172.357176'},
+			{'title': 'Ethereum white paper, online.', 'year': None, 'doi': None},
+		], references)
+		self.assertEqual([], parse_references('<html><body><p>No references</p></body></html>'))
+
+
+if __name__ == '__main__':
+	unittest.main()
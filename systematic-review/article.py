@@ -1,10 +1,15 @@
 from __future__ import annotations
 import json
 from typing import List, Optional
-from util import format_text, normalize_text, empty_text
+from util import Slotted, format_text, normalize_text, empty_text, intern_text
 
 
-class Article(object):
+class Article(Slotted):
+	__slots__ = (
+		'__title', 'normalized_title', 'author', 'year', 'abstract', 'references', 'journal', 'publisher', 'citations',
+		'doi', 'downloads', 'key_words',
+	)
+
 	def __init__(
 			self, title: str, author: List[str], year: Optional[int] = None, abstract: Optional[str] = None,
 			references: List[Article] = None, journal: Optional[str] = None, publisher: Optional[str] = None,
@@ -14,16 +19,23 @@ class Article(object):
 		self.__title = None
 		self.normalized_title = None
 		self.title = title
-		self.author = [format_text(x) for x in author]
+		self.author = [intern_text(format_text(x)) for x in author]
 		self.year = year
 		self.abstract = format_text(abstract)
 		self.references = references or []
-		self.journal = format_text(journal)
-		self.publisher = format_text(publisher)
+		self.journal = intern_text(format_text(journal))
+		self.publisher = intern_text(format_text(publisher))
 		self.citations = citations
 		self.doi = doi
 		self.downloads = downloads
-		self.key_words = [format_text(x) for x in key_words or []]
+		self.key_words = [intern_text(format_text(x)) for x in key_words or []]
+
+	def _compact(self):
+		self.author = [intern_text(x) for x in self.author or []]
+		self.references = self.references or []
+		self.journal = intern_text(self.journal)
+		self.publisher = intern_text(self.publisher)
+		self.key_words = [intern_text(x) for x in self.key_words or []]
 
 	@property
 	def title(self) -> str:
@@ -35,7 +47,7 @@ class Article(object):
 		self.normalized_title = normalize_text(value)
 
 	def __str__(self) -> str:
-		return json.dumps(self.__dict__)
+		return json.dumps(self.__getstate__())
 
 	def __repr__(self):
 		return self.__str__()
@@ -1,10 +1,12 @@
 from __future__ import annotations
 from typing import Optional, List
 
-from util import normalize_text, format_text, empty_text
+from util import Slotted, normalize_text, format_text, empty_text, intern_text
 
 
-class Author(object):
+class Author(Slotted):
+	__slots__ = ('__name', 'normalized_name', 'affiliation', 'citations', 'interests', 'h_index', 'i10_index')
+
 	def __init__(
 			self, name: str, affiliation: Optional[str], citations: Optional[int], interests: List[str] = None,
 			h_index: Optional[int] = None, i10_index: Optional[int] = None,
@@ -12,20 +14,24 @@ class Author(object):
 		self.__name = None
 		self.normalized_name = None
 		self.name = name
-		self.affiliation = affiliation
+		self.affiliation = intern_text(affiliation)
 		self.citations = citations
-		self.interests = [format_text(x) for x in interests or []]
+		self.interests = [intern_text(format_text(x)) for x in interests or []]
 		self.h_index = h_index
 		self.i10_index = i10_index
 
+	def _compact(self):
+		self.affiliation = intern_text(self.affiliation)
+		self.interests = [intern_text(x) for x in self.interests or []]
+
 	@property
 	def name(self) -> str:
 		return self.__name
 
 	@name.setter
 	def name(self, value: str):
-		self.__name = value
-		self.normalized_name = normalize_text(value)
+		self.__name = intern_text(value)
+		self.normalized_name = intern_text(normalize_text(value))
 
 	def merge(self, other: Author) -> Author:
 		if empty_text(self.affiliation):
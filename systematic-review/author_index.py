@@ -0,0 +1,78 @@
+from __future__ import annotations
+from author import Author
+from typing import Dict, Iterable, List, Optional, Tuple
+from util import normalize_text
+
+# Name particles, not part of the given names
+PARTICLES = frozenset(['da', 'das', 'de', 'del', 'della', 'der', 'di', 'do', 'dos', 'du', 'e', 'la', 'le', 'van', 'von'])
+
+
+def split_name(name: str) -> Tuple[List[str], str]:
+	"""
+	The given names and the surname of a name, as normalized tokens. Short upper case tokens like
+	the JM in "JM Silva" are read as initials.
+	"""
+	tokens = []
+	for it in name.replace('.', ' ').split():
+		if it.isupper() and it.isalpha() and len(it) <= 3 and len(name.split()) > 1:
+			tokens.extend(it.lower())
+		else:
+			tokens.extend(normalize_text(it).split())
+	tokens = [it for it in tokens if it]
+	if not tokens:
+		return [], ''
+	return [it for it in tokens[:-1] if it not in PARTICLES], tokens[-1]
+
+
+def _compatible(given: List[str], other: List[str]) -> bool:
+	"""
+	Each of the given names matches the next names of the other, in order, by the whole name or its initial.
+	"""
+	position = 0
+	for name in given:
+		while position < len(other):
+			candidate = other[position]
+			position += 1
+			if name == candidate or (len(name) == 1 or len(candidate) == 1) and name[0] == candidate[0]:
+				break
+		else:
+			return False
+	return True
+
+
+class AuthorIndex(object):
+	"""
+	Resolves the author names written in the articles to the authors found, built once over the authors.
+	Exact normalized names resolve directly, the others are compared with the authors with the same surname,
+	so "J. Silva" resolves to "Jose da Silva" when no other Silva has a J. Ambiguous names resolve to nothing.
+	"""
+
+	def __init__(self, authors: Iterable[Author]):
+		self.__by_name: Dict[str, Author] = {}
+		self.__by_surname: Dict[str, List[Tuple[List[str], Author]]] = {}
+		self.__resolved: Dict[str, Optional[Author]] = {}
+		for author in authors:
+			self.__by_name[author.normalized_name] = author
+			given, surname = split_name(author.name)
+			if surname:
+				self.__by_surname.setdefault(surname, []).append((given, author))
+
+	def __len__(self) -> int:
+		return len(self.__by_name)
+
+	def resolve(self, name: str) -> Optional[Author]:
+		"""
+		The author with the name, memoized by the name as written.
+		"""
+		if name in self.__resolved:
+			return self.__resolved[name]
+		resp = self.__by_name.get(normalize_text(name))
+		if resp is None:
+			given, surname = split_name(name)
+			candidates = [
+				author for author_given, author in self.__by_surname.get(surname, ())
+				if _compatible(given, author_given) or _compatible(author_given, given)
+			]
+			resp = candidates[0] if len(candidates) == 1 else None
+		self.__resolved[name] = resp
+		return resp
@@ -0,0 +1,54 @@
+import unittest
+from author import Author
+from author_index import AuthorIndex, split_name
+
+
+def author(name: str, h_index: int = None) -> Author:
+	return Author(name=name, affiliation=None, citations=None, h_index=h_index)
+
+
+class SplitNameTest(unittest.TestCase):
+	def test_split_name(self):
+		self.assertEqual((['jose'], 'silva'), split_name("José da Silva"))
+		self.assertEqual((['j'], 'silva'), split_name("J. Silva"))
+		self.assertEqual((['j', 'm'], 'silva'), split_name("JM Silva"))
+		self.assertEqual((['barbara'], 'liskov'), split_name("Barbara Liskov"))
+		self.assertEqual(([], 'liskov'), split_name("Liskov"))
+		self.assertEqual(([], ''), split_name(""))
+
+
+class AuthorIndexTest(unittest.TestCase):
+	def setUp(self):
+		self.silva = author("Jose da Silva")
+		self.maria = author("Maria Souza Silva")
+		self.liskov = author("Barbara Liskov")
+		self.castro = author("Miguel Castro")
+		self.castro_m = author("Manuel Castro")
+		self.index = AuthorIndex([self.silva, self.maria, self.liskov, self.castro, self.castro_m])
+
+	def test_exact(self):
+		self.assertEqual(5, len(self.index))
+		self.assertIs(self.silva, self.index.resolve("José da Silva"))
+		self.assertIs(self.liskov, self.index.resolve("barbara liskov"))
+
+	def test_initials(self):
+		self.assertIs(self.silva, self.index.resolve("J. Silva"))
+		self.assertIs(self.silva, self.index.resolve("Jose Silva"))
+		self.assertIs(self.maria, self.index.resolve("M. S. Silva"))
+		self.assertIs(self.maria, self.index.resolve("Maria Silva"))
+		self.assertIs(self.liskov, self.index.resolve("B. Liskov"))
+		self.assertIs(self.liskov, self.index.resolve("Liskov"))
+
+	def test_no_match(self):
+		self.assertIsNone(self.index.resolve("Antonio Silva"))
+		self.assertIsNone(self.index.resolve("B. Silva"))
+		self.assertIsNone(self.index.resolve("Leslie Lamport"))
+		# Miguel and Manuel Castro
+		self.assertIsNone(self.index.resolve("M. Castro"))
+		self.assertIs(self.castro, self.index.resolve("Miguel Castro"))
+
+	def test_memoized(self):
+		self.assertIs(self.silva, self.index.resolve("J. Silva"))
+		index = AuthorIndex([])
+		self.assertIsNone(index.resolve("J. Silva"))
+		self.assertIsNone(index.resolve("J. Silva"))
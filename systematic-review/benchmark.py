@@ -0,0 +1,216 @@
+import argparse
+import asyncio
+import datetime
+import gc
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from acm_parser import parse_page, parse_page_soup
+from article import Article
+from cache import SearchCache
+from cursor import Cursor
+from exporter import CSVExporter
+from memory_benchmark import generate_cache
+from search import SearchRequest, SearchRequestSource, SearchResponse, SearchToken
+from search_engine import SearchEngine
+from search_source import ACMSearch, SearchSource
+from source import Source
+from util import normalize_text
+
+
+class Benchmark(object):
+	"""
+	Times the runs and keeps the results, the best of `repeat` runs for each one.
+	"""
+
+	def __init__(self, repeat: int = 3):
+		self.repeat = repeat
+		self.results: List[Dict] = []
+
+	def run(
+			self, name: str, size: int, unit: str, run: Callable[[], object], setup: Callable[[], None] = None,
+			count: Optional[int] = None,
+	) -> Dict:
+		"""
+		`size` is the size of the input, `count` how many `unit` a run handles, the size by default.
+		"""
+		count = size if count is None else count
+		times = []
+		for _ in range(self.repeat):
+			if setup:
+				setup()
+			gc.collect()
+			start = time.perf_counter()
+			run()
+			times.append(time.perf_counter() - start)
+		seconds = min(times)
+		result = {
+			'name': name, 'size': size, 'seconds': seconds, 'rate': count / seconds if seconds else None, 'unit': unit,
+		}
+		self.results.append(result)
+		print(f"{name} ({size:,}): {seconds:.4f}s, {result['rate'] or 0:,.0f} {unit}/s")
+		return result
+
+
+class FakeSource(SearchSource):
+	"""
+	Pages of articles after a delay, like an HTTP source with a fast network.
+	"""
+
+	def __init__(self, source: Source, pages: int, page_size: int, delay_s: float):
+		super().__init__()
+		self.__source = source
+		self.pages = pages
+		self.page_size = page_size
+		self.delay_s = delay_s
+
+	def search(self, request: SearchRequest):
+		return self._responses(self.resume(request))
+
+	async def resume(self, request: SearchRequest, position=None):
+		request_source = SearchRequestSource(request=request, source=self.__source)
+		for page in range(self.pages):
+			await asyncio.sleep(self.delay_s)
+			for i in range(page * self.page_size, (page + 1) * self.page_size):
+				yield SearchResponse(
+					request_source=request_source,
+					article=Article(title=f"{self.__source.name} {request.value} {i}", author=["Jose da Silva"]),
+				)
+			yield Cursor({'page': page + 1})
+		yield Cursor(complete=True)
+
+	def source(self) -> Source:
+		return self.__source
+
+
+def benchmark_cache(benchmark: Benchmark, size: int, directory: str):
+	cache = generate_cache(size, journals=max(100, size // 100), authors=size)
+	titles = [it.title for it in cache.articles()]
+	# Without the cache of the normalization, like titles seen for the first time
+	benchmark.run(
+		'normalize_text', size, 'titles', lambda: [normalize_text(it) for it in titles],
+		setup=normalize_text.cache_clear,
+	)
+	benchmark.run('SearchCache.__len__', size, 'calls', lambda: [len(cache) for _ in range(1000)], count=1000)
+	benchmark.run('SearchCache.unique_articles', size, 'articles', lambda: list(cache.unique_articles()))
+	benchmark.run(
+		'CSVExporter.write', size, 'articles', lambda: CSVExporter().write(io.StringIO(), cache.unique_articles()),
+	)
+	for compress in (False, True):
+		file_name = os.path.join(directory, f"cache-{size}.sr")
+		kind = 'bz2' if compress else 'plain'
+		benchmark.run(f"SearchCache.dump {kind}", size, 'responses', lambda: cache.dump(file_name, compress=compress))
+		benchmark.run(
+			f"SearchCache.load {kind}", size, 'responses', lambda: SearchCache.load(file_name, compress=compress),
+		)
+		os.remove(file_name)
+
+
+def benchmark_acm(benchmark: Benchmark, pages: List[str], repeat: int):
+	pages = pages * repeat
+	request = SearchRequest(SearchToken.Term, "bft")
+
+	def papers(parse):
+		return [list(ACMSearch.get_papers(request, parse(it)[1])) for it in pages]
+
+	benchmark.run('find_class + get_papers', len(pages), 'pages', lambda: papers(parse_page_soup))
+	benchmark.run('parse_page + get_papers', len(pages), 'pages', lambda: papers(parse_page))
+
+
+def benchmark_engine(benchmark: Benchmark, directory: str, requests: int, pages: int, page_size: int, delay_s: float):
+	def run():
+		engine = SearchEngine(cache_file_name=os.path.join(directory, 'engine.sr'))
+		engine.cache = SearchCache()
+		engine.compress = False
+		engine.raw = 'drop'
+		engine.sleep_between_calls_ms = None
+		engine.sources = [
+			FakeSource(it, pages, page_size, delay_s) for it in (Source.ACM, Source.IEEE, Source.Scopus)
+		]
+		engine.requests = {SearchRequest(SearchToken.Term, f"term {i}") for i in range(requests)}
+		asyncio.get_event_loop().run_until_complete(engine.run())
+		for it in os.listdir(directory):
+			if it.startswith('engine.sr'):
+				os.remove(os.path.join(directory, it))
+
+	benchmark.run('SearchEngine.run', 3 * requests * pages * page_size, 'responses', run)
+
+
+def revision() -> Optional[str]:
+	try:
+		return subprocess.run(
+			['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+		).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def compare(results: List[Dict], baseline_file_name: str):
+	with open(baseline_file_name) as in_file:
+		baseline = {(it['name'], it['size']): it for it in json.load(in_file)['results']}
+	for it in results:
+		before = baseline.get((it['name'], it['size']))
+		if before:
+			print(f"{it['name']} ({it['size']:,}): {before['seconds'] / it['seconds']:.2f}x the baseline speed")
+
+
+def parse_args():
+	parser = argparse.ArgumentParser(description='Benchmarks of the cache, normalization, parsing, export and engine')
+	parser.add_argument(
+		'--sizes', default='10000,100000', help='Articles in the synthetic caches, e.g. 10000,100000,1000000',
+	)
+	parser.add_argument('--repeat', default=3, type=int, help='Runs of each benchmark, the best is kept')
+	parser.add_argument(
+		'--acm-pages', default='data/acm/search-page-*.html', help='Glob of saved ACM search result pages',
+	)
+	parser.add_argument('--acm-repeat', default=20, type=int, help='Times each ACM page is parsed')
+	parser.add_argument('--engine-requests', default=10, type=int, help='Requests of the engine run, for 3 sources')
+	parser.add_argument('--engine-pages', default=20, type=int, help='Pages of each request in the engine run')
+	parser.add_argument('--engine-page-size', default=50, type=int, help='Results per page in the engine run')
+	parser.add_argument('--engine-delay', default=0.001, type=float, help='Time (s) the mocked sources take per page')
+	parser.add_argument(
+		'--output', help='JSON file for the results, defaults to data/benchmarks/<revision>.json, ignored by git',
+	)
+	parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+	return parser.parse_args()
+
+
+def main():
+	args = parse_args()
+	benchmark = Benchmark(repeat=args.repeat)
+	with tempfile.TemporaryDirectory() as directory:
+		for size in [int(it) for it in args.sizes.split(',') if it]:
+			benchmark_cache(benchmark, size, directory)
+			gc.collect()
+		pages = [it.read_text() for it in sorted(Path().glob(args.acm_pages))]
+		if pages:
+			benchmark_acm(benchmark, pages, args.acm_repeat)
+		benchmark_engine(
+			benchmark, directory, args.engine_requests, args.engine_pages, args.engine_page_size, args.engine_delay,
+		)
+
+	git_revision = revision()
+	output = args.output or os.path.join('data', 'benchmarks', f"{git_revision or 'results'}.json")
+	os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+	with open(output, 'w') as out_file:
+		json.dump({
+			'revision': git_revision,
+			'date': datetime.datetime.now().isoformat(timespec='seconds'),
+			'python': platform.python_version(),
+			'machine': platform.machine(),
+			'repeat': args.repeat,
+			'results': benchmark.results,
+		}, out_file, indent='\t')
+	print(f"Results in {output}")
+	if args.compare:
+		compare(benchmark.results, args.compare)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,46 @@
+import bz2
+import hashlib
+import os
+import pickle
+import tempfile
+
+
+class BlobStore(object):
+	"""
+	Content-addressed store of pickled objects, one file per object named by the SHA-256 of its
+	pickle, so the same payload is only stored once and objects are only read when asked for.
+	"""
+
+	def __init__(self, directory: str, compress: bool = True):
+		self.directory = directory
+		self.compress = compress
+
+	def __str__(self) -> str:
+		return f"{type(self).__name__}({self.directory})"
+
+	def __repr__(self):
+		return self.__str__()
+
+	def __path(self, key: str) -> str:
+		return os.path.join(self.directory, key[:2], key)
+
+	def __contains__(self, key: str) -> bool:
+		return os.path.isfile(self.__path(key))
+
+	def put(self, obj: object) -> str:
+		data = pickle.dumps(obj)
+		key = hashlib.sha256(data).hexdigest()
+		path = self.__path(key)
+		if not os.path.exists(path):
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+			# Written to a temporary file first, so an interrupted write does not leave a broken blob
+			with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as out_file:
+				out_file.write(bz2.compress(data) if self.compress else data)
+			os.replace(out_file.name, path)
+		return key
+
+	def get(self, key: str) -> object:
+		with open(self.__path(key), 'rb') as in_file:
+			data = in_file.read()
+		# Checks the bz2 magic, so a store can be read with either compression setting
+		return pickle.loads(bz2.decompress(data) if data[:3] == b'BZh' else data)
@@ -1,20 +1,72 @@
 from __future__ import annotations
 import bz2
+import copy
+import io
+import os
 import pickle
 import json
 from article import Article
 from author import Author
+from blob_store import BlobStore
+from dedup import Deduplicator
 from search import SearchRequestSource, SearchResponse, SearchRequest
 from source import Source
-from typing import Dict, NoReturn, Set, Union, Iterable, Optional
+from typing import Dict, List, NoReturn, Set, Union, Iterable, Optional, Tuple
 from util import normalize_text
 
 
 class SearchCache(object):
+	"""
+	Search responses by source and request, and the authors found.
+
+	`dump` writes the whole cache, `checkpoint` only appends the changes since the last dump or
+	checkpoint to a journal next to it, `load` reads the dump and replays the journal.
+	"""
+	__state = ('ignore_case', 'data', 'authors')
+
 	def __init__(self, ignore_case: bool = True):
 		self.ignore_case = ignore_case
 		self.data: Dict[Source, Dict[SearchRequest, Set[SearchResponse]]] = {}
 		self.authors: Dict[str, Author] = {}
+		self.__journal: List[Tuple] = []
+		# Where the raw payloads of new responses go, they are dropped if `drop_raw` is set
+		self.blob_store: Optional[BlobStore] = None
+		self.drop_raw = False
+		self.__reindex()
+
+	def __reindex(self):
+		# Kept up to date on every change and rebuilt on load, they are not part of the dump
+		self.__count = 0
+		self.__title_responses: Dict[str, Set[SearchResponse]] = {}
+		self.__unique: Dict[str, Article] = {}
+		for responses_set in self.data.values():
+			for responses in responses_set.values():
+				for resp in responses:
+					self.__index(resp)
+
+	def __index(self, response: SearchResponse):
+		title = response.article.normalized_title
+		self.__count += 1
+		self.__title_responses.setdefault(title, set()).add(response)
+		if title in self.__unique:
+			self.__unique[title].merge(response.article)
+		else:
+			# A copy, so merging does not change the cached responses
+			self.__unique[title] = copy.copy(response.article)
+
+	def __unindex(self, response: SearchResponse):
+		title = response.article.normalized_title
+		self.__count -= 1
+		responses = self.__title_responses[title]
+		responses.discard(response)
+		if not responses:
+			del self.__title_responses[title]
+			del self.__unique[title]
+			return
+		article = None
+		for it in responses:
+			article = article.merge(it.article) if article else copy.copy(it.article)
+		self.__unique[title] = article
 
 	def __contains__(self, item: SearchRequestSource) -> bool:
 		try:
@@ -37,50 +89,181 @@ class SearchCache(object):
 	def __setitem__(self, item: SearchRequestSource, value: SearchResponse) -> NoReturn:
 		if self.ignore_case:
 			item.request.value = item.request.value.lower()
+		self._store_raw(value)
+		if self.__add(item, value):
+			self.__journal.append(('response', item, value))
+
+	def __add(self, item: SearchRequestSource, value: SearchResponse) -> bool:
 		self.data[item.source] = self.data.get(item.source, {})
 		self.data[item.source][item.request] = self.data[item.source].get(item.request, set())
-		self.data[item.source][item.request].add(value)
+		responses = self.data[item.source][item.request]
+		if value in responses:
+			return False
+		responses.add(value)
+		self.__index(value)
+		return True
 
 	def __delitem__(self, key: Union[SearchRequestSource, SearchResponse]) -> NoReturn:
 		if type(key) is SearchRequestSource:
 			if self.ignore_case:
 				key.request.value = key.request.value.lower()
-			self.__check(key)
-			del self.data[key.source][key.request]
 		elif type(key) is SearchResponse:
 			if self.ignore_case:
 				key.request_source.request.value = key.request_source.request.value.lower()
+		self.__remove(key)
+		self.__journal.append(('delete', key))
+
+	def __remove(self, key: Union[SearchRequestSource, SearchResponse]) -> NoReturn:
+		if type(key) is SearchRequestSource:
+			self.__check(key)
+			for it in self.data[key.source][key.request]:
+				self.__unindex(it)
+			del self.data[key.source][key.request]
+		elif type(key) is SearchResponse:
 			self.__check(key.request_source)
 			obj = self.data[key.request_source.source][key.request_source.request]
 			if key not in obj:
 				raise KeyError(f"Request {key} not found")
+			# The stored response, it may hold a different article than the key with the same title
+			stored = next(it for it in obj if it == key)
 			obj.remove(key)
+			self.__unindex(stored)
+
+	def _store_raw(self, response: SearchResponse) -> bool:
+		if response.raw is None or type(response.raw) is object:
+			return False
+		if self.drop_raw:
+			response.raw = None
+			return True
+		if self.blob_store:
+			response.raw_key = self.blob_store.put(response.raw)
+			response.raw = None
+			return True
+		return False
+
+	def move_raw(self) -> int:
+		"""
+		Moves the raw payloads still kept in the cache to the blob store, or drops them, returning how many.
+		"""
+		count = 0
+		for responses_set in self.data.values():
+			for responses in responses_set.values():
+				for resp in responses:
+					if self._store_raw(resp):
+						count += 1
+		return count
+
+	def raw(self, response: SearchResponse) -> object:
+		raw_key = getattr(response, 'raw_key', None)
+		if raw_key and self.blob_store:
+			return self.blob_store.get(raw_key)
+		return response.raw
 
 	def __len__(self) -> int:
-		return sum([
-			sum([
-				len(set_response)
-				for set_response in search_request_response.values()
-			])
-			for search_request_response in self.data.values()
-		])
+		return self.__count
 
 	def dump(self, filename: str, compress: bool = True) -> NoReturn:
 		def get_file():
 			return bz2.BZ2File(filename, 'w') if compress else open(filename, 'wb')
 
 		with get_file() as out_file:
-			pickle.dump(self.__dict__, out_file)
+			pickle.dump({key: self.__dict__[key] for key in SearchCache.__state}, out_file)
+		# The dump has everything, so the journal is not needed anymore
+		journal_file_name = SearchCache.journal_file_name(filename)
+		if os.path.exists(journal_file_name):
+			os.remove(journal_file_name)
+		self.__journal = []
+
+	def checkpoint(self, filename: str, compress: bool = True) -> int:
+		"""
+		Appends the changes since the last dump or checkpoint to the journal, returning how many.
+		"""
+		if not self.__journal:
+			return 0
+		journal_file_name = SearchCache.journal_file_name(filename)
+		with open(journal_file_name, 'ab') as out_file:
+			if compress:
+				# Each checkpoint is a bz2 stream of its own, they are read back as a multi-stream file
+				with bz2.BZ2File(out_file, 'w') as compressed_file:
+					pickle.dump(self.__journal, compressed_file)
+			else:
+				pickle.dump(self.__journal, out_file)
+			out_file.flush()
+			os.fsync(out_file.fileno())
+		count = len(self.__journal)
+		self.__journal = []
+		return count
+
+	@staticmethod
+	def journal_file_name(filename: str) -> str:
+		return f"{filename}.journal"
+
+	@staticmethod
+	def exists(filename: str) -> bool:
+		return os.path.isfile(filename) or os.path.isfile(SearchCache.journal_file_name(filename))
 
 	@staticmethod
 	def load(filename: str, compress: bool = True) -> SearchCache:
-		def get_file():
-			return bz2.BZ2File(filename, 'r') if compress else open(filename, 'rb')
+		def get_file(name: str):
+			return bz2.BZ2File(name, 'r') if compress else open(name, 'rb')
 
-		with get_file() as in_file:
-			resp = SearchCache()
-			resp.__dict__ = pickle.load(in_file, encoding='bytes')
-			return resp
+		resp = SearchCache()
+		if os.path.isfile(filename):
+			with get_file(filename) as in_file:
+				resp.__dict__.update(pickle.load(in_file, encoding='bytes'))
+			resp.__reindex()
+
+		journal_file_name = SearchCache.journal_file_name(filename)
+		if os.path.isfile(journal_file_name):
+			with open(journal_file_name, 'rb') as in_file:
+				data = in_file.read()
+			end = 0
+			for end, records in SearchCache.__journal_frames(data, compress):
+				for record in records:
+					resp.__replay(record)
+			if end < len(data):
+				# A checkpoint interrupted while writing, cut off so the next ones are not appended after it
+				with open(journal_file_name, 'r+b') as out_file:
+					out_file.truncate(end)
+		return resp
+
+	@staticmethod
+	def __journal_frames(data: bytes, compress: bool) -> Iterable[Tuple[int, List[Tuple]]]:
+		"""
+		The records of each checkpoint in the journal with the offset where it ends, up to the first broken one.
+		"""
+		offset = 0
+		in_file = io.BytesIO(data)
+		while offset < len(data):
+			try:
+				if compress:
+					# Each checkpoint is a bz2 stream of its own
+					decompressor = bz2.BZ2Decompressor()
+					frame = decompressor.decompress(memoryview(data)[offset:])
+					if not decompressor.eof:
+						return
+					end = len(data) - len(decompressor.unused_data)
+					records = pickle.loads(frame, encoding='bytes')
+				else:
+					in_file.seek(offset)
+					records = pickle.load(in_file, encoding='bytes')
+					end = in_file.tell()
+			except (EOFError, OSError, pickle.UnpicklingError):
+				return
+			yield end, records
+			offset = end
+
+	def __replay(self, record: Tuple):
+		kind = record[0]
+		if kind == 'response':
+			self.__add(record[1], record[2])
+		elif kind == 'delete':
+			try:
+				self.__remove(record[1])
+			except KeyError:
+				pass
+		elif kind == 'author':
+			self.__add_author(record[1])
 
 	def __str__(self) -> str:
 		return json.dumps(self.__dict__, default=str)
@@ -94,15 +277,33 @@ class SearchCache(object):
 				for resp in responses:
 					yield resp.article
 
-	def unique_articles(self) -> Iterable[Article]:
-		title_article: Dict[str, Article] = {}
-		for it in self.articles():
-			if it.normalized_title not in title_article:
-				title_article[it.normalized_title] = it
-			else:
-				title_article[it.normalized_title].merge(it)
+	def unique_articles(self, deduplicator: Optional[Deduplicator] = None) -> Iterable[Article]:
+		"""
+		One article per normalized title, merging the responses with the same title.
+		With a deduplicator the near duplicates are merged as well.
+		"""
+		articles = list(self.__unique.values())
+		return deduplicator.merge(articles) if deduplicator else articles
 
-		return title_article.values()
+	def request_sources(self, title: str) -> Set[SearchRequestSource]:
+		"""
+		The requests and sources that found the article with the normalized title.
+		"""
+		return {it.request_source for it in self.__title_responses.get(title, ())}
+
+	def find_articles(
+			self, title: Optional[str] = None, doi: Optional[str] = None, author: Optional[str] = None,
+	) -> Iterable[Article]:
+		title = normalize_text(title) if title else None
+		author = normalize_text(author) if author else None
+		for it in self.articles():
+			if title and it.normalized_title != title:
+				continue
+			if doi and it.doi != doi:
+				continue
+			if author and author not in [normalize_text(x) for x in it.author]:
+				continue
+			yield it
 
 	def search_requests(self) -> Set[SearchRequest]:
 		resp = set()
@@ -118,6 +319,10 @@ class SearchCache(object):
 		return resp
 
 	def add_author(self, author: Author):
+		self.__add_author(author)
+		self.__journal.append(('author', author))
+
+	def __add_author(self, author: Author):
 		if author.normalized_name in self.authors:
 			self.authors[author.normalized_name].merge(author)
 		else:
@@ -1,6 +1,14 @@
+import asyncio
+import os
+import tempfile
 import unittest
 from article import Article
+from author import Author
+from blob_store import BlobStore
 from cache import SearchCache
+from fakes import FakePagedSource
+from metrics import Metrics
+from search_engine import SearchEngine
 from search import SearchRequestSource, SearchResponse, SearchRequest, SearchToken
 from source import Source
 
@@ -29,5 +37,163 @@ class CacheTest(unittest.TestCase):
 		self.assertTrue(bft_request_scopus in cache)
 
 
+class CacheIndexTest(unittest.TestCase):
+	def test_unique_articles(self):
+		cache = SearchCache()
+		acm = SearchRequestSource(request=SearchRequest(token=SearchToken.Term, value="BFT"), source=Source.ACM)
+		ieee = SearchRequestSource(request=SearchRequest(token=SearchToken.Term, value="BFT"), source=Source.IEEE)
+		first = SearchResponse(request_source=acm, article=Article(title="New BFT", author=["Jose da Silva"]))
+		second = SearchResponse(
+			request_source=ieee, article=Article(title="New BFT!", author=[], year=2020, doi="10.1/1"),
+		)
+		other = SearchResponse(request_source=ieee, article=Article(title="New dBFT", author=[]))
+		for it in (first, second, other, second):
+			cache[it.request_source] = it
+		self.assertEqual(3, len(cache))
+
+		unique = {it.normalized_title: it for it in cache.unique_articles()}
+		self.assertEqual(2, len(unique))
+		self.assertEqual((2020, "10.1/1", ["Jose da Silva"]), (
+			unique["new bft"].year, unique["new bft"].doi, unique["new bft"].author,
+		))
+		self.assertIsNone(first.article.year)
+		self.assertEqual([], second.article.author)
+
+		del cache[first]
+		self.assertEqual(2, len(cache))
+		self.assertEqual([], {it.normalized_title: it for it in cache.unique_articles()}["new bft"].author)
+		del cache[ieee]
+		self.assertEqual(0, len(cache))
+		self.assertEqual([], list(cache.unique_articles()))
+
+
+class CacheJournalTest(unittest.TestCase):
+	@staticmethod
+	def response(value: str, title: str) -> SearchResponse:
+		request_source = SearchRequestSource(request=SearchRequest(token=SearchToken.Term, value=value), source=Source.ACM)
+		return SearchResponse(request_source=request_source, article=Article(title=title, author=["Jose da Silva"]))
+
+	def check_journal(self, compress: bool):
+		with tempfile.TemporaryDirectory() as directory:
+			file_name = os.path.join(directory, 'cache.sr')
+			cache = SearchCache()
+			first = self.response("BFT", "New BFT")
+			cache[first.request_source] = first
+			cache.dump(file_name, compress=compress)
+
+			second = self.response("BFT", "Newer BFT")
+			cache[second.request_source] = second
+			cache.add_author(Author(name="Jose da Silva", affiliation=None, citations=10))
+			self.assertEqual(2, cache.checkpoint(file_name, compress=compress))
+			self.assertEqual(0, cache.checkpoint(file_name, compress=compress))
+			third = self.response("dBFT", "New dBFT")
+			cache[third.request_source] = third
+			del cache[first]
+			self.assertEqual(2, cache.checkpoint(file_name, compress=compress))
+			self.assertTrue(os.path.exists(SearchCache.journal_file_name(file_name)))
+
+			loaded = SearchCache.load(file_name, compress=compress)
+			self.assertEqual({"Newer BFT", "New dBFT"}, {it.title for it in loaded.articles()})
+			self.assertEqual(10, loaded.find_author("José da Silva").citations)
+
+			loaded.dump(file_name, compress=compress)
+			self.assertFalse(os.path.exists(SearchCache.journal_file_name(file_name)))
+			loaded = SearchCache.load(file_name, compress=compress)
+			self.assertEqual(2, len(loaded))
+
+	def test_journal(self):
+		self.check_journal(compress=False)
+
+	def test_journal_compressed(self):
+		self.check_journal(compress=True)
+
+	def check_interrupted_checkpoint(self, compress: bool):
+		with tempfile.TemporaryDirectory() as directory:
+			file_name = os.path.join(directory, 'cache.sr')
+			cache = SearchCache()
+			first = self.response("BFT", "New BFT")
+			cache[first.request_source] = first
+			cache.checkpoint(file_name, compress=compress)
+			second = self.response("BFT", "Newer BFT")
+			cache[second.request_source] = second
+			cache.checkpoint(file_name, compress=compress)
+			journal_file_name = SearchCache.journal_file_name(file_name)
+			with open(journal_file_name, 'r+b') as journal:
+				journal.truncate(os.path.getsize(journal_file_name) - 10)
+
+			self.assertTrue(SearchCache.exists(file_name))
+			loaded = SearchCache.load(file_name, compress=compress)
+			self.assertEqual(["New BFT"], [it.title for it in loaded.articles()])
+
+			# The broken checkpoint is cut off, the ones after it are read back
+			third = self.response("BFT", "Newest BFT")
+			loaded[third.request_source] = third
+			loaded.checkpoint(file_name, compress=compress)
+			loaded = SearchCache.load(file_name, compress=compress)
+			self.assertEqual({"New BFT", "Newest BFT"}, {it.title for it in loaded.articles()})
+
+	def test_interrupted_checkpoint(self):
+		self.check_interrupted_checkpoint(compress=False)
+
+	def test_interrupted_checkpoint_compressed(self):
+		self.check_interrupted_checkpoint(compress=True)
+
+	def test_compaction_by_journal_size(self):
+		# A full dump only once the journal outgrows the dump, so there are few of them as the cache grows
+		with tempfile.TemporaryDirectory() as directory:
+			engine = SearchEngine(cache_file_name=os.path.join(directory, 'cache.sr'))
+			engine.compress = False
+			engine.save_every = 10
+			engine.sleep_between_calls_ms = None
+			engine.sources.append(FakePagedSource(pages=100))
+			engine.requests = {SearchRequest(SearchToken.Term, "bft")}
+			engine.metrics = Metrics()
+			asyncio.get_event_loop().run_until_complete(engine.run())
+			self.assertEqual(1000, len(SearchCache.load(engine.cache_file_name, compress=False)))
+		dumps = engine.metrics.histogram('cache_dump_seconds', kind='dump').count
+		checkpoints = engine.metrics.histogram('cache_dump_seconds', kind='checkpoint').count
+		self.assertLessEqual(dumps, 10)
+		# The checkpoints every 10 articles, then the last dump
+		self.assertEqual(101, dumps + checkpoints)
+
+
+class CacheRawTest(unittest.TestCase):
+	@staticmethod
+	def response(title: str, raw: object) -> SearchResponse:
+		request_source = SearchRequestSource(request=SearchRequest(token=SearchToken.Term, value="BFT"), source=Source.IEEE)
+		return SearchResponse(request_source=request_source, article=Article(title=title, author=[]), raw=raw)
+
+	def test_blob_store(self):
+		with tempfile.TemporaryDirectory() as directory:
+			file_name = os.path.join(directory, 'cache.sr')
+			cache = SearchCache()
+			cache.blob_store = BlobStore(os.path.join(directory, 'raw'))
+			raw = {'title': 'New BFT', 'authors': {'authors': []}}
+			first = self.response("New BFT", raw)
+			cache[first.request_source] = first
+			second = self.response("Newer BFT", dict(raw))
+			cache[second.request_source] = second
+			self.assertIsNone(first.raw)
+			self.assertEqual(first.raw_key, second.raw_key)
+			self.assertIn(first.raw_key, cache.blob_store)
+			cache.dump(file_name)
+
+			loaded = SearchCache.load(file_name)
+			loaded.blob_store = cache.blob_store
+			for it in loaded[first.request_source]:
+				self.assertIsNone(it.raw)
+				self.assertEqual(raw, loaded.raw(it))
+
+	def test_move_and_drop_raw(self):
+		cache = SearchCache()
+		first = self.response("New BFT", {'title': 'New BFT'})
+		cache[first.request_source] = first
+		self.assertEqual({'title': 'New BFT'}, cache.raw(first))
+		cache.drop_raw = True
+		self.assertEqual(1, cache.move_raw())
+		self.assertEqual(0, cache.move_raw())
+		self.assertIsNone(cache.raw(first))
+
+
 if __name__ == '__main__':
 	unittest.main()
@@ -0,0 +1,139 @@
+from __future__ import annotations
+import numpy as np
+from article import Article
+from dedup import Deduplicator
+from typing import Dict, Iterable, List, Optional, Sequence
+from util import normalize_text
+
+
+class CitationGraph(object):
+	"""
+	Citations between the articles, as CSR adjacency arrays: the articles cited by the article `i`
+	are `indices[indptr[i]:indptr[i + 1]]`. The ids are the positions of the articles.
+	References are matched to the articles by DOI, then by normalized title, the others are dropped.
+	"""
+
+	def __init__(self, articles: Sequence[Article], indptr: np.ndarray, indices: np.ndarray):
+		self.articles = articles
+		self.indptr = indptr
+		self.indices = indices
+		self.__ids: Optional[Dict[str, int]] = None
+		self.__cited_by: Optional[CitationGraph] = None
+
+	@staticmethod
+	def build(articles: Iterable[Article]) -> CitationGraph:
+		articles = list(articles)
+		by_doi: Dict[str, int] = {}
+		by_title: Dict[str, int] = {}
+		for i, article in enumerate(articles):
+			doi = Deduplicator.normalize_doi(article.doi)
+			if doi:
+				by_doi.setdefault(doi, i)
+			if article.normalized_title:
+				by_title.setdefault(article.normalized_title, i)
+
+		counts = np.zeros(len(articles), dtype=np.int64)
+		targets: List[int] = []
+		for i, article in enumerate(articles):
+			cited = set()
+			for reference in article.references or []:
+				j = CitationGraph.__resolve(reference, by_doi, by_title)
+				if j is not None and j != i:
+					cited.add(j)
+			counts[i] = len(cited)
+			targets.extend(sorted(cited))
+
+		indptr = np.zeros(len(articles) + 1, dtype=np.int64)
+		np.cumsum(counts, out=indptr[1:])
+		return CitationGraph(articles, indptr, np.array(targets, dtype=np.int32))
+
+	@staticmethod
+	def __resolve(reference, by_doi: Dict[str, int], by_title: Dict[str, int]) -> Optional[int]:
+		if isinstance(reference, Article):
+			doi = Deduplicator.normalize_doi(reference.doi)
+			title = reference.normalized_title
+		else:
+			doi = Deduplicator.normalize_doi(str(reference))
+			title = normalize_text(str(reference))
+		if doi and doi in by_doi:
+			return by_doi[doi]
+		return by_title.get(title) if title else None
+
+	def __len__(self) -> int:
+		return len(self.indptr) - 1
+
+	@property
+	def edges(self) -> int:
+		return len(self.indices)
+
+	def id(self, title: str) -> Optional[int]:
+		"""
+		The id of the article with the normalized title.
+		"""
+		if self.__ids is None:
+			self.__ids = {}
+			for i, article in enumerate(self.articles):
+				self.__ids.setdefault(article.normalized_title, i)
+		return self.__ids.get(title)
+
+	def cites(self, node: int) -> np.ndarray:
+		return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+	def out_degree(self) -> np.ndarray:
+		return np.diff(self.indptr)
+
+	def in_degree(self) -> np.ndarray:
+		return np.bincount(self.indices, minlength=len(self))
+
+	def sources(self) -> np.ndarray:
+		"""
+		The citing article of each edge.
+		"""
+		return np.repeat(np.arange(len(self), dtype=np.int32), self.out_degree())
+
+	def cited_by(self) -> CitationGraph:
+		"""
+		The transposed graph, the articles citing each article.
+		"""
+		if self.__cited_by is None:
+			order = np.argsort(self.indices, kind='stable')
+			indptr = np.zeros(len(self) + 1, dtype=np.int64)
+			np.cumsum(self.in_degree(), out=indptr[1:])
+			self.__cited_by = CitationGraph(self.articles, indptr, self.sources()[order])
+		return self.__cited_by
+
+	def pagerank(self, damping: float = 0.85, tolerance: float = 1e-8, max_iterations: int = 100) -> np.ndarray:
+		"""
+		PageRank by power iteration, the rank of the articles citing nothing is spread over all of them.
+		"""
+		size = len(self)
+		if not size:
+			return np.zeros(0)
+		sources = self.sources()
+		out_degree = self.out_degree().astype(np.float64)
+		dangling = out_degree == 0
+		inverse_degree = np.divide(1.0, out_degree, out=np.zeros(size), where=~dangling)
+		rank = np.full(size, 1.0 / size)
+		for _ in range(max_iterations):
+			contributions = (rank * inverse_degree)[sources]
+			spread = (1.0 - damping + damping * rank[dangling].sum()) / size
+			new_rank = damping * np.bincount(self.indices, weights=contributions, minlength=size) + spread
+			delta = np.abs(new_rank - rank).sum()
+			rank = new_rank
+			if delta < tolerance:
+				break
+		return rank
+
+	def co_citation(self, node: int) -> np.ndarray:
+		"""
+		How many articles cite each article together with the article `node`.
+		"""
+		citing = self.cited_by().cites(node)
+		starts = self.indptr[citing]
+		counts = self.indptr[citing + 1] - starts
+		# The references of all the citing articles, in one gather
+		offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+		positions = np.repeat(starts - offsets, counts) + np.arange(counts.sum())
+		resp = np.bincount(self.indices[positions], minlength=len(self))
+		resp[node] = 0
+		return resp
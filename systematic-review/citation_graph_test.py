@@ -0,0 +1,73 @@
+import unittest
+import numpy as np
+from article import Article
+from citation_graph import CitationGraph
+
+
+def articles():
+	return [
+		Article(title="New BFT", author=[], doi="10.1145/1", references=[
+			Article(title="Practical Byzantine fault tolerance", author=[], doi="https://doi.org/10.1145/2"),
+			Article(title="The Byzantine Generals Problem", author=[]),
+			Article(title="New BFT", author=[], doi="10.1145/1"),
+			Article(title="Unknown paper", author=[]),
+		]),
+		Article(title="Practical Byzantine Fault Tolerance", author=[], doi="10.1145/2", references=[
+			Article(title="The byzantine generals problem", author=[]),
+		]),
+		Article(title="The Byzantine Generals Problem", author=[]),
+		Article(title="Smart contracts", author=[], references=[
+			"10.1145/2", Article(title="The Byzantine Generals Problem", author=[]),
+		]),
+	]
+
+
+class CitationGraphTest(unittest.TestCase):
+	def setUp(self):
+		self.graph = CitationGraph.build(articles())
+
+	def test_build(self):
+		self.assertEqual(4, len(self.graph))
+		self.assertEqual(5, self.graph.edges)
+		self.assertEqual([0, 2, 3, 3, 5], self.graph.indptr.tolist())
+		self.assertEqual([1, 2, 2, 1, 2], self.graph.indices.tolist())
+		self.assertEqual([1, 2], self.graph.cites(0).tolist())
+		self.assertEqual(2, self.graph.id("the byzantine generals problem"))
+		self.assertIsNone(self.graph.id("unknown paper"))
+
+	def test_degrees(self):
+		self.assertEqual([2, 1, 0, 2], self.graph.out_degree().tolist())
+		self.assertEqual([0, 2, 3, 0], self.graph.in_degree().tolist())
+		cited_by = self.graph.cited_by()
+		self.assertEqual([0, 3], cited_by.cites(1).tolist())
+		self.assertEqual([0, 1, 3], cited_by.cites(2).tolist())
+		self.assertEqual(self.graph.out_degree().tolist(), cited_by.in_degree().tolist())
+
+	def test_pagerank(self):
+		rank = self.graph.pagerank()
+		self.assertAlmostEqual(1.0, rank.sum())
+		self.assertEqual(2, int(np.argmax(rank)))
+		self.assertAlmostEqual(rank[0], rank[3])
+		self.assertEqual(0, len(CitationGraph.build([]).pagerank()))
+
+	def test_pagerank_matches_dense(self):
+		random = np.random.RandomState(1)
+		adjacency = random.rand(40, 40) < 0.1
+		np.fill_diagonal(adjacency, False)
+		indptr = np.concatenate(([0], np.cumsum(adjacency.sum(axis=1))))
+		graph = CitationGraph([None] * 40, indptr, np.nonzero(adjacency)[1])
+		out_degree = adjacency.sum(axis=1, keepdims=True)
+		transition = np.where(out_degree > 0, adjacency / np.maximum(out_degree, 1), 1 / 40).T
+		expected = np.full(40, 1 / 40)
+		for _ in range(1000):
+			expected = 0.85 * transition @ expected + 0.15 / 40
+		np.testing.assert_allclose(expected, graph.pagerank(tolerance=1e-14, max_iterations=1000), atol=1e-12)
+
+	def test_co_citation(self):
+		self.assertEqual([0, 0, 2, 0], self.graph.co_citation(1).tolist())
+		self.assertEqual([0, 2, 0, 0], self.graph.co_citation(2).tolist())
+		self.assertEqual([0, 0, 0, 0], self.graph.co_citation(0).tolist())
+
+
+if __name__ == '__main__':
+	unittest.main()
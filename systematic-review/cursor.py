@@ -0,0 +1,91 @@
+from __future__ import annotations
+import json
+import os
+from search import SearchRequestSource
+from typing import Dict, Optional
+
+
+class Cursor(object):
+	"""
+	Where a search stream is: `complete` once it gave all its results, otherwise `position` tells the
+	source where to go on from. The position is source specific and JSON serializable.
+	Sources yield cursors after the responses they cover, so they reach the engine in the same order.
+	"""
+	__slots__ = ('position', 'complete')
+
+	def __init__(self, position: Optional[Dict] = None, complete: bool = False):
+		self.position = position
+		self.complete = complete
+
+	def __str__(self) -> str:
+		return json.dumps(self.to_json())
+
+	def __repr__(self):
+		return self.__str__()
+
+	def __eq__(self, other):
+		return type(other) is Cursor and self.position == other.position and self.complete == other.complete
+
+	def to_json(self) -> Dict:
+		return {'state': 'complete' if self.complete else 'partial', 'position': self.position}
+
+	@staticmethod
+	def from_json(value: Dict) -> Cursor:
+		return Cursor(position=value.get('position'), complete=value.get('state') == 'complete')
+
+
+class CursorStore(object):
+	"""
+	The cursor of every search stream, kept in a JSON file next to the cache.
+	It is dumped after the cache, so a cursor never covers responses the cache has not saved.
+	With `ignore_case`, like the cache, the requests are matched without regard to case.
+	"""
+
+	def __init__(self, filename: str, ignore_case: bool = True):
+		self.filename = filename
+		self.ignore_case = ignore_case
+		self.cursors: Dict[str, Cursor] = {}
+		# Caches from before the cursors have no file, their streams are taken as complete
+		self.exists = False
+
+	def key(self, request_source: SearchRequestSource) -> str:
+		request = request_source.request
+		return self.__key(f"{request_source.source.name}:{request.token.name}:{request.value}")
+
+	def __key(self, key: str) -> str:
+		if not self.ignore_case:
+			return key
+		source, token, value = key.split(':', 2)
+		return f"{source}:{token}:{value.lower()}"
+
+	def __len__(self) -> int:
+		return len(self.cursors)
+
+	def __getitem__(self, item: SearchRequestSource) -> Optional[Cursor]:
+		return self.cursors.get(self.key(item))
+
+	def __setitem__(self, item: SearchRequestSource, value: Cursor):
+		self.cursors[self.key(item)] = value
+
+	def __delitem__(self, item: SearchRequestSource):
+		self.cursors.pop(self.key(item), None)
+
+	def dump(self):
+		# Written aside and renamed, an interrupted dump keeps the previous cursors
+		temporary_file_name = f"{self.filename}.tmp"
+		with open(temporary_file_name, 'w') as out_file:
+			json.dump({key: it.to_json() for key, it in self.cursors.items()}, out_file, indent='\t', sort_keys=True)
+			out_file.flush()
+			os.fsync(out_file.fileno())
+		os.replace(temporary_file_name, self.filename)
+		self.exists = True
+
+	@staticmethod
+	def load(filename: str, ignore_case: bool = True) -> CursorStore:
+		resp = CursorStore(filename, ignore_case=ignore_case)
+		if os.path.isfile(filename):
+			with open(filename) as in_file:
+				# The keys of older files may keep the case of the request
+				resp.cursors = {resp.__key(key): Cursor.from_json(it) for key, it in json.load(in_file).items()}
+			resp.exists = True
+		return resp
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from cursor import Cursor, CursorStore
+from fakes import FakePagedSource
+from search import SearchRequest, SearchRequestSource, SearchToken
+from search_engine import SearchEngine
+from search_source import SearchSource
+from source import Source
+
+loop = asyncio.get_event_loop()
+asyncio.set_event_loop(loop)
+
+
+class CursorStoreTest(unittest.TestCase):
+	def test_dump_load(self):
+		with tempfile.TemporaryDirectory() as directory:
+			file_name = os.path.join(directory, 'cache.sr.cursors')
+			bft = SearchRequestSource(SearchRequest(SearchToken.Term, "bft"), Source.IEEE)
+			acm = SearchRequestSource(SearchRequest(SearchToken.Term, "bft"), Source.ACM)
+			store = CursorStore.load(file_name)
+			self.assertFalse(store.exists)
+			store[bft] = Cursor({'query': 1, 'start_record': 51})
+			store[acm] = Cursor(complete=True)
+			store.dump()
+
+			loaded = CursorStore.load(file_name)
+			self.assertTrue(loaded.exists)
+			self.assertEqual(2, len(loaded))
+			self.assertEqual(Cursor({'query': 1, 'start_record': 51}), loaded[bft])
+			self.assertTrue(loaded[acm].complete)
+			del loaded[acm]
+			self.assertIsNone(loaded[acm])
+			self.assertFalse(os.path.exists(f"{file_name}.tmp"))
+
+
+class ResumeTest(unittest.TestCase):
+	def engine(self, directory: str, source: SearchSource, values=("bft", "dag")) -> SearchEngine:
+		engine = SearchEngine(cache_file_name=os.path.join(directory, 'cache.sr'))
+		engine.compress = False
+		engine.save_every = 10
+		engine.sleep_between_calls_ms = None
+		engine.sources.append(source)
+		engine.requests = {SearchRequest(SearchToken.Term, it) for it in values}
+		return engine
+
+	def test_resume_after_failure(self):
+		with tempfile.TemporaryDirectory() as directory:
+			source = FakePagedSource(pages=5, fail_after=3)
+			loop.run_until_complete(self.engine(directory, source).run())
+			first_run = list(source.fetched)
+
+			source.fetched = []
+			engine = self.engine(directory, source)
+			loop.run_until_complete(engine.run())
+			# Nothing fetched twice, nothing skipped
+			self.assertEqual([], sorted(set(first_run) & set(source.fetched)))
+			self.assertEqual(
+				sorted((value, page) for value in ("bft", "dag") for page in range(5)), sorted(first_run + source.fetched),
+			)
+			self.assertEqual(100, len(engine.cache))
+
+			source.fetched = []
+			loop.run_until_complete(self.engine(directory, source).run())
+			self.assertEqual([], source.fetched)
+
+	def test_resume_mixed_case(self):
+		# The cache lowers the case of the requests, the cursors of "BFT" must still be found
+		with tempfile.TemporaryDirectory() as directory:
+			source = FakePagedSource(pages=5, fail_after=3)
+			loop.run_until_complete(self.engine(directory, source, values=["BFT"]).run())
+			self.assertEqual([0, 1, 2], [page for _, page in source.fetched])
+
+			source.fetched = []
+			loop.run_until_complete(self.engine(directory, source, values=["BFT"]).run())
+			self.assertEqual([3, 4], [page for _, page in source.fetched])
+
+	def test_cache_without_cursors(self):
+		with tempfile.TemporaryDirectory() as directory:
+			source = FakePagedSource(pages=2)
+			loop.run_until_complete(self.engine(directory, source).run())
+			os.remove(os.path.join(directory, 'cache.sr.cursors'))
+
+			source.fetched = []
+			loop.run_until_complete(self.engine(directory, source).run())
+			self.assertEqual([], source.fetched)
+			self.assertTrue(os.path.exists(os.path.join(directory, 'cache.sr.cursors')))
+
+
+if __name__ == '__main__':
+	unittest.main()
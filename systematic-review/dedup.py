@@ -0,0 +1,174 @@
+from __future__ import annotations
+import copy
+import numpy as np
+from article import Article
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from util import normalize_text
+
+
+class Deduplicator(object):
+	"""
+	Finds articles that are the same publication under slightly different titles.
+
+	Articles are linked when they share a DOI, share a main title (the part before a subtitle),
+	or when MinHash/LSH finds their titles' character shingles similar enough. Title links also
+	require the authors to overlap when both articles have them. Everything is linear in the
+	number of articles, there is no pairwise comparison.
+	"""
+
+	def __init__(
+			self, threshold: float = 0.75, author_threshold: float = 0.3, num_perm: int = 64, bands: int = 16,
+			shingle_size: int = 3, chunk_size: int = 2000, seed: int = 1,
+	):
+		if num_perm % bands:
+			raise ValueError(f"The number of permutations {num_perm} must be a multiple of the bands {bands}")
+		self.threshold = threshold
+		self.author_threshold = author_threshold
+		self.num_perm = num_perm
+		self.bands = bands
+		self.shingle_size = shingle_size
+		self.chunk_size = chunk_size
+		randomizer = np.random.RandomState(seed)
+		# Odd multipliers, so each h -> a * h + b (mod 2 ** 32) is a permutation of the hashes
+		self.__a = randomizer.randint(0, 1 << 31, size=num_perm, dtype=np.int64).astype(np.uint32) * \
+			np.uint32(2) + np.uint32(1)
+		self.__b = randomizer.randint(0, 1 << 32, size=num_perm, dtype=np.int64).astype(np.uint32)
+
+	def __shingles(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+		"""
+		Hashes of the byte shingles of all the texts concatenated, and the number of shingles of each text.
+		"""
+		size = self.shingle_size
+		encoded = [it.encode() for it in texts]
+		# Short texts are padded, so every text that is not empty has at least one shingle
+		encoded = [it + b'\0' * (size - len(it)) if 0 < len(it) < size else it for it in encoded]
+		lengths = np.array([len(it) for it in encoded], dtype=np.int64)
+		data = np.frombuffer(b''.join(encoded), dtype=np.uint8).astype(np.uint32)
+		counts = np.maximum(lengths - size + 1, 0)
+		if not len(data):
+			return np.zeros(0, dtype=np.uint32), counts
+		hashes = np.zeros(len(data) - size + 1, dtype=np.uint32)
+		for i in range(size):
+			# Rotating, so shingles longer than 4 bytes still use every byte
+			hashes = ((hashes << np.uint32(8)) | (hashes >> np.uint32(24))) ^ data[i:len(data) - size + 1 + i]
+		# Only the shingles starting and ending inside the same text
+		starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+		text = np.repeat(np.arange(len(lengths)), lengths)[:len(hashes)]
+		return hashes[np.arange(len(hashes)) - starts[text] <= lengths[text] - size], counts
+
+	def signatures(self, texts: Sequence[str]) -> np.ndarray:
+		"""
+		MinHash signatures of the texts, one row per text. Texts without shingles get all the bits set,
+		so they are never similar to anything.
+		"""
+		resp = np.full((len(texts), self.num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+		for start in range(0, len(texts), self.chunk_size):
+			hashes, counts = self.__shingles(texts[start:start + self.chunk_size])
+			if not len(hashes):
+				continue
+			values = self.__a[:, None] * hashes[None, :] + self.__b[:, None]
+			with_shingles = np.nonzero(counts)[0]
+			offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))[with_shingles]
+			resp[start + with_shingles] = np.minimum.reduceat(values, offsets, axis=1).T
+		return resp
+
+	def __authors_match(self, first: Article, second: Article) -> bool:
+		first = {normalize_text(it).split(' ')[-1] for it in first.author if it and it.strip()}
+		second = {normalize_text(it).split(' ')[-1] for it in second.author if it and it.strip()}
+		if not first or not second:
+			return True
+		return len(first & second) / len(first | second) >= self.author_threshold
+
+	def clusters(self, articles: Sequence[Article]) -> List[List[int]]:
+		"""
+		Groups of indexes of the articles that are the same publication, only groups with duplicates.
+		"""
+		parent = list(range(len(articles)))
+
+		def find(i: int) -> int:
+			while parent[i] != i:
+				parent[i] = parent[parent[i]]
+				i = parent[i]
+			return i
+
+		def union(i: int, j: int):
+			i, j = find(i), find(j)
+			if i != j:
+				parent[max(i, j)] = min(i, j)
+
+		def index(keys: Iterable[Optional[str]], check_authors: bool):
+			first_by_key: Dict[str, int] = {}
+			for i, key in enumerate(keys):
+				if not key:
+					continue
+				if key not in first_by_key:
+					first_by_key[key] = i
+				elif not check_authors or self.__authors_match(articles[first_by_key[key]], articles[i]):
+					union(first_by_key[key], i)
+
+		index((Deduplicator.normalize_doi(it.doi) for it in articles), check_authors=False)
+		index((Deduplicator.main_title(it) for it in articles), check_authors=True)
+
+		titles = [it.normalized_title or '' for it in articles]
+		signatures = self.signatures(titles)
+		# Titles without shingles share the same signature, but they are not similar
+		candidates = np.array([i for i, it in enumerate(titles) if it], dtype=np.int64)
+		rows = self.num_perm // self.bands
+		for band in range(self.bands):
+			keys = np.ascontiguousarray(signatures[candidates, band * rows:(band + 1) * rows]).view(
+				np.dtype((np.void, rows * signatures.itemsize))
+			).ravel()
+			order = np.argsort(keys, kind='stable')
+			sorted_keys = keys[order]
+			order = candidates[order]
+			same = np.concatenate(([False], sorted_keys[1:] == sorted_keys[:-1]))
+			# Every member of a bucket is compared to the first one
+			firsts = order[np.maximum.accumulate(np.where(same, 0, np.arange(len(order))))][same]
+			others = order[same]
+			similarity = np.count_nonzero(signatures[firsts] == signatures[others], axis=1) / self.num_perm
+			for first, other in zip(firsts[similarity >= self.threshold], others[similarity >= self.threshold]):
+				if find(first) != find(other) and self.__authors_match(articles[first], articles[other]):
+					union(first, other)
+
+		groups: Dict[int, List[int]] = {}
+		for i in range(len(articles)):
+			groups.setdefault(find(i), []).append(i)
+		return [it for it in groups.values() if len(it) > 1]
+
+	def merge(self, articles: Iterable[Article]) -> List[Article]:
+		"""
+		The articles with each group of duplicates merged into a copy of its first article.
+		"""
+		articles = list(articles)
+		merged: Dict[int, Article] = {}
+		duplicates = set()
+		for group in self.clusters(articles):
+			article = copy.copy(articles[group[0]])
+			for i in group[1:]:
+				article.merge(articles[i])
+				duplicates.add(i)
+			merged[group[0]] = article
+		return [merged.get(i, it) for i, it in enumerate(articles) if i not in duplicates]
+
+	@staticmethod
+	def normalize_doi(doi: Optional[str]) -> Optional[str]:
+		if not doi or not doi.strip():
+			return None
+		doi = doi.strip().lower()
+		for prefix in ('https://doi.org/', 'http://doi.org/', 'https://dx.doi.org/', 'http://dx.doi.org/', 'doi:'):
+			if doi.startswith(prefix):
+				return doi[len(prefix):]
+		return doi
+
+	@staticmethod
+	def main_title(article: Article, min_words: int = 4) -> Optional[str]:
+		"""
+		The normalized title before a subtitle separator, if it has enough words to identify the article.
+		"""
+		if not article.title:
+			return None
+		for separator in (':', ' - ', ' — ', ' – '):
+			if separator in article.title:
+				title = normalize_text(article.title[:article.title.index(separator)])
+				return title if len(title.split(' ')) >= min_words else None
+		return article.normalized_title if len(article.normalized_title.split(' ')) >= min_words else None
@@ -0,0 +1,97 @@
+import random
+import unittest
+from article import Article
+from cache import SearchCache
+from dedup import Deduplicator
+from search import SearchRequestSource, SearchResponse, SearchRequest, SearchToken
+from source import Source
+from sqlite_cache import SQLiteSearchCache
+
+
+class DeduplicatorTest(unittest.TestCase):
+	def test_signatures(self):
+		deduplicator = Deduplicator(num_perm=128)
+		signatures = deduplicator.signatures([
+			"practical byzantine fault tolerance",
+			"practical byzantine fault tolerence",
+			"byzantine fault tolerance for smart contracts",
+			"",
+		])
+		self.assertEqual((4, 128), signatures.shape)
+		self.assertGreater((signatures[0] == signatures[1]).mean(), 0.7)
+		self.assertLess((signatures[0] == signatures[2]).mean(), 0.6)
+		self.assertEqual(0, (signatures[0] == signatures[3]).sum())
+		self.assertTrue((signatures == deduplicator.signatures([
+			"practical byzantine fault tolerance",
+			"practical byzantine fault tolerence",
+			"byzantine fault tolerance for smart contracts",
+			"",
+		])).all())
+
+	def test_clusters(self):
+		articles = [
+			Article(title="Practical Byzantine Fault Tolerance", author=["Miguel Castro", "Barbara Liskov"]),
+			Article(title="Practical Byzantine fault tolerence", author=["M. Castro"]),
+			Article(title="Byzantine fault tolerance for smart contracts", author=["Jose da Silva"]),
+			Article(title="Practical Byzantine Fault Tolerance: a new approach", author=["Barbara Liskov"]),
+			Article(title="Practical Byzantine Fault Tolerance", author=["Jose da Silva"]),
+			Article(title="Consensus", author=[], doi="https://doi.org/10.1145/296806.296824"),
+			Article(title="Consensus protocols", author=[], doi="10.1145/296806.296824"),
+			Article(title="", author=[]),
+			Article(title="", author=[]),
+		]
+		self.assertEqual([[0, 1, 3], [5, 6]], Deduplicator().clusters(articles))
+
+	def test_merge(self):
+		articles = [
+			Article(title="Practical Byzantine Fault Tolerance", author=["Miguel Castro"]),
+			Article(title="Byzantine fault tolerance for smart contracts", author=[]),
+			Article(title="Practical Byzantine fault tolerence", author=["Barbara Liskov"], doi="10.5555/296806"),
+		]
+		merged = Deduplicator(author_threshold=0).merge(articles)
+		self.assertEqual(2, len(merged))
+		self.assertEqual("practical byzantine fault tolerance", merged[0].normalized_title)
+		self.assertEqual("10.5555/296806", merged[0].doi)
+		self.assertEqual(["Miguel Castro"], articles[0].author)
+		self.assertIs(articles[1], merged[1])
+
+	def test_main_title(self):
+		self.assertEqual(
+			"practical byzantine fault tolerance",
+			Deduplicator.main_title(Article(title="Practical Byzantine Fault Tolerance: a new approach", author=[])),
+		)
+		self.assertIsNone(Deduplicator.main_title(Article(title="Consensus: A New Approach", author=[])))
+		self.assertIsNone(Deduplicator.main_title(Article(title="Consensus", author=[])))
+
+	def test_many_articles(self):
+		randomizer = random.Random(7)
+		words = [
+			''.join(randomizer.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(randomizer.randint(3, 10)))
+			for _ in range(2000)
+		]
+		titles = [' '.join(randomizer.choice(words) for _ in range(randomizer.randint(5, 12))) for _ in range(5000)]
+		articles = [Article(title=it, author=[]) for it in titles]
+		articles += [Article(title=it + 's', author=[]) for it in titles[:500]]
+		clusters = Deduplicator().clusters(articles)
+		self.assertEqual(500, len(clusters))
+		self.assertEqual([[i, 5000 + i] for i in range(500)], sorted(clusters))
+
+
+class CacheDeduplicatorTest(unittest.TestCase):
+	def fill(self, cache: SearchCache):
+		acm = SearchRequestSource(request=SearchRequest(token=SearchToken.Term, value="BFT"), source=Source.ACM)
+		ieee = SearchRequestSource(request=SearchRequest(token=SearchToken.Term, value="BFT"), source=Source.IEEE)
+		cache[acm] = SearchResponse(acm, Article(title="Practical Byzantine Fault Tolerance", author=["M. Castro"]))
+		cache[ieee] = SearchResponse(ieee, Article(title="Practical Byzantine fault tolerence", author=[]))
+		cache[ieee] = SearchResponse(ieee, Article(title="Byzantine fault tolerance for smart contracts", author=[]))
+
+	def test_unique_articles(self):
+		for cache in (SearchCache(), SQLiteSearchCache()):
+			self.fill(cache)
+			self.assertEqual(3, len(list(cache.unique_articles())))
+			unique = list(cache.unique_articles(Deduplicator()))
+			self.assertEqual(2, len(unique))
+			self.assertEqual(
+				{"practical byzantine fault tolerance", "byzantine fault tolerance for smart contracts"},
+				{it.normalized_title for it in unique},
+			)
@@ -1,51 +1,369 @@
 from __future__ import annotations
 import abc
-
-from typing.io import TextIO
-
+import csv
+import io
+import json
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
 from article import Article
-from typing import AsyncIterable, Iterable
+from search import SearchRequestSource
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, TextIO, Tuple
+from util import batched, normalize_text
 
 
 class Exporter(object):
-	@abc.abstractmethod
-	async def prefix(self) -> AsyncIterable:
-		raise NotImplementedError()
+	"""
+	Writes the articles in batches of rows: `begin` once, `write_batch` for every batch and `end` once.
+	"""
+	# The output is opened in binary mode
+	binary = False
 
-	@abc.abstractmethod
-	async def suffix(self) -> AsyncIterable:
-		raise NotImplementedError()
+	def __init__(self, batch_size: int = 1000):
+		self.batch_size = batch_size
+
+	def begin(self, out: TextIO):
+		pass
 
 	@abc.abstractmethod
-	async def content(self, article: Article) -> AsyncIterable:
+	def write_batch(self, out: TextIO, articles: Sequence[Article]):
 		raise NotImplementedError()
 
-	async def write(self, out: TextIO, articles: Iterable[Article]):
-		async for it in self.prefix():
-			out.write(it)
-		for article in articles:
-			async for it in self.content(article):
-				out.write(it)
-		async for it in self.suffix():
-			out.write(it)
+	def end(self, out: TextIO):
+		pass
+
+	def write(self, out: TextIO, articles: Iterable[Article]) -> int:
+		"""
+		Writes all the articles, returns how many were written.
+		"""
+		count = 0
+		self.begin(out)
+		for batch in batched(articles, self.batch_size):
+			self.write_batch(out, batch)
+			count += len(batch)
+		self.end(out)
+		return count
+
+
+def _text(value: object) -> str:
+	return '' if value is None else str(value)
+
 
 class CSVExporter(Exporter):
-	def __init__(self, separator: str = ';'):
+	"""
+	Quotes the fields with the separator, quotes or line breaks, so abstracts do not break the rows.
+	Rows are buffered and written to the output in chunks of about `flush_size` characters.
+	"""
+	header = [
+		'publisher', 'journal', 'year', 'normalized_title', 'title', 'doi', 'citations', 'author', 'references',
+		'abstract',
+	]
+
+	def __init__(
+			self, separator: str = ';', batch_size: int = 1000, flush_size: int = 1 << 16, list_separator: str = ', ',
+	):
+		super().__init__(batch_size=batch_size)
 		self.separator = separator
+		self.flush_size = flush_size
+		self.list_separator = list_separator
+		self.__buffer: Optional[io.StringIO] = None
+		self.__writer = None
+
+	def begin(self, out: TextIO):
+		self.__buffer = io.StringIO()
+		self.__writer = csv.writer(self.__buffer, delimiter=self.separator, lineterminator='\n')
+		self.__writer.writerow(CSVExporter.header)
+
+	def write_batch(self, out: TextIO, articles: Sequence[Article]):
+		separator = self.separator
+		separators = len(CSVExporter.header) - 1
+		write = self.__buffer.write
+		for article in articles:
+			fields = self.row(article)
+			line = separator.join(fields)
+			# Most rows need no quotes, only the others go through the csv writer
+			if line.count(separator) == separators and '"' not in line and '\n' not in line and '\r' not in line:
+				write(line + '\n')
+			else:
+				self.__writer.writerow(fields)
+		if self.__buffer.tell() >= self.flush_size:
+			self.__flush(out)
+
+	def end(self, out: TextIO):
+		self.__flush(out)
+		self.__buffer = None
+		self.__writer = None
+
+	def row(self, article: Article) -> List[str]:
+		return [
+			article.publisher or '', article.journal or '', _text(article.year), article.normalized_title or '',
+			article.title or '', article.doi or '', _text(article.citations),
+			self.list_separator.join(article.author or []),
+			self.list_separator.join(it.title if isinstance(it, Article) else str(it) for it in article.references or []),
+			article.abstract or '',
+		]
+
+	def __flush(self, out: TextIO):
+		out.write(self.__buffer.getvalue())
+		self.__buffer.seek(0)
+		self.__buffer.truncate()
+
+
+class ParquetExporter(Exporter):
+	"""
+	Typed columns in Parquet, one row group per batch, so memory is bounded by the batch size.
+	The provenance, when given, returns the requests and sources that found each article.
+	Needs pyarrow, installed with the `parquet` extra.
+	"""
+	binary = True
+
+	def __init__(
+			self, batch_size: int = 1 << 16, compression: str = 'snappy',
+			provenance: Optional[Callable[[str], Set[SearchRequestSource]]] = None,
+	):
+		super().__init__(batch_size=batch_size)
+		try:
+			import pyarrow
+			import pyarrow.parquet
+		except ImportError as e:
+			raise ImportError("The Parquet exporter needs pyarrow: pip install pyarrow") from e
+		self.__pa = pyarrow
+		self.__pq = pyarrow.parquet
+		self.compression = compression
+		self.provenance = provenance
+		self.schema = pyarrow.schema([
+			('publisher', pyarrow.string()),
+			('journal', pyarrow.string()),
+			('year', pyarrow.int32()),
+			('normalized_title', pyarrow.string()),
+			('title', pyarrow.string()),
+			('doi', pyarrow.string()),
+			('citations', pyarrow.int64()),
+			('downloads', pyarrow.int64()),
+			('author', pyarrow.list_(pyarrow.string())),
+			('key_words', pyarrow.list_(pyarrow.string())),
+			('abstract', pyarrow.string()),
+			('sources', pyarrow.list_(pyarrow.string())),
+			('requests', pyarrow.list_(pyarrow.string())),
+		])
+		self.__writer = None
+		self.__pending: List[Article] = []
+
+	def begin(self, out):
+		self.__writer = self.__pq.ParquetWriter(out, self.schema, compression=self.compression)
+		self.__pending = []
+
+	def write_batch(self, out, articles: Sequence[Article]):
+		# Smaller batches, like the ones of an export pipeline, are gathered into full row groups
+		self.__pending.extend(articles)
+		while len(self.__pending) >= self.batch_size:
+			self.__write_row_group(self.__pending[:self.batch_size])
+			del self.__pending[:self.batch_size]
+
+	def end(self, out):
+		if self.__pending:
+			self.__write_row_group(self.__pending)
+		self.__writer.close()
+		self.__writer = None
+		self.__pending = []
+
+	def __write_row_group(self, articles: Sequence[Article]):
+		self.__writer.write_table(self.__pa.Table.from_pydict(self.columns(articles), schema=self.schema))
+
+	def columns(self, articles: Sequence[Article]) -> Dict[str, list]:
+		resp = {
+			'publisher': [it.publisher for it in articles],
+			'journal': [it.journal for it in articles],
+			'year': [_integer(it.year) for it in articles],
+			'normalized_title': [it.normalized_title for it in articles],
+			'title': [it.title for it in articles],
+			'doi': [it.doi for it in articles],
+			'citations': [_integer(it.citations) for it in articles],
+			'downloads': [_integer(it.downloads) for it in articles],
+			'author': [it.author for it in articles],
+			'key_words': [it.key_words for it in articles],
+			'abstract': [it.abstract for it in articles],
+			'sources': [],
+			'requests': [],
+		}
+		for article in articles:
+			request_sources = self.provenance(article.normalized_title) if self.provenance else set()
+			resp['sources'].append(sorted({it.source.name for it in request_sources}))
+			resp['requests'].append(sorted({f"{it.request.token}: {it.request.value}" for it in request_sources}))
+		return resp
+
+
+def _integer(value: object) -> Optional[int]:
+	"""
+	The sources give numbers as int, str or nothing.
+	"""
+	try:
+		return int(value) if value not in (None, '') else None
+	except (TypeError, ValueError):
+		return None
+
+
+class JSONLExporter(Exporter):
+	"""
+	One JSON object per line.
+	"""
+
+	def write_batch(self, out: TextIO, articles: Sequence[Article]):
+		out.write(''.join(json.dumps(self.row(it), ensure_ascii=False) + '\n' for it in articles))
+
+	@staticmethod
+	def row(article: Article) -> Dict[str, object]:
+		return {
+			'title': article.title,
+			'normalized_title': article.normalized_title,
+			'author': article.author,
+			'year': article.year,
+			'journal': article.journal,
+			'publisher': article.publisher,
+			'doi': article.doi,
+			'citations': article.citations,
+			'downloads': article.downloads,
+			'key_words': article.key_words,
+			'references': [it.title if isinstance(it, Article) else str(it) for it in article.references or []],
+			'abstract': article.abstract,
+		}
+
+
+class BibTeXExporter(Exporter):
+	"""
+	One @article entry per article, keyed by the first author's surname, the year and the first title word.
+	"""
+	__special = re.compile(r'([{}\\])')
+	__key = re.compile(r'[^a-z0-9]')
+
+	def __init__(self, batch_size: int = 1000):
+		super().__init__(batch_size=batch_size)
+		self.__keys: Set[str] = set()
+
+	def begin(self, out: TextIO):
+		self.__keys = set()
+
+	def write_batch(self, out: TextIO, articles: Sequence[Article]):
+		out.write(''.join(self.entry(it) for it in articles))
+
+	def entry(self, article: Article) -> str:
+		fields = [
+			('title', article.title),
+			('author', ' and '.join(article.author or [])),
+			('year', article.year),
+			('journal', article.journal),
+			('publisher', article.publisher),
+			('doi', article.doi),
+			('keywords', ', '.join(article.key_words or [])),
+			('abstract', article.abstract),
+		]
+		content = ''.join(
+			f"\t{name} = {{{self.escape(value)}}},\n" for name, value in fields if value not in (None, '')
+		)
+		return f"@article{{{self.key(article)},\n{content}}}\n\n"
+
+	@staticmethod
+	def escape(value: object) -> str:
+		return BibTeXExporter.__special.sub(r'\\\1', str(value))
+
+	def key(self, article: Article) -> str:
+		"""
+		A key not used by the articles already written, with a letter suffix for the repeated ones.
+		"""
+		surname = BibTeXExporter.__key.sub('', normalize_text(article.author[0]).split(' ')[-1]) if article.author else ''
+		word = next(iter(BibTeXExporter.__key.sub('', it) for it in (article.normalized_title or '').split(' ')), '')
+		key = resp = f"{surname or 'anonymous'}{article.year or ''}{word}"
+		suffix = 0
+		while resp in self.__keys:
+			suffix += 1
+			resp = f"{key}{_letters(suffix)}"
+		self.__keys.add(resp)
+		return resp
+
+
+def _letters(number: int) -> str:
+	"""
+	a, b, ..., z, aa, ab, ...
+	"""
+	resp = ''
+	while number > 0:
+		number, rest = divmod(number - 1, 26)
+		resp = chr(ord('a') + rest) + resp
+	return resp
+
+
+class RISExporter(Exporter):
+	"""
+	RIS records, one tag per line.
+	"""
+
+	def write_batch(self, out: TextIO, articles: Sequence[Article]):
+		out.write(''.join(self.record(it) for it in articles))
+
+	@staticmethod
+	def record(article: Article) -> str:
+		tags: List[Tuple[str, object]] = [('TY', 'JOUR'), ('TI', article.title)]
+		tags += [('AU', it) for it in article.author or []]
+		tags += [
+			('PY', article.year), ('JO', article.journal), ('PB', article.publisher), ('DO', article.doi),
+			('AB', article.abstract),
+		]
+		tags += [('KW', it) for it in article.key_words or []]
+		lines = ''.join(
+			# Values can not span lines
+			f"{tag}  - {' '.join(str(value).split())}\n" for tag, value in tags if value not in (None, '')
+		)
+		return f"{lines}ER  - \n\n"
+
+
+class ExportPipeline(object):
+	"""
+	Iterates the articles once, handing each batch to every exporter. With threads, each exporter
+	writes a batch in its own worker thread while the next batch is read.
+	"""
+
+	def __init__(self, targets: Sequence[Tuple[Exporter, TextIO]], batch_size: int = 1000, threads: bool = False):
+		self.targets = targets
+		self.batch_size = batch_size
+		self.threads = threads
 
-	async def prefix(self) -> AsyncIterable:
-		yield f'publisher{self.separator}journal{self.separator}year{self.separator}normalized_title{self.separator}'
-		yield f'title{self.separator}doi{self.separator}citations{self.separator}author{self.separator}'
-		yield f'references{self.separator}abstract'
-		yield f'\n'
-
-	async def suffix(self) -> AsyncIterable:
-		yield ''
-
-	async def content(self, article: Article) -> AsyncIterable:
-		yield f'{article.publisher}{self.separator}{article.journal}{self.separator}{article.year}{self.separator}'
-		yield f'{article.normalized_title}{self.separator}'
-		yield f'{article.title}{self.separator}{article.doi}{self.separator}{article.citations}{self.separator}'
-		yield f'{article.author}{self.separator}'
-		yield f'{article.references}{self.separator}{article.abstract}'
-		yield f'\n'
+	def write(self, articles: Iterable[Article]) -> int:
+		"""
+		Writes all the articles to every exporter, returns how many were written.
+		The exporters that began are ended even after an error, so their outputs are closed.
+		"""
+		executors = [ThreadPoolExecutor(max_workers=1) for _ in self.targets] if self.threads else []
+		pending: List[Optional[Future]] = [None] * len(self.targets)
+		begun: List[Tuple[Exporter, TextIO]] = []
+		count = 0
+		written = False
+		try:
+			for exporter, out in self.targets:
+				exporter.begin(out)
+				begun.append((exporter, out))
+			for batch in batched(articles, self.batch_size):
+				for i, (exporter, out) in enumerate(self.targets):
+					if not executors:
+						exporter.write_batch(out, batch)
+						continue
+					# The previous batch is done, so each worker has at most the next one queued
+					if pending[i]:
+						pending[i].result()
+					pending[i] = executors[i].submit(exporter.write_batch, out, batch)
+				count += len(batch)
+			for it in pending:
+				if it:
+					it.result()
+			written = True
+		finally:
+			for executor in executors:
+				executor.shutdown(wait=True)
+			errors = []
+			for exporter, out in begun:
+				try:
+					exporter.end(out)
+				except Exception as e:
+					errors.append(e)
+			# The error of the writing is the one raised, not the ones of ending after it
+			if written and errors:
+				raise errors[0]
+		return count
@@ -0,0 +1,199 @@
+import csv
+import io
+import json
+import unittest
+from article import Article
+from cache import SearchCache
+from exporter import BibTeXExporter, CSVExporter, ExportPipeline, JSONLExporter, ParquetExporter, RISExporter
+from search import SearchRequestSource, SearchResponse, SearchRequest, SearchToken
+from source import Source
+
+try:
+	import pyarrow.parquet
+except ImportError:
+	pyarrow = None
+
+
+class CountingIO(io.StringIO):
+	def __init__(self):
+		super().__init__()
+		self.writes = 0
+
+	def write(self, text: str) -> int:
+		self.writes += 1
+		return super().write(text)
+
+
+class CSVExporterTest(unittest.TestCase):
+	def test_escaping(self):
+		articles = [
+			Article(
+				title='BFT; "practical"\napproach', author=["Jose da Silva", "Barbara Liskov"], year=2020,
+				abstract="First line;\n second line", journal="EuroSys", publisher="ACM", citations=3,
+			),
+			Article(title="Consensus", author=[]),
+		]
+		out = io.StringIO()
+		self.assertEqual(2, CSVExporter(';').write(out, articles))
+
+		rows = list(csv.reader(io.StringIO(out.getvalue()), delimiter=';'))
+		self.assertEqual(CSVExporter.header, rows[0])
+		self.assertEqual(3, len(rows))
+		row = dict(zip(rows[0], rows[1]))
+		self.assertEqual('BFT; "practical"\napproach', row['title'])
+		self.assertEqual("First line; second line", row['abstract'])
+		self.assertEqual("Jose da Silva, Barbara Liskov", row['author'])
+		self.assertEqual("2020", row['year'])
+		row = dict(zip(rows[0], rows[2]))
+		self.assertEqual("consensus", row['normalized_title'])
+		self.assertEqual("", row['year'])
+		self.assertEqual("", row['author'])
+
+	def test_batches(self):
+		articles = [Article(title=f"Article {i}", author=["Jose da Silva"]) for i in range(1000)]
+		buffered = CountingIO()
+		self.assertEqual(1000, CSVExporter(batch_size=10, flush_size=1 << 20).write(buffered, articles))
+		self.assertEqual(1, buffered.writes)
+
+		chunked = CountingIO()
+		CSVExporter(batch_size=10, flush_size=100).write(chunked, iter(articles))
+		self.assertEqual(101, chunked.writes)
+		self.assertEqual(buffered.getvalue(), chunked.getvalue())
+		self.assertEqual(1001, len(buffered.getvalue().splitlines()))
+
+	def test_empty(self):
+		out = io.StringIO()
+		self.assertEqual(0, CSVExporter().write(out, []))
+		self.assertEqual(';'.join(CSVExporter.header) + '\n', out.getvalue())
+
+
+@unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+class ParquetExporterTest(unittest.TestCase):
+	def test_columns(self):
+		cache = SearchCache()
+		acm = SearchRequestSource(request=SearchRequest(token=SearchToken.Term, value="BFT"), source=Source.ACM)
+		ieee = SearchRequestSource(request=SearchRequest(token=SearchToken.Term, value="BFT"), source=Source.IEEE)
+		cache[acm] = SearchResponse(acm, Article(
+			title="New BFT", author=["Jose da Silva", "Barbara Liskov"], year=2020, citations=3, key_words=["BFT"],
+		))
+		cache[ieee] = SearchResponse(ieee, Article(title="New BFT", author=["Jose da Silva"], year="2020", downloads=7))
+		cache[ieee] = SearchResponse(ieee, Article(title="Consensus", author=[]))
+
+		out = io.BytesIO()
+		exporter = ParquetExporter(batch_size=1, provenance=cache.request_sources)
+		self.assertEqual(2, exporter.write(out, cache.unique_articles()))
+
+		parquet = pyarrow.parquet.ParquetFile(io.BytesIO(out.getvalue()))
+		self.assertEqual(2, parquet.num_row_groups)
+		table = parquet.read()
+		self.assertEqual(exporter.schema, table.schema.remove_metadata())
+		rows = {it['normalized_title']: it for it in table.to_pylist()}
+		self.assertEqual(2020, rows["new bft"]['year'])
+		self.assertEqual(3, rows["new bft"]['citations'])
+		self.assertEqual(["Jose da Silva", "Barbara Liskov"], rows["new bft"]['author'])
+		self.assertEqual(["BFT"], rows["new bft"]['key_words'])
+		self.assertEqual(["ACM", "IEEE"], rows["new bft"]['sources'])
+		self.assertEqual(["Term: bft"], rows["new bft"]['requests'])
+		self.assertIsNone(rows["consensus"]['year'])
+		self.assertEqual([], rows["consensus"]['author'])
+		self.assertEqual(["IEEE"], rows["consensus"]['sources'])
+
+
+def castro_articles():
+	return [
+		Article(
+			title="Practical {BFT}", author=["Miguel Castro", "Barbara Liskov"], year=1999, journal="OSDI",
+			key_words=["BFT", "consensus"], abstract="First line\n second line",
+		),
+		Article(title="Practical BFT again", author=["Miguel Castro"], year=1999),
+		Article(title="Consensus", author=[]),
+	]
+
+
+class TextExportersTest(unittest.TestCase):
+	def test_jsonl(self):
+		out = io.StringIO()
+		self.assertEqual(3, JSONLExporter().write(out, castro_articles()))
+		rows = [json.loads(it) for it in out.getvalue().splitlines()]
+		self.assertEqual(3, len(rows))
+		self.assertEqual(["Miguel Castro", "Barbara Liskov"], rows[0]['author'])
+		self.assertEqual(1999, rows[0]['year'])
+		self.assertIsNone(rows[2]['year'])
+
+	def test_bibtex(self):
+		out = io.StringIO()
+		BibTeXExporter().write(out, castro_articles())
+		text = out.getvalue()
+		self.assertIn("@article{castro1999practical,\n", text)
+		self.assertIn("@article{castro1999practicala,\n", text)
+		self.assertIn("@article{anonymous", text)
+		self.assertIn("\ttitle = {Practical \\{BFT\\}},\n", text)
+		self.assertIn("\tauthor = {Miguel Castro and Barbara Liskov},\n", text)
+		self.assertEqual(3, text.count("@article{"))
+
+	def test_ris(self):
+		out = io.StringIO()
+		RISExporter().write(out, castro_articles())
+		records = out.getvalue().split("ER  - \n")
+		self.assertEqual(4, len(records))
+		self.assertEqual(
+			[
+				"TY  - JOUR", "TI  - Practical {BFT}", "AU  - Miguel Castro", "AU  - Barbara Liskov", "PY  - 1999",
+				"JO  - OSDI", "AB  - First line second line", "KW  - BFT", "KW  - consensus",
+			],
+			records[0].strip().splitlines(),
+		)
+
+
+class ExportPipelineTest(unittest.TestCase):
+	def test_single_pass(self):
+		articles = [Article(title=f"Article {i}", author=["Jose da Silva"], year=2000 + i % 20) for i in range(2500)]
+		iterations = []
+
+		def iterate():
+			iterations.append(1)
+			yield from articles
+
+		for threads in (False, True):
+			iterations.clear()
+			exporters = [CSVExporter(), JSONLExporter(), BibTeXExporter(), RISExporter()]
+			targets = [(it, io.StringIO()) for it in exporters]
+			self.assertEqual(2500, ExportPipeline(targets, batch_size=100, threads=threads).write(iterate()))
+			self.assertEqual([1], iterations)
+			for exporter, out in targets:
+				expected = io.StringIO()
+				type(exporter)().write(expected, articles)
+				self.assertEqual(expected.getvalue(), out.getvalue())
+
+	def test_error(self):
+		class FailingExporter(JSONLExporter):
+			def write_batch(self, out, articles):
+				raise ValueError("Disk full")
+
+		class EndingExporter(JSONLExporter):
+			def __init__(self):
+				super().__init__()
+				self.ended = False
+
+			def end(self, out):
+				self.ended = True
+
+		for threads in (False, True):
+			exporters = [EndingExporter(), FailingExporter(), EndingExporter()]
+			with self.assertRaises(ValueError):
+				ExportPipeline([(it, io.StringIO()) for it in exporters], threads=threads).write(castro_articles())
+			self.assertEqual([True, True], [exporters[0].ended, exporters[2].ended])
+
+	def test_end_error(self):
+		class FailingEndExporter(JSONLExporter):
+			def end(self, out):
+				raise ValueError("Disk full")
+
+		out = io.StringIO()
+		with self.assertRaises(ValueError):
+			ExportPipeline([(FailingEndExporter(), io.StringIO()), (JSONLExporter(), out)]).write(castro_articles())
+		self.assertTrue(out.getvalue())
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,37 @@
+from article import Article
+from cursor import Cursor
+from search import SearchRequest, SearchRequestSource, SearchResponse
+from search_source import SearchSource
+from source import Source
+
+
+class FakePagedSource(SearchSource):
+	"""
+	Pages of 10 articles, failing once after `fail_after` pages.
+	"""
+
+	def __init__(self, pages: int, fail_after: int = None):
+		super().__init__()
+		self.pages = pages
+		self.fail_after = fail_after
+		self.fetched = []
+
+	def search(self, request: SearchRequest):
+		return self._responses(self.resume(request))
+
+	async def resume(self, request: SearchRequest, position=None):
+		for page in range((position or {}).get('page', 0), self.pages):
+			if self.fail_after is not None and len(self.fetched) == self.fail_after:
+				self.fail_after = None
+				raise ConnectionError("connection reset")
+			self.fetched.append((request.value, page))
+			for i in range(page * 10, page * 10 + 10):
+				yield SearchResponse(
+					request_source=SearchRequestSource(request=request, source=Source.ACM),
+					article=Article(title=f"{request.value} {i}", author=[]),
+				)
+			yield Cursor({'page': page + 1})
+		yield Cursor(complete=True)
+
+	def source(self) -> Source:
+		return Source.ACM
@@ -0,0 +1,173 @@
+from __future__ import annotations
+import bz2
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import time
+import urllib.parse
+from typing import AsyncIterator, Dict, Optional
+
+# Query parameters left out of the keys and the stored URLs, so credentials are not written to disk
+SECRET_PARAMS = frozenset(['apikey', 'api_key', 'insttoken'])
+
+
+class CachedResponse(object):
+	"""
+	The parts of an aiohttp response the sources read, for a body kept in the cache.
+	"""
+
+	def __init__(self, status: int, headers: Dict[str, str], body: bytes, from_cache: bool):
+		self.status = status
+		self.headers = headers
+		self.body = body
+		# Served without downloading the body again
+		self.from_cache = from_cache
+
+	async def read(self) -> bytes:
+		return self.body
+
+	async def text(self, encoding: Optional[str] = None) -> str:
+		return self.body.decode(encoding or self.charset or 'utf-8', errors='replace')
+
+	async def json(self, **kwargs) -> object:
+		return json.loads(self.body)
+
+	@property
+	def charset(self) -> Optional[str]:
+		content_type = self.headers.get('Content-Type', '')
+		for it in content_type.split(';')[1:]:
+			name, _, value = it.strip().partition('=')
+			if name.lower() == 'charset':
+				return value.strip('"') or None
+		return None
+
+	def raise_for_status(self):
+		pass
+
+
+class HttpCache(object):
+	"""
+	Raw HTTP responses on disk, keyed by URL. Entries younger than `ttl_s` are served without the network,
+	older ones are revalidated with their ETag or Last-Modified and only downloaded again when they changed.
+	Bodies are content-addressed by their SHA-256, so pages with the same content are stored once.
+	Only successful responses are kept.
+	"""
+
+	def __init__(self, directory: str, ttl_s: Optional[float] = 24 * 60 * 60, compress: bool = True):
+		self.directory = directory
+		self.ttl_s = ttl_s
+		self.compress = compress
+		self.hits = 0
+		self.revalidated = 0
+		self.misses = 0
+
+	def __str__(self) -> str:
+		return (
+			f"{type(self).__name__}({self.directory}, hits: {self.hits}, revalidated: {self.revalidated},"
+			f" misses: {self.misses})"
+		)
+
+	def __repr__(self):
+		return self.__str__()
+
+	@staticmethod
+	def cache_url(url: str) -> str:
+		parts = urllib.parse.urlsplit(url)
+		query = urllib.parse.urlencode([
+			(key, value) for key, value in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+			if key.lower() not in SECRET_PARAMS
+		])
+		return urllib.parse.urlunsplit((parts.scheme, parts.netloc, parts.path, query, ''))
+
+	@staticmethod
+	def key(url: str) -> str:
+		return hashlib.sha256(HttpCache.cache_url(url).encode('utf-8')).hexdigest()
+
+	def __path(self, kind: str, key: str) -> str:
+		return os.path.join(self.directory, kind, key[:2], key)
+
+	def __write(self, path: str, data: bytes):
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		# Written to a temporary file first, so an interrupted write does not leave a broken entry
+		with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as out_file:
+			out_file.write(data)
+		os.replace(out_file.name, path)
+
+	def entry(self, url: str) -> Optional[Dict]:
+		path = self.__path('entries', HttpCache.key(url))
+		if not os.path.isfile(path):
+			return None
+		with open(path, 'rb') as in_file:
+			return json.loads(in_file.read())
+
+	def body(self, entry: Dict) -> bytes:
+		with open(self.__path('bodies', entry['body']), 'rb') as in_file:
+			data = in_file.read()
+		return bz2.decompress(data) if data[:3] == b'BZh' else data
+
+	def put(self, url: str, status: int, headers: Dict[str, str], body: bytes) -> Dict:
+		body_key = hashlib.sha256(body).hexdigest()
+		body_path = self.__path('bodies', body_key)
+		if not os.path.exists(body_path):
+			self.__write(body_path, bz2.compress(body) if self.compress else body)
+		entry = {
+			'url': HttpCache.cache_url(url),
+			'status': status,
+			'headers': {key: headers[key] for key in ('Content-Type', 'ETag', 'Last-Modified') if key in headers},
+			'stored_at': time.time(),
+			'body': body_key,
+		}
+		self.touch(url, entry)
+		return entry
+
+	def touch(self, url: str, entry: Dict):
+		entry['stored_at'] = time.time()
+		self.__write(self.__path('entries', HttpCache.key(url)), json.dumps(entry).encode('utf-8'))
+
+	def fresh(self, entry: Dict) -> bool:
+		return self.ttl_s is not None and time.time() - entry['stored_at'] < self.ttl_s
+
+	@contextlib.asynccontextmanager
+	async def get(self, session, url: str, **kwargs) -> AsyncIterator:
+		"""
+		Reads the URL through the cache with the session, like `session.get`.
+		"""
+		entry = self.entry(url)
+		if entry and self.fresh(entry):
+			self.hits += 1
+			yield CachedResponse(entry['status'], entry['headers'], self.body(entry), from_cache=True)
+			return
+
+		headers = dict(kwargs.pop('headers', None) or {})
+		if entry and 'ETag' in entry['headers']:
+			headers['If-None-Match'] = entry['headers']['ETag']
+		if entry and 'Last-Modified' in entry['headers']:
+			headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+		async with session.get(url, headers=headers, **kwargs) as response:
+			if entry and response.status == 304:
+				self.revalidated += 1
+				self.touch(url, entry)
+				yield CachedResponse(entry['status'], entry['headers'], self.body(entry), from_cache=True)
+			elif response.status == 200:
+				self.misses += 1
+				body = await response.read()
+				entry = self.put(url, response.status, response.headers, body)
+				yield CachedResponse(response.status, entry['headers'], body, from_cache=False)
+			else:
+				# Errors and quota answers are not kept, the sources handle them as usual
+				yield response
+
+
+class CachedSession(object):
+	"""
+	A client session reading through the HTTP cache, for the sources written against `session.get`.
+	"""
+
+	def __init__(self, session, http_cache: HttpCache):
+		self.session = session
+		self.http_cache = http_cache
+
+	def get(self, url: str, **kwargs):
+		return self.http_cache.get(self.session, url, **kwargs)
@@ -0,0 +1,142 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from http_cache import CachedSession, HttpCache
+from rate_limiter import TokenBucket
+from search import SearchRequest, SearchToken
+from search_source import IEEESearch
+
+loop = asyncio.get_event_loop()
+asyncio.set_event_loop(loop)
+
+
+class FakeResponse(object):
+	def __init__(self, status: int, body: bytes, headers=None):
+		self.status = status
+		self.body = body
+		self.headers = headers or {}
+
+	async def read(self) -> bytes:
+		return self.body
+
+	async def text(self) -> str:
+		return self.body.decode()
+
+	async def __aenter__(self):
+		return self
+
+	async def __aexit__(self, exc_type, exc_val, exc_tb):
+		pass
+
+
+class FakeServer(object):
+	"""
+	Answers 304 to the requests with the current ETag, like a server with conditional requests.
+	"""
+
+	def __init__(self, body: bytes = b'{"total_records": 1, "articles": [{"title": "New BFT"}]}'):
+		self.body = body
+		self.etag = '"1"'
+		self.status = 200
+		self.requests = []
+
+	def get(self, url: str, headers=None) -> FakeResponse:
+		self.requests.append((url, dict(headers or {})))
+		if self.status != 200:
+			return FakeResponse(self.status, b'<h1>Developer Over Qps</h1>')
+		if (headers or {}).get('If-None-Match') == self.etag:
+			return FakeResponse(304, b'')
+		return FakeResponse(200, self.body, {'ETag': self.etag, 'Content-Type': 'application/json; charset=utf-8'})
+
+
+class HttpCacheTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.server = FakeServer()
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def get(self, http_cache: HttpCache, url: str = 'https://example.org/search?q=bft&apikey=123'):
+		async def the_test():
+			async with CachedSession(self.server, http_cache).get(url) as response:
+				return response.status, await response.text(), getattr(response, 'from_cache', False)
+
+		return loop.run_until_complete(the_test())
+
+	def test_fresh_entries_skip_the_network(self):
+		http_cache = HttpCache(self.directory.name, ttl_s=60)
+		body = self.server.body.decode()
+		self.assertEqual((200, body, False), self.get(http_cache))
+		self.assertEqual((200, body, True), self.get(http_cache))
+		self.assertEqual(1, len(self.server.requests))
+		self.assertEqual((1, 1), (http_cache.hits, http_cache.misses))
+
+	def test_revalidation(self):
+		http_cache = HttpCache(self.directory.name, ttl_s=0)
+		self.get(http_cache)
+		self.assertEqual((200, self.server.body.decode(), True), self.get(http_cache))
+		self.assertEqual({'If-None-Match': '"1"'}, self.server.requests[-1][1])
+		self.assertEqual(1, http_cache.revalidated)
+
+		# Changed content is downloaded again
+		self.server.body = b'{"total_records": 0}'
+		self.server.etag = '"2"'
+		self.assertEqual((200, '{"total_records": 0}', False), self.get(http_cache))
+		self.assertEqual(2, http_cache.misses)
+
+	def test_secrets_left_out(self):
+		http_cache = HttpCache(self.directory.name)
+		self.get(http_cache, 'https://example.org/search?q=bft&apikey=123')
+		response = self.get(http_cache, 'https://example.org/search?q=bft&apikey=456')
+		self.assertEqual((200, self.server.body.decode(), True), response)
+		entry = http_cache.entry('https://example.org/search?q=bft&apikey=123')
+		self.assertEqual('https://example.org/search?q=bft', entry['url'])
+
+	def test_errors_not_kept(self):
+		http_cache = HttpCache(self.directory.name)
+		self.server.status = 429
+		self.assertEqual(429, self.get(http_cache)[0])
+		self.assertIsNone(http_cache.entry('https://example.org/search?q=bft&apikey=123'))
+
+	def test_same_content_stored_once(self):
+		http_cache = HttpCache(self.directory.name, compress=False)
+		self.get(http_cache, 'https://example.org/search?q=bft')
+		self.get(http_cache, 'https://example.org/search?q=BFT')
+		bodies = [files for _, _, files in os.walk(os.path.join(self.directory.name, 'bodies')) if files]
+		self.assertEqual(1, sum(len(it) for it in bodies))
+
+	def test_ieee_reads_through(self):
+		search_source = IEEESearch(api_key='123')
+		search_source.session = self.server
+		search_source.http_cache = HttpCache(self.directory.name)
+
+		async def the_test():
+			return [it async for it in search_source.search(SearchRequest(SearchToken.Title, "bft"))]
+
+		for _ in range(2):
+			self.assertEqual(["New BFT"], [it.article.title for it in loop.run_until_complete(the_test())])
+		self.assertEqual(1, len(self.server.requests))
+
+	def test_hits_take_no_token(self):
+		search_source = IEEESearch(api_key='123')
+		search_source.session = self.server
+		search_source.http_cache = HttpCache(self.directory.name)
+		search_source.rate_limiter = TokenBucket(rate=1, burst=1)
+
+		async def the_test():
+			return [it async for it in search_source.search(SearchRequest(SearchToken.Title, "bft"))]
+
+		loop.run_until_complete(the_test())
+		start = time.monotonic()
+		for _ in range(3):
+			self.assertEqual(["New BFT"], [it.article.title for it in loop.run_until_complete(the_test())])
+		# Without a token left, a request to the network would wait for 1s
+		self.assertLess(time.monotonic() - start, 0.5)
+		self.assertEqual(1, len(self.server.requests))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,35 @@
+from aiohttp import ClientSession, TCPConnector
+from typing import Optional
+
+
+class HttpPool(object):
+	"""
+	A client session over a pooled connector, shared by the HTTP search sources, so pages reuse the
+	open connections and the resolved addresses instead of paying the TCP, TLS and DNS setup again.
+	"""
+
+	def __init__(
+			self, limit: int = 100, limit_per_host: int = 10, dns_cache_ttl: Optional[int] = 300,
+			keepalive_timeout: float = 30.0,
+	):
+		self.limit = limit
+		self.limit_per_host = limit_per_host
+		self.dns_cache_ttl = dns_cache_ttl
+		self.keepalive_timeout = keepalive_timeout
+		self.session: Optional[ClientSession] = None
+
+	async def __aenter__(self) -> ClientSession:
+		connector = TCPConnector(
+			limit=self.limit, limit_per_host=self.limit_per_host, use_dns_cache=self.dns_cache_ttl is not None,
+			ttl_dns_cache=self.dns_cache_ttl, keepalive_timeout=self.keepalive_timeout,
+		)
+		self.session = ClientSession(connector=connector)
+		return self.session
+
+	async def __aexit__(self, exc_type, exc_val, exc_tb):
+		await self.close()
+
+	async def close(self):
+		if self.session:
+			await self.session.close()
+			self.session = None
@@ -0,0 +1,42 @@
+import asyncio
+import unittest
+from aiohttp import web
+from http_pool import HttpPool
+
+loop = asyncio.get_event_loop()
+asyncio.set_event_loop(loop)
+
+
+class HttpPoolTest(unittest.TestCase):
+	def test_connections_are_reused(self):
+		peers = []
+
+		async def handler(request: web.Request) -> web.Response:
+			peers.append(request.transport.get_extra_info('peername'))
+			return web.Response(text='ok')
+
+		async def the_test():
+			app = web.Application()
+			app.router.add_get('/', handler)
+			runner = web.AppRunner(app)
+			await runner.setup()
+			site = web.TCPSite(runner, '127.0.0.1', 0)
+			await site.start()
+			port = site._server.sockets[0].getsockname()[1]
+			pool = HttpPool(limit_per_host=1)
+			try:
+				async with pool as session:
+					for _ in range(5):
+						async with session.get(f"http://127.0.0.1:{port}/") as response:
+							self.assertEqual('ok', await response.text())
+				self.assertIsNone(pool.session)
+			finally:
+				await runner.cleanup()
+
+		loop.run_until_complete(the_test())
+		self.assertEqual(5, len(peers))
+		self.assertEqual(1, len(set(peers)))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,168 @@
+import argparse
+import bz2
+import gc
+import json
+import os
+import pickle
+import random
+import tempfile
+import time
+import tracemalloc
+from article import Article
+from author import Author
+from cache import SearchCache
+from search import SearchRequestSource, SearchResponse, SearchRequest, SearchToken
+from source import Source
+from util import normalize_text
+
+
+class LegacyArticle(object):
+	"""
+	`Article` before the slots, with a `__dict__` and no interned strings.
+	"""
+
+	def __str__(self) -> str:
+		return json.dumps(self.__dict__)
+
+
+class LegacyAuthor(object):
+	pass
+
+
+class LegacySearchRequest(object):
+	def __hash__(self):
+		return hash(self.token) + hash(self.value)
+
+	def __eq__(self, other):
+		return type(other) is LegacySearchRequest and self.token == other.token and self.value == other.value
+
+
+class LegacySearchRequestSource(object):
+	def __hash__(self):
+		return hash(self.request) + hash(self.source)
+
+	def __eq__(self, other):
+		return type(other) is LegacySearchRequestSource and self.request == other.request and \
+			self.source == other.source
+
+
+class LegacySearchResponse(object):
+	pass
+
+
+class LegacyUnpickler(pickle.Unpickler):
+	"""
+	Loads the cache into the classes before the slots.
+	"""
+	classes = {
+		('article', 'Article'): LegacyArticle,
+		('author', 'Author'): LegacyAuthor,
+		('search', 'SearchRequest'): LegacySearchRequest,
+		('search', 'SearchRequestSource'): LegacySearchRequestSource,
+		('search', 'SearchResponse'): LegacySearchResponse,
+	}
+
+	def find_class(self, module, name):
+		return LegacyUnpickler.classes.get((module, name)) or super().find_class(module, name)
+
+
+def copy_text(text: str) -> str:
+	"""
+	A new string with the same value, like the ones parsed from different pages.
+	"""
+	return (text + ' ')[:-1]
+
+
+def generate_cache(responses: int, journals: int, authors: int, seed: int = 42) -> SearchCache:
+	randomizer = random.Random(seed)
+	words = [
+		''.join(randomizer.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(randomizer.randint(3, 10)))
+		for _ in range(5000)
+	]
+	journal_names = [
+		f"Proceedings of the {' '.join(randomizer.choice(words) for _ in range(6))} conference" for _ in range(journals)
+	]
+	author_names = [
+		f"{randomizer.choice(words).title()} {randomizer.choice(words).title()}" for _ in range(authors)
+	]
+	publishers = ['ACM', 'IEEE', 'Elsevier', 'Springer']
+	cache = SearchCache()
+	requests = [
+		SearchRequestSource(SearchRequest(token=SearchToken.Term, value=term), source=source)
+		for term in ('bft', 'consensus', 'blockchain') for source in (Source.ACM, Source.IEEE, Source.GoogleScholar)
+	]
+	for i in range(responses):
+		request = randomizer.choice(requests)
+		article = Article(
+			title=' '.join(randomizer.choice(words) for _ in range(randomizer.randint(5, 14))),
+			author=[copy_text(randomizer.choice(author_names)) for _ in range(randomizer.randint(1, 6))],
+			year=randomizer.randint(1990, 2020), journal=copy_text(randomizer.choice(journal_names)),
+			publisher=copy_text(randomizer.choice(publishers)), citations=randomizer.randint(0, 500),
+		)
+		cache[request] = SearchResponse(request_source=request, article=article, raw=None)
+	for name in author_names:
+		cache.add_author(Author(name=copy_text(name), affiliation=None, citations=randomizer.randint(0, 5000)))
+	return cache
+
+
+def measured(name: str, load, responses: int):
+	# Timed apart, tracemalloc slows down every allocation
+	gc.collect()
+	start = time.perf_counter()
+	state = load()
+	elapsed = time.perf_counter() - start
+	del state
+	gc.collect()
+	tracemalloc.start()
+	state = load()
+	gc.collect()
+	current, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	print(
+		f"{name}: {current / 2 ** 20:.1f} MiB, peak {peak / 2 ** 20:.1f} MiB, {current / responses:,.0f} bytes/response,"
+		f" loaded in {elapsed:.3f}s"
+	)
+	del state
+	return current
+
+
+def parse_args():
+	parser = argparse.ArgumentParser(description='Cache memory benchmark')
+	parser.add_argument('--cache-file-name', help='Cache to load, a synthetic cache is generated without it')
+	parser.add_argument('--cache-compress', default=False, help='The cache is compressed', action="store_true")
+	parser.add_argument('--responses', default=200000, type=int, help='Responses in the synthetic cache')
+	parser.add_argument('--journals', default=2000, type=int, help='Distinct journals in the synthetic cache')
+	parser.add_argument('--authors', default=50000, type=int, help='Distinct authors in the synthetic cache')
+	return parser.parse_args()
+
+
+def benchmark(file_name: str, compress: bool):
+	responses = max(1, len(SearchCache.load(file_name, compress=compress)))
+	print(f"{file_name}: {responses:,} responses, {os.path.getsize(file_name) / 2 ** 20:.1f} MiB")
+
+	def load(unpickler):
+		with (bz2.open(file_name, 'rb') if compress else open(file_name, 'rb')) as in_file:
+			return unpickler(in_file).load()
+
+	legacy = measured('__dict__ classes', lambda: load(LegacyUnpickler), responses)
+	current = measured('__slots__ classes with interned strings', lambda: load(pickle.Unpickler), responses)
+	print(f"Memory: {current / legacy:.0%} of the __dict__ classes")
+
+
+def main():
+	args = parse_args()
+	if args.cache_file_name:
+		benchmark(args.cache_file_name, args.cache_compress)
+		return
+	with tempfile.TemporaryDirectory() as directory:
+		file_name = os.path.join(directory, 'cache.sr')
+		cache = generate_cache(args.responses, args.journals, args.authors)
+		cache.dump(file_name, compress=False)
+		del cache
+		# The titles, journals and authors are cached by the normalization
+		normalize_text.cache_clear()
+		benchmark(file_name, compress=False)
+
+
+if __name__ == '__main__':
+	main()
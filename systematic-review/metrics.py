@@ -0,0 +1,250 @@
+from __future__ import annotations
+import asyncio
+import bisect
+import contextlib
+import json
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds (s) of the latency buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PREFIX = 'systematic_review'
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram(object):
+	"""
+	Counts of the observed values by bucket, with their sum and maximum.
+	"""
+
+	def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+		self.buckets = tuple(sorted(buckets))
+		# The last one counts the values over every bucket
+		self.counts = [0] * (len(self.buckets) + 1)
+		self.count = 0
+		self.sum = 0.0
+		self.max = 0.0
+
+	def observe(self, value: float):
+		self.counts[bisect.bisect_left(self.buckets, value)] += 1
+		self.count += 1
+		self.sum += value
+		self.max = max(self.max, value)
+
+	def cumulative(self) -> List[int]:
+		resp = []
+		total = 0
+		for it in self.counts:
+			total += it
+			resp.append(total)
+		return resp
+
+	def quantile(self, q: float) -> Optional[float]:
+		"""
+		The upper bound of the bucket with the quantile, the maximum for the values over every bucket.
+		"""
+		if not self.count:
+			return None
+		for bound, total in zip(self.buckets, self.cumulative()):
+			if total >= q * self.count:
+				return bound
+		return self.max
+
+	def to_json(self) -> Dict:
+		buckets = {str(bound): total for bound, total in zip(self.buckets, self.cumulative())}
+		buckets['+Inf'] = self.count
+		return {
+			'count': self.count, 'sum': self.sum, 'max': self.max,
+			'mean': self.sum / self.count if self.count else None,
+			'p50': self.quantile(0.5), 'p95': self.quantile(0.95), 'p99': self.quantile(0.99), 'buckets': buckets,
+		}
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+	return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _prometheus_labels(labels: Labels, extra: Labels = ()) -> str:
+	if not labels and not extra:
+		return ''
+	escaped = (
+		(key, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for key, value in labels + extra
+	)
+	return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+class Metrics(object):
+	"""
+	Counters and latency histograms of a crawl, labelled by source and request, exported as JSON or
+	in the Prometheus text format.
+
+	- `articles_total`, `stream_errors_total`, `page_seconds`: by source and request, from the scheduler.
+	- `http_request_seconds`, `http_responses_total`, `retries_total`: by source, from the HTTP sources.
+	- `throttle_seconds`: by source, the waits for the tokens of the rate limiter.
+	- `cache_dump_seconds`: by kind, dump or checkpoint, from the engine.
+	- `event_loop_lag_seconds`: how late the event loop ran a timer, the time it was blocked.
+	"""
+
+	def __init__(self):
+		self.counters: Dict[str, Dict[Labels, float]] = {}
+		self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+		self.started = time.monotonic()
+		self.finished: Optional[float] = None
+
+	def start(self):
+		self.started = time.monotonic()
+		self.finished = None
+
+	def finish(self):
+		self.finished = time.monotonic()
+
+	@property
+	def elapsed(self) -> float:
+		return (self.finished or time.monotonic()) - self.started
+
+	def increment(self, name: str, value: float = 1, **labels):
+		counter = self.counters.setdefault(name, {})
+		key = _labels(labels)
+		counter[key] = counter.get(key, 0) + value
+
+	def observe(self, name: str, value: float, **labels):
+		histograms = self.histograms.setdefault(name, {})
+		key = _labels(labels)
+		if key not in histograms:
+			histograms[key] = Histogram()
+		histograms[key].observe(value)
+
+	@contextlib.contextmanager
+	def timed(self, name: str, **labels) -> Iterator[None]:
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.observe(name, time.perf_counter() - start, **labels)
+
+	def value(self, name: str, **labels) -> float:
+		return self.counters.get(name, {}).get(_labels(labels), 0)
+
+	def histogram(self, name: str, **labels) -> Optional[Histogram]:
+		return self.histograms.get(name, {}).get(_labels(labels))
+
+	def articles_per_second(self) -> Dict[str, float]:
+		"""
+		Articles found by each source over the whole crawl.
+		"""
+		articles: Dict[str, float] = {}
+		for labels, value in self.counters.get('articles_total', {}).items():
+			source = dict(labels).get('source', '')
+			articles[source] = articles.get(source, 0) + value
+		elapsed = self.elapsed
+		return {source: value / elapsed if elapsed else 0.0 for source, value in sorted(articles.items())}
+
+	def to_json(self) -> Dict:
+		return {
+			'elapsed_seconds': self.elapsed,
+			'articles_per_second': self.articles_per_second(),
+			'counters': {
+				name: [{'labels': dict(labels), 'value': value} for labels, value in sorted(values.items())]
+				for name, values in sorted(self.counters.items())
+			},
+			'histograms': {
+				name: [{'labels': dict(labels), **it.to_json()} for labels, it in sorted(values.items())]
+				for name, values in sorted(self.histograms.items())
+			},
+		}
+
+	def to_prometheus(self) -> str:
+		lines = [
+			f"# TYPE {PREFIX}_elapsed_seconds gauge",
+			f"{PREFIX}_elapsed_seconds {self.elapsed}",
+			f"# TYPE {PREFIX}_articles_per_second gauge",
+		]
+		lines += [
+			f"{PREFIX}_articles_per_second{_prometheus_labels((('source', source),))} {value}"
+			for source, value in self.articles_per_second().items()
+		]
+		for name, values in sorted(self.counters.items()):
+			lines.append(f"# TYPE {PREFIX}_{name} counter")
+			lines += [
+				f"{PREFIX}_{name}{_prometheus_labels(labels)} {value}" for labels, value in sorted(values.items())
+			]
+		for name, values in sorted(self.histograms.items()):
+			lines.append(f"# TYPE {PREFIX}_{name} histogram")
+			for labels, histogram in sorted(values.items()):
+				for bound, total in zip(histogram.buckets, histogram.cumulative()):
+					lines.append(f"{PREFIX}_{name}_bucket{_prometheus_labels(labels, (('le', str(bound)),))} {total}")
+				lines.append(f"{PREFIX}_{name}_bucket{_prometheus_labels(labels, (('le', '+Inf'),))} {histogram.count}")
+				lines.append(f"{PREFIX}_{name}_sum{_prometheus_labels(labels)} {histogram.sum}")
+				lines.append(f"{PREFIX}_{name}_count{_prometheus_labels(labels)} {histogram.count}")
+		return '\n'.join(lines) + '\n'
+
+	def write(self, filename: str, format: Optional[str] = None):
+		"""
+		Prometheus text for the .prom and .txt files unless the format is given, JSON otherwise.
+		"""
+		if format is None:
+			format = 'prometheus' if filename.endswith(('.prom', '.txt')) else 'json'
+		with open(filename, 'w') as out_file:
+			if format == 'prometheus':
+				out_file.write(self.to_prometheus())
+			else:
+				json.dump(self.to_json(), out_file, indent='\t')
+
+
+class LoopMonitor(object):
+	"""
+	Measures how late a timer of `interval_s` fires, the time the event loop was blocked by some callback.
+	"""
+
+	def __init__(self, metrics: Metrics, interval_s: float = 0.05):
+		self.metrics = metrics
+		self.interval_s = interval_s
+		self.__task: Optional[asyncio.Future] = None
+
+	async def __run(self):
+		loop = asyncio.get_event_loop()
+		while True:
+			start = loop.time()
+			await asyncio.sleep(self.interval_s)
+			self.metrics.observe('event_loop_lag_seconds', max(0.0, loop.time() - start - self.interval_s))
+
+	def start(self):
+		if not self.__task:
+			self.__task = asyncio.ensure_future(self.__run())
+
+	async def stop(self):
+		if self.__task:
+			self.__task.cancel()
+			await asyncio.gather(self.__task, return_exceptions=True)
+			self.__task = None
+
+	async def __aenter__(self) -> LoopMonitor:
+		self.start()
+		return self
+
+	async def __aexit__(self, exc_type, exc_val, exc_tb):
+		await self.stop()
+
+
+class MeteredSession(object):
+	"""
+	A client session timing the requests of a source and counting its responses by status.
+	"""
+
+	def __init__(self, session, metrics: Metrics, source: str):
+		self.session = session
+		self.metrics = metrics
+		self.source = source
+
+	@contextlib.asynccontextmanager
+	async def get(self, url: str, **kwargs) -> AsyncIterator:
+		start = time.perf_counter()
+		try:
+			# The body is read up front, so the time the caller takes with the response, like a backoff, is not timed
+			async with self.session.get(url, **kwargs) as response:
+				await response.read()
+		finally:
+			self.metrics.observe('http_request_seconds', time.perf_counter() - start, source=self.source)
+		self.metrics.increment('http_responses_total', source=self.source, status=response.status)
+		yield response
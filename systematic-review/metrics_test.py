@@ -0,0 +1,169 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+import aiohttp
+from fakes import FakePagedSource
+from metrics import Histogram, LoopMonitor, MeteredSession, Metrics
+from rate_limiter import TokenBucket
+from replay import Fixtures, StandInServer
+from replay_test import ieee_fixtures
+from search import SearchRequest, SearchToken
+from search_engine import SearchEngine
+from search_source import IEEESearch
+
+loop = asyncio.get_event_loop()
+asyncio.set_event_loop(loop)
+
+
+class HistogramTest(unittest.TestCase):
+	def test_observe(self):
+		histogram = Histogram(buckets=[1, 0.1, 10])
+		for value in (0.05, 0.1, 0.5, 2, 20):
+			histogram.observe(value)
+		self.assertEqual((0.1, 1, 10), histogram.buckets)
+		self.assertEqual([2, 3, 4, 5], histogram.cumulative())
+		self.assertEqual((5, 20), (histogram.count, histogram.max))
+		self.assertAlmostEqual(22.65, histogram.sum)
+		self.assertEqual(1, histogram.quantile(0.5))
+		self.assertEqual(20, histogram.quantile(0.99))
+		self.assertIsNone(Histogram().quantile(0.5))
+
+
+class MetricsTest(unittest.TestCase):
+	def metrics(self) -> Metrics:
+		metrics = Metrics()
+		metrics.increment('articles_total', 3, source='ACM', request='Term:bft')
+		metrics.increment('articles_total', 2, source='ACM', request='Term:"dag"')
+		metrics.observe('page_seconds', 0.2, source='ACM', request='Term:bft')
+		metrics.finish()
+		return metrics
+
+	def test_prometheus(self):
+		text = self.metrics().to_prometheus()
+		self.assertIn('# TYPE systematic_review_articles_total counter\n', text)
+		self.assertIn('systematic_review_articles_total{request="Term:\\"dag\\"",source="ACM"} 2\n', text)
+		self.assertIn('systematic_review_page_seconds_bucket{request="Term:bft",source="ACM",le="0.1"} 0\n', text)
+		self.assertIn('systematic_review_page_seconds_bucket{request="Term:bft",source="ACM",le="0.25"} 1\n', text)
+		self.assertIn('systematic_review_page_seconds_bucket{request="Term:bft",source="ACM",le="+Inf"} 1\n', text)
+		self.assertIn('systematic_review_page_seconds_count{request="Term:bft",source="ACM"} 1\n', text)
+		self.assertIn('systematic_review_articles_per_second{source="ACM"} ', text)
+
+	def test_write(self):
+		metrics = self.metrics()
+		with tempfile.TemporaryDirectory() as directory:
+			metrics.write(os.path.join(directory, 'metrics.json'))
+			with open(os.path.join(directory, 'metrics.json')) as in_file:
+				data = json.load(in_file)
+			metrics.write(os.path.join(directory, 'metrics.prom'))
+			with open(os.path.join(directory, 'metrics.prom')) as in_file:
+				self.assertTrue(in_file.read().startswith('# TYPE'))
+		self.assertEqual(
+			{'labels': {'request': 'Term:bft', 'source': 'ACM'}, 'value': 3}, data['counters']['articles_total'][1],
+		)
+		self.assertEqual(0.25, data['histograms']['page_seconds'][0]['p50'])
+		self.assertAlmostEqual(5 / metrics.elapsed, data['articles_per_second']['ACM'])
+
+	def test_loop_monitor(self):
+		metrics = Metrics()
+
+		async def the_test():
+			async with LoopMonitor(metrics, interval_s=0.01):
+				await asyncio.sleep(0.05)
+				# Blocks the event loop
+				time.sleep(0.1)
+				await asyncio.sleep(0.05)
+
+		loop.run_until_complete(the_test())
+		self.assertGreaterEqual(metrics.histogram('event_loop_lag_seconds').max, 0.08)
+
+
+class CrawlMetricsTest(unittest.TestCase):
+	def test_engine(self):
+		with tempfile.TemporaryDirectory() as directory:
+			source = FakePagedSource(pages=5, fail_after=3)
+			engine = SearchEngine(cache_file_name=os.path.join(directory, 'cache.sr'))
+			engine.compress = False
+			engine.save_every = 10
+			engine.sleep_between_calls_ms = None
+			engine.sources.append(source)
+			engine.requests = {SearchRequest(SearchToken.Term, "bft"), SearchRequest(SearchToken.Term, "dag")}
+			engine.metrics = Metrics()
+			loop.run_until_complete(engine.run())
+		metrics = engine.metrics
+		pages = {value: len([it for it in source.fetched if it[0] == value]) for value in ("bft", "dag")}
+		for value, count in pages.items():
+			self.assertEqual(10 * count, metrics.value('articles_total', source='ACM', request=f"Term:{value}"))
+			self.assertEqual(count, metrics.histogram('page_seconds', source='ACM', request=f"Term:{value}").count)
+		failed = [value for value, count in pages.items() if count < 5]
+		self.assertEqual(1, len(failed))
+		self.assertEqual(1, metrics.value('stream_errors_total', source='ACM', request=f"Term:{failed[0]}"))
+		self.assertGreaterEqual(metrics.histogram('cache_dump_seconds', kind='dump').count, 1)
+		self.assertGreater(metrics.histogram('cache_dump_seconds', kind='checkpoint').count, 0)
+		self.assertEqual({'ACM'}, set(metrics.articles_per_second()))
+
+	def test_http_retries(self):
+		with tempfile.TemporaryDirectory() as directory:
+			fixtures = Fixtures(directory)
+			ieee_fixtures(fixtures, total_records=230)
+			server = StandInServer(fixtures, rate_429=0.3, seed=1)
+			source = IEEESearch(api_key='456', backoff_s=0.001, max_retries=10)
+			source.metrics = Metrics()
+
+			async def the_test():
+				async with server:
+					source.protocol = 'http'
+					source.host = f"{server.host}:{server.port}"
+					return [it async for it in source.search(SearchRequest(SearchToken.Title, "bft"))]
+
+			self.assertEqual(230, len(loop.run_until_complete(the_test())))
+		metrics = source.metrics
+		self.assertEqual(server.throttled, metrics.value('retries_total', source='IEEE'))
+		self.assertEqual(server.throttled, metrics.value('http_responses_total', source='IEEE', status=429))
+		self.assertEqual(5, metrics.value('http_responses_total', source='IEEE', status=200))
+		self.assertEqual(server.requests, metrics.histogram('http_request_seconds', source='IEEE').count)
+
+	def test_request_time_without_caller(self):
+		metrics = Metrics()
+		with tempfile.TemporaryDirectory() as directory:
+			fixtures = Fixtures(directory)
+			fixtures.put('/page', 200, 'text/plain', b'A page')
+			server = StandInServer(fixtures)
+
+			async def the_test():
+				async with server, aiohttp.ClientSession() as client_session:
+					session = MeteredSession(client_session, metrics, 'ACM')
+					async with session.get(f"{server.base_url}/page") as response:
+						# Like a backoff before the next try
+						await asyncio.sleep(0.2)
+						return await response.text()
+
+			self.assertEqual('A page', loop.run_until_complete(the_test()))
+		self.assertEqual(1, metrics.histogram('http_request_seconds', source='ACM').count)
+		self.assertLess(metrics.histogram('http_request_seconds', source='ACM').max, 0.15)
+
+	def test_throttle_time(self):
+		with tempfile.TemporaryDirectory() as directory:
+			fixtures = Fixtures(directory)
+			ieee_fixtures(fixtures, total_records=230)
+			server = StandInServer(fixtures)
+			source = IEEESearch(api_key='456')
+			source.metrics = Metrics()
+			source.rate_limiter = TokenBucket(rate=10, burst=1)
+
+			async def the_test():
+				async with server:
+					source.protocol = 'http'
+					source.host = f"{server.host}:{server.port}"
+					return [it async for it in source.search(SearchRequest(SearchToken.Title, "bft"))]
+
+			self.assertEqual(230, len(loop.run_until_complete(the_test())))
+		histogram = source.metrics.histogram('throttle_seconds', source='IEEE')
+		self.assertEqual(5, histogram.count)
+		self.assertGreater(histogram.sum, 0.3)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,103 @@
+import asyncio
+import contextlib
+import time
+from metrics import Metrics
+from source import Source
+from typing import AsyncIterator, Dict, Optional
+
+
+class TokenBucket(object):
+	"""
+	Async token bucket: allows `rate` acquisitions per second on average and up to `burst`
+	acquisitions back to back after being idle.
+	"""
+
+	def __init__(self, rate: float, burst: Optional[int] = None):
+		if rate <= 0:
+			raise ValueError(f"The rate must be positive: {rate}")
+		self.rate = rate
+		self.burst = burst or max(1, int(rate))
+		self.__tokens = float(self.burst)
+		self.__last = time.monotonic()
+		self.__lock = asyncio.Lock()
+
+	def __str__(self) -> str:
+		return f"{self.rate}/s (burst {self.burst})"
+
+	def __repr__(self):
+		return self.__str__()
+
+	def __refill(self):
+		now = time.monotonic()
+		self.__tokens = min(self.burst, self.__tokens + (now - self.__last) * self.rate)
+		self.__last = now
+
+	async def acquire(self):
+		async with self.__lock:
+			self.__refill()
+			while self.__tokens < 1:
+				await asyncio.sleep((1 - self.__tokens) / self.rate)
+				self.__refill()
+			self.__tokens -= 1
+
+
+class ThrottledSession(object):
+	"""
+	A client session taking a token of the bucket before each request that reaches it. Behind the HTTP
+	cache, only the requests that go to the network wait, not the fresh hits.
+	With `metrics`, the waits for the tokens are observed as `throttle_seconds`, by source.
+	"""
+
+	def __init__(self, session, bucket: TokenBucket, metrics: Optional[Metrics] = None, source: str = ''):
+		self.session = session
+		self.bucket = bucket
+		self.metrics = metrics
+		self.source = source
+
+	@contextlib.asynccontextmanager
+	async def get(self, url: str, **kwargs) -> AsyncIterator:
+		start = time.perf_counter()
+		await self.bucket.acquire()
+		if self.metrics is not None:
+			self.metrics.observe('throttle_seconds', time.perf_counter() - start, source=self.source)
+		async with self.session.get(url, **kwargs) as response:
+			yield response
+
+
+class RateLimiter(object):
+	"""
+	Keeps one token bucket per source, sources without an explicit rate use the default one.
+	"""
+
+	def __init__(
+			self, rates: Dict[Source, float] = None, bursts: Dict[Source, int] = None,
+			default_rate: Optional[float] = None,
+	):
+		self.rates: Dict[Source, float] = rates or {}
+		self.bursts: Dict[Source, int] = bursts or {}
+		self.default_rate = default_rate
+		self.__buckets: Dict[Source, TokenBucket] = {}
+
+	def bucket(self, source: Source) -> Optional[TokenBucket]:
+		if source not in self.__buckets:
+			rate = self.rates.get(source, self.default_rate)
+			if not rate:
+				return None
+			self.__buckets[source] = TokenBucket(rate=rate, burst=self.bursts.get(source))
+		return self.__buckets[source]
+
+
+def parse_rate(value: str) -> float:
+	"""
+	Parses a rate like `10/s`, `100/m`, `1000/h` or `2.5` (per second) into calls per second.
+	"""
+	units = {'s': 1.0, 'sec': 1.0, 'm': 60.0, 'min': 60.0, 'h': 3600.0}
+	count, _, unit = value.strip().partition('/')
+	unit = unit.strip().lower() or 's'
+	if unit not in units:
+		raise ValueError(f"Unknown rate unit: {value}")
+	return float(count) / units[unit]
+
+
+def interval_to_rate(interval_ms: Optional[float]) -> Optional[float]:
+	return 1000.0 / interval_ms if interval_ms else None
@@ -0,0 +1,49 @@
+import asyncio
+import time
+import unittest
+from rate_limiter import RateLimiter, TokenBucket, parse_rate
+from source import Source
+
+loop = asyncio.get_event_loop()
+asyncio.set_event_loop(loop)
+
+
+class TokenBucketTest(unittest.TestCase):
+	def test_burst_then_rate(self):
+		bucket = TokenBucket(rate=50, burst=5)
+
+		async def the_test():
+			for _ in range(10):
+				await bucket.acquire()
+
+		start = time.monotonic()
+		loop.run_until_complete(the_test())
+		elapsed = time.monotonic() - start
+		# 5 calls from the burst, the other 5 at 50/s
+		self.assertGreater(elapsed, 0.08)
+		self.assertLess(elapsed, 0.5)
+
+	def test_invalid_rate(self):
+		with self.assertRaises(ValueError):
+			TokenBucket(rate=0)
+
+
+class RateLimiterTest(unittest.TestCase):
+	def test_bucket_per_source(self):
+		limiter = RateLimiter(rates={Source.IEEE: 10}, bursts={Source.IEEE: 20}, default_rate=2)
+		self.assertEqual(10, limiter.bucket(Source.IEEE).rate)
+		self.assertEqual(20, limiter.bucket(Source.IEEE).burst)
+		self.assertIs(limiter.bucket(Source.IEEE), limiter.bucket(Source.IEEE))
+		self.assertEqual(2, limiter.bucket(Source.ACM).rate)
+		self.assertIsNone(RateLimiter().bucket(Source.ACM))
+
+	def test_parse_rate(self):
+		self.assertEqual(10.0, parse_rate("10/s"))
+		self.assertEqual(2.0, parse_rate("120/m"))
+		self.assertEqual(1.5, parse_rate("1.5"))
+		with self.assertRaises(ValueError):
+			parse_rate("1/week")
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,192 @@
+from __future__ import annotations
+import argparse
+import asyncio
+import base64
+import contextlib
+import hashlib
+import json
+import os
+import random
+import tempfile
+import urllib.parse
+from aiohttp import web
+from http_cache import CachedResponse, HttpCache
+from typing import AsyncIterator, Dict, Optional
+
+
+def fixture_key(url: str) -> str:
+	"""
+	The path and query of the URL without the credentials, the same for the real host and the stand-in server.
+	"""
+	parts = urllib.parse.urlsplit(HttpCache.cache_url(url))
+	return f"{parts.path}?{parts.query}" if parts.query else parts.path
+
+
+class Fixtures(object):
+	"""
+	Recorded responses, one JSON file per request path and query, readable and diffable.
+	The bodies that are not UTF-8 text are kept in base64, as `body_base64`.
+	"""
+
+	def __init__(self, directory: str):
+		self.directory = directory
+		self.__loaded: Dict[str, Optional[Dict]] = {}
+
+	def __path(self, key: str) -> str:
+		return os.path.join(self.directory, f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.json")
+
+	def __len__(self) -> int:
+		if not os.path.isdir(self.directory):
+			return 0
+		return len([it for it in os.listdir(self.directory) if it.endswith('.json')])
+
+	def put(self, url: str, status: int, content_type: Optional[str], body: bytes) -> str:
+		key = fixture_key(url)
+		fixture = {'key': key, 'status': status, 'content_type': content_type}
+		try:
+			fixture['body'] = body.decode('utf-8')
+		except UnicodeDecodeError:
+			fixture['body_base64'] = base64.b64encode(body).decode('ascii')
+		os.makedirs(self.directory, exist_ok=True)
+		with tempfile.NamedTemporaryFile('w', dir=self.directory, delete=False, encoding='utf-8') as out_file:
+			json.dump(fixture, out_file, ensure_ascii=False, indent='\t')
+		os.replace(out_file.name, self.__path(key))
+		self.__loaded[key] = fixture
+		return key
+
+	def get(self, url: str) -> Optional[Dict]:
+		key = fixture_key(url)
+		if key not in self.__loaded:
+			path = self.__path(key)
+			if os.path.isfile(path):
+				with open(path, encoding='utf-8') as in_file:
+					self.__loaded[key] = json.load(in_file)
+			else:
+				self.__loaded[key] = None
+		return self.__loaded[key]
+
+	@staticmethod
+	def body(fixture: Dict) -> bytes:
+		if 'body_base64' in fixture:
+			return base64.b64decode(fixture['body_base64'])
+		return fixture['body'].encode('utf-8')
+
+
+class RecordingSession(object):
+	"""
+	A client session saving the successful responses it gets as fixtures.
+	"""
+
+	def __init__(self, session, fixtures: Fixtures):
+		self.session = session
+		self.fixtures = fixtures
+
+	@contextlib.asynccontextmanager
+	async def get(self, url: str, **kwargs) -> AsyncIterator:
+		async with self.session.get(url, **kwargs) as response:
+			if response.status != 200:
+				yield response
+				return
+			body = await response.read()
+			headers = {key: response.headers[key] for key in ('Content-Type',) if key in response.headers}
+			self.fixtures.put(url, response.status, headers.get('Content-Type'), body)
+			yield CachedResponse(response.status, headers, body, from_cache=False)
+
+
+class StandInServer(object):
+	"""
+	A local aiohttp server answering with the fixtures, in place of IEEE or ACM, for offline load tests.
+	Each answer waits `latency_s` plus up to `jitter_s`, and a `rate_429` share of them are 429.
+	"""
+
+	def __init__(
+			self, fixtures: Fixtures, latency_s: float = 0.0, jitter_s: float = 0.0, rate_429: float = 0.0,
+			host: str = '127.0.0.1', port: int = 0, seed: Optional[int] = None,
+	):
+		self.fixtures = fixtures
+		self.latency_s = latency_s
+		self.jitter_s = jitter_s
+		self.rate_429 = rate_429
+		self.host = host
+		self.port = port
+		self.random = random.Random(seed)
+		self.requests = 0
+		self.throttled = 0
+		self.not_found = 0
+		self.__runner: Optional[web.AppRunner] = None
+
+	@property
+	def base_url(self) -> str:
+		return f"http://{self.host}:{self.port}"
+
+	async def handle(self, request: web.Request) -> web.Response:
+		self.requests += 1
+		delay = self.latency_s + self.random.uniform(0, self.jitter_s)
+		if delay > 0:
+			await asyncio.sleep(delay)
+		if self.random.random() < self.rate_429:
+			self.throttled += 1
+			return web.Response(status=429, text='Too Many Requests', headers={'Retry-After': '1'})
+		fixture = self.fixtures.get(request.path_qs)
+		if fixture is None:
+			self.not_found += 1
+			return web.Response(status=404, text=f"No fixture for {request.path_qs}")
+		headers = {'Content-Type': fixture['content_type']} if fixture['content_type'] else None
+		return web.Response(status=fixture['status'], body=Fixtures.body(fixture), headers=headers)
+
+	async def start(self) -> str:
+		app = web.Application()
+		app.router.add_route('GET', '/{tail:.*}', self.handle)
+		self.__runner = web.AppRunner(app, access_log=None)
+		await self.__runner.setup()
+		await web.TCPSite(self.__runner, self.host, self.port).start()
+		# The port chosen by the system when it is 0
+		self.port = self.__runner.addresses[0][1]
+		return self.base_url
+
+	async def close(self):
+		if self.__runner:
+			await self.__runner.cleanup()
+			self.__runner = None
+
+	async def __aenter__(self) -> StandInServer:
+		await self.start()
+		return self
+
+	async def __aexit__(self, exc_type, exc_val, exc_tb):
+		await self.close()
+
+
+def parse_args():
+	parser = argparse.ArgumentParser(description='Serves recorded responses in place of IEEE or ACM')
+	parser.add_argument('--fixtures', default='data/fixtures', help='Fixtures directory, from --record-fixtures')
+	parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+	parser.add_argument('--port', default=8080, type=int, help='Port to listen on')
+	parser.add_argument('--latency', default=0.0, type=float, help='Time (s) before each answer')
+	parser.add_argument('--jitter', default=0.0, type=float, help='Up to this time (s) more before each answer')
+	parser.add_argument('--rate-429', default=0.0, type=float, help='Share of the requests answered with 429')
+	parser.add_argument('--seed', type=int, help='Seed of the latency and 429 choices')
+	return parser.parse_args()
+
+
+async def main():
+	args = parse_args()
+	fixtures = Fixtures(args.fixtures)
+	server = StandInServer(
+		fixtures, latency_s=args.latency, jitter_s=args.jitter, rate_429=args.rate_429, host=args.host,
+		port=args.port, seed=args.seed,
+	)
+	async with server:
+		print(f"Serving {len(fixtures)} fixtures on {server.base_url}")
+		try:
+			while True:
+				await asyncio.sleep(3600)
+		finally:
+			print(f"Requests: {server.requests}, 429: {server.throttled}, not found: {server.not_found}")
+
+
+if __name__ == '__main__':
+	try:
+		asyncio.run(main())
+	except KeyboardInterrupt:
+		pass
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import tempfile
+import time
+import unittest
+from replay import Fixtures, StandInServer, fixture_key
+from search import SearchRequest, SearchToken
+from search_source import ACMSearch, IEEESearch
+from search_source_test import acm_page
+
+loop = asyncio.get_event_loop()
+asyncio.set_event_loop(loop)
+
+
+def ieee_fixtures(fixtures: Fixtures, total_records: int, max_records: int = 50):
+	source = IEEESearch(api_key='123')
+	for start_record in range(1, total_records + 1, max_records):
+		last = min(total_records, start_record + max_records - 1)
+		articles = [{'title': f"Paper {i}"} for i in range(start_record, last + 1)]
+		body = {'total_records': total_records, 'articles': articles}
+		url = source.get_url(params={'article_title': 'bft'}, max_records=max_records, start_record=start_record)
+		fixtures.put(url, 200, 'application/json', json.dumps(body).encode('utf-8'))
+
+
+class FixturesTest(unittest.TestCase):
+	def test_key(self):
+		self.assertEqual(
+			'/api/v1/search/articles?format=json&start_record=1',
+			fixture_key('https://ieeexploreapi.ieee.org/api/v1/search/articles?apikey=123&format=json&start_record=1'),
+		)
+		self.assertEqual('/doi/10.1145/2020', fixture_key('http://127.0.0.1:8080/doi/10.1145/2020'))
+
+	def test_put_get(self):
+		with tempfile.TemporaryDirectory() as directory:
+			Fixtures(directory).put('https://dl.acm.org/doi/1?a=b c', 200, 'text/html', 'José'.encode('utf-8'))
+			fixtures = Fixtures(directory)
+			self.assertEqual(1, len(fixtures))
+			self.assertEqual('José', fixtures.get('http://127.0.0.1/doi/1?a=b+c')['body'])
+			self.assertIsNone(fixtures.get('http://127.0.0.1/doi/2'))
+
+	def test_not_utf8(self):
+		with tempfile.TemporaryDirectory() as directory:
+			content_type = 'text/html; charset=iso-8859-1'
+			Fixtures(directory).put('https://dl.acm.org/doi/1', 200, content_type, 'José'.encode('latin-1'))
+			Fixtures(directory).put('https://dl.acm.org/doi/2', 200, 'text/html', 'José'.encode('utf-8'))
+			fixtures = Fixtures(directory)
+			self.assertEqual('José'.encode('latin-1'), Fixtures.body(fixtures.get('https://dl.acm.org/doi/1')))
+			self.assertEqual('José'.encode('utf-8'), Fixtures.body(fixtures.get('https://dl.acm.org/doi/2')))
+
+
+class StandInServerTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.fixtures = Fixtures(self.directory.name)
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def search(self, source, server: StandInServer, fixtures: Fixtures = None):
+		async def the_test():
+			async with server:
+				source.protocol = 'http'
+				source.host = f"{server.host}:{server.port}"
+				source.fixtures = fixtures
+				return [it async for it in source.search(SearchRequest(SearchToken.Title, "bft"))]
+
+		return loop.run_until_complete(the_test())
+
+	def test_ieee_with_429(self):
+		ieee_fixtures(self.fixtures, total_records=230)
+		server = StandInServer(self.fixtures, rate_429=0.3, seed=1)
+		responses = self.search(IEEESearch(api_key='456', backoff_s=0.001, max_retries=10), server)
+		self.assertEqual([f"Paper {i}" for i in range(1, 231)], [it.article.title for it in responses])
+		self.assertGreater(server.throttled, 0)
+		self.assertEqual(5 + server.throttled, server.requests)
+		self.assertEqual(0, server.not_found)
+
+	def test_acm_with_latency(self):
+		source = ACMSearch(page_size=10, max_concurrent_pages=4, backoff_s=0.001)
+		for page in range(4):
+			titles = [f"Paper {i}" for i in range(page * 10, min(35, page * 10 + 10))]
+			url = source.get_url(source.get_filter(SearchRequest(SearchToken.Title, "bft")), page)
+			self.fixtures.put(url, 200, 'text/html; charset=utf-8', acm_page(titles, 35).encode('utf-8'))
+		server = StandInServer(self.fixtures, latency_s=0.05, jitter_s=0.02, rate_429=0.2, seed=2)
+		start = time.monotonic()
+		responses = self.search(source, server)
+		self.assertEqual({f"Paper {i}" for i in range(35)}, {it.article.title for it in responses})
+		self.assertGreaterEqual(time.monotonic() - start, 0.1)
+
+	def test_record_replay(self):
+		ieee_fixtures(self.fixtures, total_records=120)
+		with tempfile.TemporaryDirectory() as directory:
+			recorded = Fixtures(directory)
+			self.search(IEEESearch(api_key='456'), StandInServer(self.fixtures), fixtures=recorded)
+			self.assertEqual(3, len(recorded))
+			responses = self.search(IEEESearch(api_key='789'), StandInServer(recorded))
+		self.assertEqual(120, len(responses))
+
+
+if __name__ == '__main__':
+	unittest.main()
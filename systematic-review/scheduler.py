@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import time
+from cursor import Cursor
+from metrics import Metrics
+from search import SearchRequestSource, SearchResponse
+from source import Source
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, Optional, Tuple, Union
+from util import get_logger_child
+
+
+class SearchScheduler(object):
+	"""
+	Runs every search stream as its own task so a slow source does not hold back the others.
+	The number of streams fetching at the same time is bounded globally and per source, and
+	the results are handed to the consumer through a bounded queue. The cursors of a stream go through
+	the same queue, after the results they cover.
+	With `metrics`, the time a stream takes between cursors is observed as the latency of a page,
+	without the waits for the concurrency limits but with those of the rate limiter, and its results and errors
+	are counted, by source and request.
+	"""
+
+	def __init__(
+			self, max_concurrency: int = 8, max_concurrency_per_source: Dict[Source, int] = None,
+			queue_size: int = 1000, logger: logging.Logger = None, metrics: Optional[Metrics] = None,
+	):
+		self.logger = get_logger_child(type(self).__name__, logger)
+		self.max_concurrency = max_concurrency
+		self.max_concurrency_per_source: Dict[Source, int] = max_concurrency_per_source or {}
+		self.queue_size = queue_size
+		self.metrics = metrics
+
+	async def run(
+			self, streams: Iterable[Tuple[SearchRequestSource, AsyncIterator[Union[SearchResponse, Cursor]]]],
+	) -> AsyncIterable[Tuple[SearchRequestSource, Union[SearchResponse, Cursor]]]:
+		queue = asyncio.Queue(maxsize=self.queue_size or 0)
+		done = object()
+		global_limit = asyncio.Semaphore(self.max_concurrency) if self.max_concurrency else None
+		source_limits: Dict[Source, asyncio.Semaphore] = {
+			source: asyncio.Semaphore(limit) for source, limit in self.max_concurrency_per_source.items() if limit
+		}
+
+		async def next_item(search_source: SearchRequestSource, stream: AsyncIterator[Union[SearchResponse, Cursor]]):
+			# The source limit first, so the streams waiting on a saturated source hold no global slot
+			source_limit = source_limits.get(search_source.source)
+			if source_limit:
+				await source_limit.acquire()
+			try:
+				if global_limit:
+					await global_limit.acquire()
+				try:
+					start = time.perf_counter()
+					return await stream.__anext__(), time.perf_counter() - start
+				finally:
+					if global_limit:
+						global_limit.release()
+			finally:
+				if source_limit:
+					source_limit.release()
+
+		async def consume(search_source: SearchRequestSource, stream: AsyncIterator[Union[SearchResponse, Cursor]]):
+			labels = {
+				'source': search_source.source.name,
+				'request': f"{search_source.request.token.name}:{search_source.request.value}",
+			}
+			page_seconds = 0.0
+			page_articles = 0
+			try:
+				while True:
+					it, seconds = await next_item(search_source, stream)
+					if self.metrics is not None:
+						page_seconds += seconds
+						if not isinstance(it, Cursor):
+							page_articles += 1
+							self.metrics.increment('articles_total', **labels)
+						# The complete cursor ends a page only for the sources without partial ones
+						elif not it.complete or page_articles:
+							self.metrics.observe('page_seconds', page_seconds, **labels)
+							page_seconds = 0.0
+							page_articles = 0
+					await queue.put((search_source, it))
+			except (StopIteration, StopAsyncIteration):
+				self.logger.info(f"No more results for {search_source}")
+			except asyncio.CancelledError:
+				raise
+			except Exception:
+				self.logger.exception(f"There was a problem with the iterator for {search_source}")
+				if self.metrics is not None:
+					self.metrics.increment('stream_errors_total', **labels)
+
+		tasks = [asyncio.ensure_future(consume(search_source, stream)) for search_source, stream in streams]
+
+		async def wait_all():
+			await asyncio.gather(*tasks)
+			await queue.put(done)
+
+		waiter = asyncio.ensure_future(wait_all())
+		try:
+			while True:
+				it = await queue.get()
+				if it is done:
+					break
+				yield it
+		finally:
+			for task in tasks + [waiter]:
+				task.cancel()
+			await asyncio.gather(*tasks, waiter, return_exceptions=True)
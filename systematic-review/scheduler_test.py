@@ -0,0 +1,85 @@
+import asyncio
+import time
+import unittest
+from article import Article
+from scheduler import SearchScheduler
+from search import SearchRequest, SearchRequestSource, SearchResponse, SearchToken
+from source import Source
+
+loop = asyncio.get_event_loop()
+asyncio.set_event_loop(loop)
+
+
+async def slow_stream(search_source: SearchRequestSource, count: int, delay: float, running: list = None):
+	for i in range(count):
+		if running is not None:
+			running[0] += 1
+			running[1] = max(running[0], running[1])
+		await asyncio.sleep(delay)
+		if running is not None:
+			running[0] -= 1
+		yield SearchResponse(request_source=search_source, article=Article(title=f"Title {i}", author=[]))
+
+
+def request_source(value: str, source: Source) -> SearchRequestSource:
+	return SearchRequestSource(request=SearchRequest(token=SearchToken.Term, value=value), source=source)
+
+
+class SearchSchedulerTest(unittest.TestCase):
+	def test_streams_run_concurrently(self):
+		streams = [request_source(f"term {i}", Source.IEEE) for i in range(10)]
+
+		async def the_test():
+			scheduler = SearchScheduler(max_concurrency=10)
+			return [it async for it in scheduler.run([(it, slow_stream(it, 3, 0.05)) for it in streams])]
+
+		start = time.monotonic()
+		results = loop.run_until_complete(the_test())
+		self.assertEqual(30, len(results))
+		self.assertLess(time.monotonic() - start, 0.5)
+
+	def test_per_source_limit(self):
+		running = [0, 0]
+		streams = [request_source(f"term {i}", Source.ACM) for i in range(5)]
+
+		async def the_test():
+			scheduler = SearchScheduler(max_concurrency=10, max_concurrency_per_source={Source.ACM: 2}, queue_size=1)
+			return [it async for it in scheduler.run([(it, slow_stream(it, 2, 0.01, running)) for it in streams])]
+
+		self.assertEqual(10, len(loop.run_until_complete(the_test())))
+		self.assertEqual(2, running[1])
+
+	def test_saturated_source_does_not_block_others(self):
+		acm = [request_source(f"term {i}", Source.ACM) for i in range(6)]
+		ieee = [request_source(f"term {i}", Source.IEEE) for i in range(2)]
+
+		async def the_test():
+			scheduler = SearchScheduler(max_concurrency=4, max_concurrency_per_source={Source.ACM: 2})
+			streams = [(it, slow_stream(it, 1, 0.1)) for it in acm + ieee]
+			start = time.monotonic()
+			return [(it.source, time.monotonic() - start) async for it, _ in scheduler.run(streams)]
+
+		results = loop.run_until_complete(the_test())
+		self.assertEqual(8, len(results))
+		# The ACM streams waiting on their limit leave the other 2 global slots to IEEE, in the first round
+		self.assertLess(max(elapsed for source, elapsed in results if source == Source.IEEE), 0.18)
+
+	def test_failing_stream_does_not_stop_others(self):
+		ok = request_source("ok", Source.IEEE)
+		failing = request_source("failing", Source.ACM)
+
+		async def broken_stream():
+			yield SearchResponse(request_source=failing, article=Article(title="First", author=[]))
+			raise ValueError("broken page")
+
+		async def the_test():
+			scheduler = SearchScheduler()
+			return [it async for it in scheduler.run([(ok, slow_stream(ok, 3, 0.01)), (failing, broken_stream())])]
+
+		results = loop.run_until_complete(the_test())
+		self.assertEqual(3, len([it for it, _ in results if it == ok]))
+		self.assertEqual(1, len([it for it, _ in results if it == failing]))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -1,9 +1,14 @@
 from __future__ import annotations
 import abc
-from typing import Union, Optional
+import heapq
+import numpy as np
+from typing import Callable, Dict, Iterable, List, Union, Optional, Sequence, Tuple
 from article import Article
 from author import Author
+from author_index import AuthorIndex
 from cache import SearchCache
+from citation_graph import CitationGraph
+from util import batched
 
 
 class Score(object):
@@ -15,6 +20,20 @@ class Score(object):
 		else:
 			raise TypeError(f"The type {type(obj)} is not expected")
 
+	def prepare(self, articles: Iterable[Article]) -> Iterable[Article]:
+		"""
+		Called with all the articles to rank before they are scored, returns the ones to iterate instead.
+		"""
+		return articles
+
+	def score_articles(self, articles: Sequence[Article]) -> np.ndarray:
+		"""
+		The scores of the articles, missing values score 0.
+		"""
+		return np.fromiter(
+			(self._calculate_article_score(it) or 0 for it in articles), dtype=np.float64, count=len(articles),
+		)
+
 	@abc.abstractmethod
 	def _calculate_author_score(self, author: Author) -> int:
 		raise NotImplementedError()
@@ -33,39 +52,166 @@ class CitationScore(Score):
 	def _calculate_article_score(self, article: Article) -> int:
 		return article.citations
 
+	def score_articles(self, articles: Sequence[Article]) -> np.ndarray:
+		return np.fromiter((it.citations or 0 for it in articles), dtype=np.float64, count=len(articles))
+
+
+class _AuthorIndexes(dict):
+	"""
+	Index of each author name as written in the articles, resolved on first use.
+	"""
+
+	def __init__(self, authors: AuthorIndex, author_index: Callable[[Author], Optional[int]]):
+		super().__init__()
+		self.authors = authors
+		self.author_index = author_index
+
+	def __missing__(self, name: str) -> int:
+		author = self.authors.resolve(name)
+		value = self[name] = (self.author_index(author) or 0) if author else 0
+		return value
+
+
+class AuthorIndexScore(Score):
+	"""
+	Scores an article by the best index of its authors. The authors of the cache are indexed once,
+	on first use, and the names in the articles are resolved with `AuthorIndex`.
+	"""
 
-class HIndexScore(Score):
 	def __init__(self, cache: Optional[SearchCache]):
 		self.cache = cache
+		self.__indexes: Optional[_AuthorIndexes] = None
+		self.__article_scores: Dict[Tuple[str, Tuple[str, ...]], int] = {}
 
 	@abc.abstractmethod
 	def _calculate_author_score(self, author: Author) -> int:
-		return author.h_index
+		raise NotImplementedError()
 
-	@abc.abstractmethod
 	def _calculate_article_score(self, article: Article) -> int:
-		if not self.cache:
+		key = (article.normalized_title, tuple(article.author))
+		resp = self.__article_scores.get(key)
+		if resp is None:
+			indexes = self.indexes()
+			resp = self.__article_scores[key] = max([indexes[it] for it in article.author] or [0])
+		return resp
+
+	def indexes(self) -> _AuthorIndexes:
+		# An empty cache is false, it still has the authors
+		if self.cache is None:
 			raise NotImplementedError()
-		return max(map(lambda x: x.h_index if x else 0, [
-			self.cache.find_author(author_name)
-			for author_name in article.author
-		]))
-
+		if self.__indexes is None:
+			self.__indexes = _AuthorIndexes(AuthorIndex(self.cache.authors.values()), self._calculate_author_score)
+		return self.__indexes
+
+	def score_articles(self, articles: Sequence[Article]) -> np.ndarray:
+		indexes = self.indexes()
+		counts = np.fromiter((len(it.author) for it in articles), dtype=np.int64, count=len(articles))
+		values = np.fromiter(
+			(indexes[name] for it in articles for name in it.author),
+			dtype=np.float64, count=int(counts.sum()),
+		)
+		resp = np.zeros(len(articles), dtype=np.float64)
+		with_authors = np.flatnonzero(counts)
+		if len(with_authors):
+			offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))[with_authors]
+			resp[with_authors] = np.maximum.reduceat(values, offsets)
+		return resp
+
+
+class HIndexScore(AuthorIndexScore):
+	@abc.abstractmethod
+	def _calculate_author_score(self, author: Author) -> int:
+		return author.h_index
 
-class I10IndexScore(Score):
-	def __init__(self, cache: Optional[SearchCache]):
-		self.cache = cache
 
+class I10IndexScore(AuthorIndexScore):
 	@abc.abstractmethod
 	def _calculate_author_score(self, author: Author) -> int:
 		return author.i10_index
 
-	@abc.abstractmethod
-	def _calculate_article_score(self, article: Article) -> int:
-		if not self.cache:
-			raise NotImplementedError()
-		return max(map(lambda x: x.i10_index if x else 0, [
-			self.cache.find_author(author_name)
-			for author_name in article.author
-		]))
 
+class GraphScore(Score):
+	"""
+	Scores the articles by their place in the citation graph of the articles being ranked, or of all
+	the unique articles of the cache when scored without a rank, built on first use.
+	"""
+
+	def __init__(self, cache: Optional[SearchCache], measure: str = 'pagerank'):
+		self.cache = cache
+		self.measure = measure
+		self.__scores: Optional[Dict[str, float]] = None
+
+	def _calculate_author_score(self, author: Author) -> int:
+		raise TypeError("Only articles have a place in the citation graph")
+
+	def _calculate_article_score(self, article: Article) -> float:
+		return self.score_articles([article])[0]
+
+	def prepare(self, articles: Iterable[Article]) -> Iterable[Article]:
+		# The same articles, deduplicated or not, so each of them is a node of the graph
+		articles = list(articles)
+		self.__build(articles)
+		return articles
+
+	def __build(self, articles: Iterable[Article]):
+		graph = CitationGraph.build(articles)
+		values = graph.pagerank() if self.measure == 'pagerank' else graph.in_degree().astype(np.float64)
+		self.__scores = {it.normalized_title: float(value) for it, value in zip(graph.articles, values)}
+
+	def score_articles(self, articles: Sequence[Article]) -> np.ndarray:
+		if self.__scores is None:
+			self.__build(self.cache.unique_articles())
+		return np.fromiter(
+			(self.__scores.get(it.normalized_title, 0.0) for it in articles), dtype=np.float64, count=len(articles),
+		)
+
+
+SCORES = {
+	'citations': lambda cache: CitationScore(),
+	'h_index': HIndexScore,
+	'i10_index': I10IndexScore,
+	'pagerank': lambda cache: GraphScore(cache, 'pagerank'),
+	'in_degree': lambda cache: GraphScore(cache, 'in_degree'),
+}
+
+
+def rank(
+		score: Score, articles: Iterable[Article], threshold: Optional[float] = None, top_k: Optional[int] = None,
+		batch_size: int = 1 << 16,
+) -> List[Tuple[float, Article]]:
+	"""
+	The articles scoring at least the threshold, best first, and only the `top_k` best when it is set.
+	Articles are scored in batches, and with `top_k` only a heap of the best ones is kept.
+	Ties keep the order of the articles.
+	"""
+	articles = score.prepare(articles)
+	heap: List[Tuple[float, int, Article]] = []
+	selected_scores: List[np.ndarray] = []
+	selected_articles: List[Article] = []
+	position = 0
+	for batch in batched(articles, batch_size):
+		scores = score.score_articles(batch)
+		selected = np.ones(len(batch), dtype=bool) if threshold is None else scores >= threshold
+		if top_k is None:
+			selected_scores.append(scores[selected])
+			selected_articles.extend(batch[i] for i in np.flatnonzero(selected))
+			continue
+		if len(heap) >= top_k:
+			# Only the ones better than the worst kept can enter the heap
+			selected &= (scores > heap[0][0]) if heap else False
+		for i in np.flatnonzero(selected):
+			# The position is negative, so among equal scores the later articles leave the heap first
+			item = (float(scores[i]), -(position + int(i)), batch[i])
+			if len(heap) < top_k:
+				heapq.heappush(heap, item)
+			elif item[:2] > heap[0][:2]:
+				heapq.heapreplace(heap, item)
+		position += len(batch)
+
+	if top_k is None:
+		scores = np.concatenate(selected_scores) if selected_scores else np.zeros(0)
+		# Stable, so equal scores keep the order of the articles
+		order = np.argsort(-scores, kind='stable')
+		return [(float(scores[i]), selected_articles[i]) for i in order]
+	heap.sort(key=lambda it: it[:2], reverse=True)
+	return [(it[0], it[2]) for it in heap]
@@ -0,0 +1,95 @@
+import unittest
+from article import Article
+from author import Author
+from cache import SearchCache
+from score import CitationScore, GraphScore, HIndexScore, I10IndexScore, rank
+from search import SearchRequest, SearchRequestSource, SearchResponse, SearchToken
+from source import Source
+
+
+def articles():
+	return [
+		Article(title="New BFT", author=["José da Silva", "Barbara Liskov"], citations=10),
+		Article(title="Consensus", author=["Barbara Liskov"], citations=None),
+		Article(title="Smart contracts", author=[], citations=3),
+		Article(title="Replication", author=["Unknown Author"], citations=10),
+	]
+
+
+class ScoreTest(unittest.TestCase):
+	def setUp(self):
+		self.cache = SearchCache()
+		self.cache.add_author(Author(name="Jose da Silva", affiliation=None, citations=None, h_index=30, i10_index=5))
+		self.cache.add_author(Author(name="Barbara Liskov", affiliation=None, citations=None, h_index=20))
+
+	def test_score_articles(self):
+		self.assertEqual([10, 0, 3, 10], CitationScore().score_articles(articles()).tolist())
+		self.assertEqual([30, 20, 0, 0], HIndexScore(self.cache).score_articles(articles()).tolist())
+		self.assertEqual([5, 0, 0, 0], I10IndexScore(self.cache).score_articles(articles()).tolist())
+		self.assertEqual([], HIndexScore(self.cache).score_articles([]).tolist())
+
+	def test_name_resolution(self):
+		abbreviated = [
+			Article(title="New BFT", author=["J. Silva", "B. Liskov"]),
+			Article(title="Consensus", author=["B. Liskov"]),
+			Article(title="Replication", author=["A. Silva"]),
+		]
+		score = HIndexScore(self.cache)
+		self.assertEqual([30, 20, 0], score.score_articles(abbreviated).tolist())
+		self.assertEqual([30, 20, 0], [score.calculate_score(it) for it in abbreviated])
+		self.assertEqual(30, score.calculate_score(abbreviated[0]))
+
+	def test_graph_score(self):
+		cache = SearchCache()
+		acm = SearchRequestSource(request=SearchRequest(token=SearchToken.Term, value="BFT"), source=Source.ACM)
+		consensus = Article(title="Consensus", author=[])
+		graph_articles = [
+			consensus,
+			Article(title="New BFT", author=[], references=[consensus]),
+			Article(title="Replication", author=[], references=[consensus, "New BFT"]),
+		]
+		for article in graph_articles:
+			cache[acm] = SearchResponse(request_source=acm, article=article)
+		self.assertEqual([1, 2, 0, 0], GraphScore(cache, 'in_degree').score_articles(articles()).tolist())
+		ranked = rank(GraphScore(cache, 'pagerank'), graph_articles + [Article(title="Smart contracts", author=[])])
+		self.assertEqual(["Consensus", "New BFT", "Replication", "Smart contracts"], [it.title for _, it in ranked])
+		self.assertEqual(0, GraphScore(cache).calculate_score(articles()[2]))
+
+	def test_graph_of_the_ranked_articles(self):
+		# Merged by the deduplicator, so not in the cache as they are ranked
+		consensus = Article(title="Consensus protocols", author=[])
+		ranked = [
+			Article(title="New BFT", author=[], references=["Consensus protocols"]),
+			consensus,
+			Article(title="Replication", author=[], references=[consensus]),
+		]
+		ranked = rank(GraphScore(SearchCache(), 'in_degree'), ranked)
+		self.assertEqual([(2, "Consensus protocols"), (0, "New BFT"), (0, "Replication")], [
+			(score, it.title) for score, it in ranked
+		])
+
+	def test_calculate_score(self):
+		self.assertEqual(10, CitationScore().calculate_score(articles()[0]))
+		with self.assertRaises(TypeError):
+			CitationScore().calculate_score("New BFT")
+
+	def test_rank(self):
+		ranked = rank(CitationScore(), articles())
+		self.assertEqual(
+			[(10, "New BFT"), (10, "Replication"), (3, "Smart contracts"), (0, "Consensus")],
+			[(score, it.title) for score, it in ranked],
+		)
+		ranked = rank(HIndexScore(self.cache), articles(), threshold=20)
+		self.assertEqual(["New BFT", "Consensus"], [it.title for _, it in ranked])
+		self.assertEqual([], rank(HIndexScore(self.cache), articles(), threshold=31))
+
+	def test_top_k(self):
+		many = [Article(title=f"Article {i}", author=[], citations=(i * 7) % 100) for i in range(1000)]
+		expected = sorted(range(1000), key=lambda i: (-((i * 7) % 100), i))
+		for batch_size in (1, 7, 1000):
+			ranked = rank(CitationScore(), many, top_k=25, batch_size=batch_size)
+			self.assertEqual([many[i] for i in expected[:25]], [it for _, it in ranked])
+			ranked = rank(CitationScore(), many, threshold=50, top_k=2000, batch_size=batch_size)
+			self.assertEqual(500, len(ranked))
+			self.assertEqual([many[i] for i in expected[:500]], [it for _, it in ranked])
+		self.assertEqual([], rank(CitationScore(), many, top_k=0))
@@ -1,6 +1,8 @@
 from enum import Enum
+from typing import Optional
 from article import Article
 from source import Source
+from util import Slotted, intern_text
 import json
 
 
@@ -16,13 +18,18 @@ class SearchToken(Enum):
 		return self.__str__()
 
 
-class SearchRequest(object):
+class SearchRequest(Slotted):
+	__slots__ = ('token', 'value')
+
 	def __init__(self, token: SearchToken, value: str):
 		self.token = token
-		self.value = value
+		self.value = intern_text(value)
+
+	def _compact(self):
+		self.value = intern_text(self.value)
 
 	def __str__(self) -> str:
-		return json.dumps(self.__dict__, default=str)
+		return json.dumps(self.__getstate__(), default=str)
 
 	def __repr__(self):
 		return self.__str__()
@@ -34,13 +41,15 @@ class SearchRequest(object):
 		return type(other) is SearchRequest and self.token == other.token and self.value == other.value
 
 
-class SearchRequestSource(object):
+class SearchRequestSource(Slotted):
+	__slots__ = ('request', 'source')
+
 	def __init__(self, request: SearchRequest, source: Source):
 		self.request = request
 		self.source = source
 
 	def __str__(self) -> str:
-		return json.dumps(self.__dict__, default=str)
+		return json.dumps(self.__getstate__(), default=str)
 
 	def __repr__(self):
 		return self.__str__()
@@ -52,14 +61,21 @@ class SearchRequestSource(object):
 		return type(other) is SearchRequestSource and self.request == other.request and self.source == other.source
 
 
-class SearchResponse(object):
-	def __init__(self, request_source: SearchRequestSource, article: Article, raw: object = object()):
+class SearchResponse(Slotted):
+	__slots__ = ('request_source', 'article', 'raw', 'raw_key')
+
+	def __init__(
+			self, request_source: SearchRequestSource, article: Article, raw: object = None,
+			raw_key: Optional[str] = None,
+	):
 		self.request_source = request_source
 		self.article = article
 		self.raw = raw
+		# Key of the raw payload in the cache's blob store, when it was moved there
+		self.raw_key = raw_key
 
 	def __str__(self) -> str:
-		return json.dumps(self.__dict__, default=str)
+		return json.dumps(self.__getstate__(), default=str)
 
 	def __repr__(self):
 		return self.__str__()
@@ -1,12 +1,23 @@
+import contextlib
 import json
 import logging
-import os.path
-import time
+import os
 from article import Article
+from blob_store import BlobStore
 from cache import SearchCache
+from cursor import Cursor, CursorStore
+from dedup import Deduplicator
+from http_cache import HttpCache
+from http_pool import HttpPool
+from metrics import LoopMonitor, Metrics
+from rate_limiter import RateLimiter, interval_to_rate
+from replay import Fixtures
+from scheduler import SearchScheduler
 from search import SearchRequest, SearchRequestSource
 from search_source import SearchSource
-from typing import Set, List, Optional, Iterable
+from source import Source
+from sqlite_cache import SQLiteSearchCache
+from typing import Dict, Set, List, Optional, Iterable
 from util import get_logger_child
 
 
@@ -17,12 +28,36 @@ class SearchEngine(object):
 	):
 		self.logger = get_logger_child(type(self).__name__, logger)
 		self.save_every: Optional[int] = 100
+		# The whole cache is rewritten once the journal is larger than this share of the dump, so the
+		# rewrites at least double the dump each time and their total cost stays linear in the cache size
+		self.compact_ratio: Optional[float] = 1.0
 		self.sleep_between_calls_ms: Optional[int] = 100
+		self.rates: Dict[Source, float] = {}
+		self.bursts: Dict[Source, int] = {}
+		self.max_concurrency: Optional[int] = 8
+		self.max_concurrency_per_source: Dict[Source, int] = {}
+		self.queue_size: Optional[int] = 1000
+		self.http_pool = HttpPool()
+		# Raw HTTP responses kept on disk and revalidated, so re-running a query skips unchanged pages
+		self.http_cache: Optional[HttpCache] = None
+		# The responses of the HTTP sources are recorded there as fixtures, if set
+		self.fixtures: Optional[Fixtures] = None
+		# Latencies, throughput, errors and dump timings of the run, if set
+		self.metrics: Optional[Metrics] = None
+		# Merges the near duplicates when listing or exporting the cache, if set
+		self.deduplicator: Optional[Deduplicator] = None
 		self.sources: List[SearchSource] = []
 		self.requests: Set[SearchRequest] = set()
 		self.compress: bool = True
 		self.cache_file_name = cache_file_name
+		self.cache_backend = 'pickle'
+		# Raw payloads of the sources: kept in a blob store next to the cache, dropped, or inline in the cache
+		self.raw = 'store'
+		self.raw_directory: Optional[str] = None
+		self.cursors_file_name: Optional[str] = None
 		self.cache: Optional[SearchCache] = None
+		# Where each search stream stopped, so an interrupted run goes on from there
+		self.cursors: Optional[CursorStore] = None
 		self.found_titles: Set[str] = set()
 		self.ignore_cache = ignore_cache
 
@@ -40,54 +75,133 @@ class SearchEngine(object):
 			self.logger.warning("No source was selected")
 		self.logger.info(f"Requests: {[x for x in self.requests]}")
 
+		if self.metrics is not None:
+			self.metrics.start()
 		if not self.cache:
-			if os.path.exists(self.cache_file_name) and os.path.isfile(self.cache_file_name):
-				self.cache = SearchCache.load(filename=self.cache_file_name, compress=self.compress)
-			else:
-				self.cache = SearchCache()
+			self.cache = self.load_cache()
+		raw_directory = self.raw_directory or f"{self.cache_file_name}.raw"
+		self.cache.blob_store = BlobStore(raw_directory, compress=self.compress) if self.raw == 'store' else None
+		self.cache.drop_raw = self.raw == 'drop'
+		if self.cache.blob_store or self.cache.drop_raw:
+			moved = self.cache.move_raw()
+			if moved:
+				self.logger.info(f"{moved} raw payloads moved out of the cache, dumping it")
+				self.cache.dump(filename=self.cache_file_name, compress=self.compress)
+		if self.cursors is None:
+			self.cursors = CursorStore.load(
+				self.cursors_file_name or f"{self.cache_file_name}.cursors", ignore_case=self.cache.ignore_case,
+			)
+
+		rate_limiter = RateLimiter(
+			rates=self.rates, bursts=self.bursts, default_rate=interval_to_rate(self.sleep_between_calls_ms),
+		)
+		for source in self.sources:
+			source.rate_limiter = rate_limiter.bucket(source.source())
+			self.logger.info(f"Source: {source.source()} rate limit: {source.rate_limiter or 'unlimited'}")
 
 		count_articles = 0
 		to_wait = []
 		for request in self.requests:
 			for source in self.sources:
 				search_source = SearchRequestSource(request, source.source())
-				if self.ignore_cache or search_source not in self.cache:
-					to_wait += [(search_source, source.search(request))]
-				else:
+				if self.ignore_cache:
+					del self.cursors[search_source]
+				elif not self.cursors.exists and search_source in self.cache:
+					# A cache from before the cursors, its streams were taken as done
+					self.cursors[search_source] = Cursor(complete=True)
+				cursor = self.cursors[search_source]
+				if cursor and cursor.complete:
 					self.logger.info(f"Source: {source} is using cache for {request}")
+					continue
+				if cursor:
+					self.logger.info(f"Source: {source} is resuming {request} from {cursor.position}")
+				to_wait += [(search_source, source.resume(request, cursor.position if cursor else None))]
 				for author in source.found_authors():
 					self.cache.add_author(author)
 
+		def timed(kind: str):
+			if self.metrics is None:
+				return contextlib.nullcontext()
+			return self.metrics.timed('cache_dump_seconds', kind=kind)
+
 		def dump():
 			self.logger.info(f"Dumping cache of size: {len(self.cache)}")
-			self.cache.dump(filename=self.cache_file_name, compress=self.compress)
+			with timed('dump'):
+				self.cache.dump(filename=self.cache_file_name, compress=self.compress)
+			# After the cache, the cursors never cover responses that were not saved
+			self.cursors.dump()
 			self.logger.info(f"Dump finished")
 
-		has_new = [True]
-		while has_new and all(has_new):
-			self.logger.debug(f"Articles: {count_articles}, requests: {[it for it, _ in to_wait]}")
-			has_new = []
-			for search_source, resp in to_wait:
+		def compact_due() -> bool:
+			journal_file_name = SearchCache.journal_file_name(self.cache_file_name)
+			if not self.compact_ratio or not os.path.isfile(journal_file_name):
+				return False
+			dump_size = os.path.getsize(self.cache_file_name) if os.path.isfile(self.cache_file_name) else 0
+			return os.path.getsize(journal_file_name) > self.compact_ratio * dump_size
+
+		def checkpoint():
+			if compact_due():
+				dump()
+			else:
+				with timed('checkpoint'):
+					count = self.cache.checkpoint(filename=self.cache_file_name, compress=self.compress)
+				self.cursors.dump()
+				self.logger.info(f"Checkpoint of {count} changes to the cache journal")
+
+		scheduler = SearchScheduler(
+			max_concurrency=self.max_concurrency, max_concurrency_per_source=self.max_concurrency_per_source,
+			queue_size=self.queue_size, logger=self.logger, metrics=self.metrics,
+		)
+		sources = {source.source(): source for source in self.sources}
+		loop_monitor = LoopMonitor(self.metrics) if self.metrics is not None else None
+		if loop_monitor:
+			loop_monitor.start()
+		try:
+			async with self.http_pool as session:
+				for source in self.sources:
+					source.session = session
+					source.http_cache = self.http_cache
+					source.fixtures = self.fixtures
+					source.metrics = self.metrics
+				results = scheduler.run(to_wait)
 				try:
-					it = await resp.__anext__()
-					self.cache[search_source] = it
-					self.found_titles.add(it.article.normalized_title)
-					count_articles += 1
-					has_new.append(True)
-
-					if self.save_every and count_articles % self.save_every == 0:
-						dump()
-				except (StopIteration, StopAsyncIteration):
-					self.logger.info(f"No more results for {search_source}")
-					has_new.append(False)
-				except Exception:
-					self.logger.exception(f"There was a problem with the iterator for {search_source}")
-					has_new.append(False)
-			to_wait = [to_wait[i] for i in range(len(to_wait)) if has_new[i]]
-			if self.sleep_between_calls_ms:
-				time.sleep(self.sleep_between_calls_ms / 1000.0)
-
-		dump()
+					async for search_source, it in results:
+						if isinstance(it, Cursor):
+							self.cursors[search_source] = it
+							continue
+						self.cache[search_source] = it
+						self.found_titles.add(it.article.normalized_title)
+						for author in sources[search_source.source].found_authors():
+							self.cache.add_author(author)
+						count_articles += 1
+						self.logger.debug(f"Articles: {count_articles}, last request: {search_source}")
+
+						if self.save_every and count_articles % self.save_every == 0:
+							checkpoint()
+				finally:
+					await results.aclose()
+					for source in self.sources:
+						source.session = None
+
+			dump()
+		finally:
+			for source in self.sources:
+				source.close()
+			if loop_monitor:
+				await loop_monitor.stop()
+			if self.metrics is not None:
+				self.metrics.finish()
+		if self.http_cache:
+			self.logger.info(f"HTTP cache: {self.http_cache}")
+		if self.metrics is not None:
+			self.logger.info(f"Articles per second: {self.metrics.articles_per_second()}")
+
+	def load_cache(self) -> SearchCache:
+		if self.cache_backend == 'sqlite':
+			return SQLiteSearchCache.load(filename=self.cache_file_name)
+		if SearchCache.exists(self.cache_file_name):
+			return SearchCache.load(filename=self.cache_file_name, compress=self.compress)
+		return SearchCache()
 
 	def found_articles(self) -> Iterable[Article]:
 		for article in self.cache.unique_articles():
@@ -1,29 +1,71 @@
 from __future__ import annotations
 import abc
-import aiohttp
+import asyncio
+import collections
+import contextlib
 import json
+import time
 import urllib.parse
 from article import Article
 from author import Author
-from typing import Iterable, Dict, AsyncIterable, Optional, List
+from acm_parser import PARSERS, find_class, parse_references
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from cursor import Cursor
+from http_cache import CachedSession, HttpCache
+from metrics import MeteredSession, Metrics
+from typing import Iterable, Dict, AsyncIterable, AsyncIterator, Optional, List, Callable, Tuple, Union
 from scholarly import scholarly, ProxyGenerator
 from elsapy.elsclient import ElsClient
 from elsapy.elssearch import ElsSearch
+import aiohttp
 from aiohttp import ClientSession
+from rate_limiter import ThrottledSession, TokenBucket
+from replay import Fixtures, RecordingSession
 from search import SearchRequest, SearchResponse, SearchToken, SearchRequestSource, Source
-from bs4 import BeautifulSoup
+from util import enumerate_async, get_logger_child, iterate_blocking, prefetch, prefetch_unordered, to_async
 
 
 class SearchSource(object):
 	def __init__(self):
 		self.__found_authors: List[Author] = []
+		self.rate_limiter: Optional[TokenBucket] = None
+		self.session: Optional[ClientSession] = None
+		# The HTTP sources read their pages through it, when set
+		self.http_cache: Optional[HttpCache] = None
+		# The HTTP sources save the responses they get as fixtures, when set
+		self.fixtures: Optional[Fixtures] = None
+		# The HTTP sources time their requests and count their retries in it, when set
+		self.metrics: Optional[Metrics] = None
+		self.logger = get_logger_child(type(self).__name__)
 
 	@abc.abstractmethod
 	async def search(self, request: SearchRequest) -> AsyncIterable[SearchResponse]:
 		raise NotImplementedError()
 
+	async def resume(
+			self, request: SearchRequest, position: Optional[Dict] = None,
+	) -> AsyncIterable[Union[SearchResponse, Cursor]]:
+		"""
+		The search from the position of a partial cursor, yielding a cursor after the responses it covers
+		and a complete one at the end. Sources that can not resume start over and only complete.
+		"""
+		async for it in self.search(request):
+			yield it
+		yield Cursor(complete=True)
+
+	@staticmethod
+	async def _responses(stream: AsyncIterable[Union[SearchResponse, Cursor]]) -> AsyncIterable[SearchResponse]:
+		async for it in stream:
+			if not isinstance(it, Cursor):
+				yield it
+
+	def close(self):
+		"""
+		Releases the workers of the source, at the end of a run. They are started again by the next search.
+		"""
+
 	def __str__(self) -> str:
-		return json.dumps(self.__dict__)
+		return json.dumps(self.__dict__, default=str)
 
 	def __repr__(self):
 		return self.__str__()
@@ -40,23 +82,91 @@ class SearchSource(object):
 	def _add_author(self, author: Author):
 		self.__found_authors.append(author)
 
+	def _retried(self):
+		if self.metrics is not None:
+			self.metrics.increment('retries_total', source=self.source().name)
+
+	async def _throttle(self):
+		if self.rate_limiter:
+			start = time.perf_counter()
+			await self.rate_limiter.acquire()
+			if self.metrics is not None:
+				self.metrics.observe('throttle_seconds', time.perf_counter() - start, source=self.source().name)
+
+	@contextlib.asynccontextmanager
+	async def _client_session(self) -> AsyncIterator[ClientSession]:
+		"""
+		Uses the session shared by the engine, or a session of its own when running standalone, throttling
+		the requests to the network, recording the responses and reading through the HTTP cache if they are set.
+		"""
+		if self.session:
+			yield self.__wrap_session(self.session)
+		else:
+			async with ClientSession() as session:
+				yield self.__wrap_session(session)
+
+	def __wrap_session(self, session: ClientSession):
+		# Closest to the network, so the hits of the HTTP cache are not timed as requests
+		if self.metrics is not None:
+			session = MeteredSession(session, self.metrics, self.source().name)
+		# Outside the timing of the requests and behind the HTTP cache, so only the network requests wait
+		if self.rate_limiter:
+			session = ThrottledSession(session, self.rate_limiter, self.metrics, self.source().name)
+		if self.fixtures is not None:
+			session = RecordingSession(session, self.fixtures)
+		if self.http_cache:
+			session = CachedSession(session, self.http_cache)
+		return session
+
 
 class GoogleScholarSearch(SearchSource):
 	__is_using_proxy = False
 
-	def __init__(self, use_proxy: bool = True):
+	def __init__(
+			self, use_proxy: bool = True, workers: int = 4, queue_size: int = 10,
+			iterator_workers: Optional[int] = None,
+	):
 		super().__init__()
 		self.__found_authors: List[Author] = []
+		self.workers = workers
+		self.queue_size = queue_size
+		self.iterator_workers = iterator_workers or workers
+		# scholarly is blocking, its iterators and fills run in pools of threads so they do not stall the event loop.
+		# The iterators get a pool of their own, so the page reads of the streams can not starve the fills.
+		self.__fill_executor: Optional[ThreadPoolExecutor] = None
+		self.__iterator_executor: Optional[ThreadPoolExecutor] = None
 		if use_proxy and not GoogleScholarSearch.__is_using_proxy:
 			pg = ProxyGenerator()
 			pg.FreeProxies()
 			scholarly.use_proxy(pg)
 			GoogleScholarSearch.__is_using_proxy = True
 
-	async def search(self, request: SearchRequest) -> AsyncIterable[SearchResponse]:
-		def process_publication(pub) -> Iterable[SearchResponse]:
-			pub.fill()
-			yield SearchResponse(
+	def search(self, request: SearchRequest) -> AsyncIterable[SearchResponse]:
+		return self._responses(self.resume(request))
+
+	async def resume(
+			self, request: SearchRequest, position: Optional[Dict] = None,
+	) -> AsyncIterable[Union[SearchResponse, Cursor]]:
+		"""
+		The position is the next author, for author and term searches, and the next publication.
+		"""
+		loop = asyncio.get_event_loop()
+		if not self.__fill_executor:
+			self.__fill_executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='scholar-fill')
+			self.__iterator_executor = ThreadPoolExecutor(
+				max_workers=self.iterator_workers, thread_name_prefix='scholar-iterator',
+			)
+		fill_executor, iterator_executor = self.__fill_executor, self.__iterator_executor
+
+		async def fill(obj):
+			await self._throttle()
+			return await loop.run_in_executor(fill_executor, obj.fill)
+
+		def iterate(factory: Callable[[], Iterable]) -> AsyncIterable:
+			return iterate_blocking(factory, iterator_executor, queue_size=self.queue_size)
+
+		def build_response(pub) -> SearchResponse:
+			return SearchResponse(
 				request_source=SearchRequestSource(
 					request=request,
 					source=Source.GoogleScholar,
@@ -73,32 +183,67 @@ class GoogleScholarSearch(SearchSource):
 				raw=pub,
 			)
 
-		def process_author(author) -> Iterable[SearchResponse]:
-			author.fill()
-			self._add_author(GoogleScholarSearch.build_author(author))
-			for author_it in author.get('coauthors', []):
-				self._add_author(GoogleScholarSearch.build_author(author_it))
+		async def process_publications(pubs: AsyncIterable, skip: int = 0) -> AsyncIterable[Tuple[int, SearchResponse]]:
+			# Keeps up to `workers` fills running, yielding the publications in their original order.
+			# The iterators can not seek, the first `skip` publications are passed over without filling.
+			pending = collections.deque()
+			try:
+				async for index, pub in enumerate_async(pubs):
+					if index < skip:
+						continue
+					pending.append((index, pub, asyncio.ensure_future(fill(pub))))
+					if len(pending) >= self.workers:
+						index, pub, future = pending.popleft()
+						await future
+						yield index, build_response(pub)
+				while pending:
+					index, pub, future = pending.popleft()
+					await future
+					yield index, build_response(pub)
+			finally:
+				for _, _, future in pending:
+					future.cancel()
+
+		async def process_authors(authors: AsyncIterable) -> AsyncIterable[Union[SearchResponse, Cursor]]:
+			first_author = position.get('author', 0)
+			async for author_position, author in enumerate_async(authors):
+				if author_position < first_author:
+					continue
+				await fill(author)
+				self._add_author(GoogleScholarSearch.build_author(author))
+				for author_it in author.get('coauthors', []):
+					self._add_author(GoogleScholarSearch.build_author(author_it))
 
-			for pub in author.publications:
-				for it in process_publication(pub):
+				skip = position.get('publication', 0) if author_position == first_author else 0
+				async for pub_position, it in process_publications(to_async(author.publications), skip):
 					yield it
+					yield Cursor({'author': author_position, 'publication': pub_position + 1})
+				yield Cursor({'author': author_position + 1, 'publication': 0})
 
+		position = position or {}
 		if request.token == SearchToken.Author:
-			for author in scholarly.search_author(request.value):
-				for it in process_author(author):
-					yield it
+			async for it in process_authors(iterate(lambda: scholarly.search_author(request.value))):
+				yield it
 		elif request.token == SearchToken.Term:
-			for author in scholarly.search_keyword(request.value):
-				for it in process_author(author):
-					yield it
+			async for it in process_authors(iterate(lambda: scholarly.search_keyword(request.value))):
+				yield it
 		elif request.token == SearchToken.Title:
-			for pub in scholarly.search_pubs(request.value):
-				for it in process_publication(pub):
-					yield it
+			pubs = iterate(lambda: scholarly.search_pubs(request.value))
+			async for pub_position, it in process_publications(pubs, position.get('publication', 0)):
+				yield it
+				yield Cursor({'publication': pub_position + 1})
+		yield Cursor(complete=True)
 
 	def source(self) -> Source:
 		return Source.GoogleScholar
 
+	def close(self):
+		# Without waiting for the scholarly calls in progress, their results are no longer read
+		for executor in (self.__fill_executor, self.__iterator_executor):
+			if executor:
+				executor.shutdown(wait=False)
+		self.__fill_executor = self.__iterator_executor = None
+
 	@staticmethod
 	def build_author(author) -> Author:
 		return Author(
@@ -146,15 +291,18 @@ class ScopusSearch(SearchSource):
 
 
 class IEEESearch(SearchSource):
-	def __init__(self, api_key: str):
+	def __init__(self, api_key: str, prefetch_pages: int = 4, max_retries: int = 5, backoff_s: float = 1.0):
 		super().__init__()
 		self.api_key = api_key
 		self.api_version = 'v1'
 		self.protocol = 'https'
+		self.host = 'ieeexploreapi.ieee.org'
+		self.prefetch_pages = prefetch_pages
+		self.max_retries = max_retries
+		self.backoff_s = backoff_s
 
 	def get_url(self, params: Dict[str, object] = None, max_records: int = 50, start_record: int = 1) -> str:
-		if not params:
-			params = {}
+		params = dict(params or {})
 		# http://ieeexploreapi.ieee.org/api/v1/search/articles?apikey=8ne98h79n4j299yw79dx96bn&format=xml&max_records=25&start_record=1&sort_order=asc&sort_field=article_number&author=Rodolfo+Pereira+Araujo
 		params['apikey'] = self.api_key
 		params['format'] = 'json'
@@ -168,11 +316,14 @@ class IEEESearch(SearchSource):
 
 		params_str = '&'.join(
 			[f"{urllib.parse.quote(str(param))}={urllib.parse.quote(str(value))}" for param, value in params.items()])
-		return f"{self.protocol}://ieeexploreapi.ieee.org/api/{self.api_version}/search/articles?{params_str}"
+		return f"{self.protocol}://{self.host}/api/{self.api_version}/search/articles?{params_str}"
 
 	async def get_all_resources(
-			self, request: SearchRequest, params: Dict[str, object], max_records: int = 50,
-	) -> AsyncIterable[SearchResponse]:
+			self, request: SearchRequest, params: Dict[str, object], max_records: int = 50, start_record: int = 1,
+	) -> AsyncIterable[Union[SearchResponse, Cursor]]:
+		"""
+		The articles from `start_record` on, with a cursor at the next record after each page.
+		"""
 		def create_search_response(article) -> SearchResponse:
 			return SearchResponse(
 				request_source=SearchRequestSource(
@@ -194,159 +345,244 @@ class IEEESearch(SearchSource):
 				raw=article,
 			)
 
-		async def next_page(start_record=1) -> AsyncIterable[SearchResponse]:
-			async with ClientSession() as session:
-				url = self.get_url(params=params, max_records=max_records, start_record=start_record)
-				async with session.get(url=url) as response:
-					result = await response.json()
-					total_records = result.get('total_records', 0)
-					articles = result.get('articles')
-					if result and total_records > 0 or articles:
-						for article in articles:
-							yield create_search_response(article)
-						if total_records > max_records and start_record < total_records:
-							async for it in next_page(start_record + max_records):
-								yield it
-
-		async for it in next_page():
-			yield it
+		async with self._client_session() as session:
+			result = await self.get_page(session, params=params, max_records=max_records, start_record=start_record)
+			total_records = result.get('total_records', 0)
+			for article in result.get('articles') or []:
+				yield create_search_response(article)
+			yield Cursor({'start_record': start_record + max_records})
+
+			async def get_page(start: int) -> Tuple[int, Dict]:
+				return start, await self.get_page(session, params=params, max_records=max_records, start_record=start)
+
+			# The remaining windows are known after the first page, so they are fetched ahead, in order
+			pages = (get_page(it) for it in range(start_record + max_records, total_records + 1, max_records))
+			async for start, result in prefetch(pages, self.prefetch_pages):
+				for article in result.get('articles') or []:
+					yield create_search_response(article)
+				yield Cursor({'start_record': start + max_records})
+
+	async def get_page(
+			self, session: ClientSession, params: Dict[str, object], max_records: int = 50, start_record: int = 1,
+	) -> Dict:
+		url = self.get_url(params=params, max_records=max_records, start_record=start_record)
+		for attempt in range(self.max_retries + 1):
+			async with session.get(url=url) as response:
+				if attempt == self.max_retries or not await IEEESearch.is_quota_error(response):
+					response.raise_for_status()
+					return await response.json()
+				status = response.status
+			# Out of the response, so its connection is back in the pool during the backoff
+			delay = self.backoff_s * 2 ** attempt
+			self.logger.warning(f"IEEE quota error {status} for {start_record}, retrying in {delay}s")
+			self._retried()
+			await asyncio.sleep(delay)
 
-	async def search(self, request: SearchRequest) -> AsyncIterable[SearchResponse]:
+	@staticmethod
+	async def is_quota_error(response) -> bool:
+		if response.status in (429, 503):
+			return True
+		if response.status != 403:
+			return False
+		# The API gateway answers 403 "Developer Over Qps" or "Developer Over Rate" when over the quota,
+		# with the same error in a header, and other 403s for a key that is wrong or inactive
+		if response.headers.get('X-Mashery-Error-Code', '').startswith('ERR_403_DEVELOPER_OVER_'):
+			return True
+		text = (await response.text()).lower()
+		return 'developer over qps' in text or 'developer over rate' in text
+
+	@staticmethod
+	def queries(request: SearchRequest) -> List[Dict[str, object]]:
 		if request.token == SearchToken.Author:
-			async for it in self.get_all_resources(request=request, params={'author': request.value}):
-				yield it
+			return [{'author': request.value}]
 		elif request.token == SearchToken.Term:
-			async for it in self.get_all_resources(request=request, params={'index_terms': request.value}):
-				yield it
-			async for it in self.get_all_resources(request=request, params={'abstract': request.value}):
-				yield it
+			return [{'index_terms': request.value}, {'abstract': request.value}]
 		elif request.token == SearchToken.Title:
-			async for it in self.get_all_resources(request=request, params={'article_title': request.value}):
-				yield it
+			return [{'article_title': request.value}]
+		return []
+
+	def search(self, request: SearchRequest) -> AsyncIterable[SearchResponse]:
+		return self._responses(self.resume(request))
+
+	async def resume(
+			self, request: SearchRequest, position: Optional[Dict] = None,
+	) -> AsyncIterable[Union[SearchResponse, Cursor]]:
+		"""
+		The position is the query, for terms searched by index terms and then by abstract, and its next record.
+		"""
+		position = position or {}
+		first_query = position.get('query', 0)
+		queries = IEEESearch.queries(request)
+		for query in range(first_query, len(queries)):
+			start_record = position.get('start_record', 1) if query == first_query else 1
+			async for it in self.get_all_resources(request=request, params=queries[query], start_record=start_record):
+				yield Cursor({'query': query, **it.position}) if isinstance(it, Cursor) else it
+			if query + 1 < len(queries):
+				yield Cursor({'query': query + 1, 'start_record': 1})
+		yield Cursor(complete=True)
 
 	def source(self) -> Source:
 		return Source.IEEE
 
 
-def find_class(soup, format):
-	tag_name = format[:format.index('.')]
-	if len(tag_name.strip()) > 0:
-		return soup.find_all(tag_name, class_=lambda x: format[format.index('.') + 1:] in (x or ''))
-	else:
-		return soup.find_all(class_=lambda x: format[format.index('.') + 1:] in (x or ''))
+class ACMSearch(SearchSource):
+	def __init__(
+			self, page_size: int = 50, max_concurrent_pages: int = 4, parser: str = 'lxml', parser_processes: int = 0,
+			collect_references: bool = False, max_retries: int = 5, backoff_s: float = 1.0,
+	):
+		super().__init__()
+		self.protocol = 'https'
+		self.host = 'dl.acm.org'
+		self.page_size = page_size
+		self.max_concurrent_pages = max_concurrent_pages
+		self.parser = parser
+		self.parser_processes = parser_processes
+		# Requests the page of every paper found for its references, one more request per paper
+		self.collect_references = collect_references
+		self.max_retries = max_retries
+		self.backoff_s = backoff_s
+		self.__page_limit: Optional[asyncio.Semaphore] = None
+		self.__parser_executor: Optional[ProcessPoolExecutor] = None
+
+	def get_url(self, filter: str, page: int = 0) -> str:
+		params = f"fillQuickSearch=false&expand=dl&{filter}&startPage={page}&pageSize={self.page_size}"
+		return f"{self.protocol}://{self.host}/action/doSearch?{params}"
+
+	async def get_page(self, session: ClientSession, filter: str, page: int = 0) -> Tuple[int, List[Dict]]:
+		# Shared by all the ACM streams, so it bounds the pages requested from the host at the same time
+		if not self.__page_limit:
+			self.__page_limit = asyncio.Semaphore(self.max_concurrent_pages)
+		for attempt in range(self.max_retries + 1):
+			async with self.__page_limit:
+				async with session.get(self.get_url(filter, page)) as response:
+					status = response.status
+					if attempt == self.max_retries or status not in (429, 503):
+						response.raise_for_status()
+						response_text = await response.text()
+						break
+			# Out of the response and the page limit, so the other pages go on during the backoff
+			delay = self.backoff_s * 2 ** attempt
+			self.logger.warning(f"ACM answered {status} for page {page}, retrying in {delay}s")
+			self._retried()
+			await asyncio.sleep(delay)
+		hits, papers = await self.parse_page(response_text)
+		if self.collect_references:
+			references = await asyncio.gather(*[self.get_references(session, it['doi']) for it in papers])
+			for paper, paper_references in zip(papers, references):
+				paper['references'] = paper_references
+		return hits, papers
+
+	def get_article_url(self, doi: str) -> str:
+		doi = doi.strip()
+		for prefix in ('https://doi.org/', 'http://doi.org/', 'https://dx.doi.org/', 'http://dx.doi.org/'):
+			if doi.startswith(prefix):
+				doi = doi[len(prefix):]
+		return f"{self.protocol}://{self.host}/doi/{doi}"
+
+	async def get_references(self, session: ClientSession, doi: Optional[str]) -> List[Article]:
+		"""
+		The references listed in the ACM page of the paper, nothing when it has no DOI or the page fails.
+		"""
+		if not doi:
+			return []
+		try:
+			async with self.__page_limit:
+				async with session.get(self.get_article_url(doi)) as response:
+					response.raise_for_status()
+					response_text = await response.text()
+		except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+			self.logger.warning(f"Could not get the references of {doi}: {e}")
+			return []
+		return [Article(author=[], **it) for it in parse_references(response_text)]
+
+	async def parse_page(self, page: str) -> Tuple[int, List[Dict]]:
+		parse = PARSERS[self.parser]
+		if not self.parser_processes:
+			return parse(page)
+		if not self.__parser_executor:
+			self.__parser_executor = ProcessPoolExecutor(max_workers=self.parser_processes)
+		return await asyncio.get_event_loop().run_in_executor(self.__parser_executor, parse, page)
+
+	def close(self):
+		if self.__parser_executor:
+			self.__parser_executor.shutdown()
+			self.__parser_executor = None
+
+	@staticmethod
+	def get_papers(request: SearchRequest, papers: List[Dict]) -> Iterable[SearchResponse]:
+		for paper in papers:
+			yield SearchResponse(
+				request_source=SearchRequestSource(
+					request=request,
+					source=Source.ACM,
+				),
+				article=Article(publisher='ACM', **paper),
+				raw=None,
+			)
+
+	async def get_all_papers(
+			self, request: SearchRequest, filter: str, position: Optional[Dict] = None,
+	) -> AsyncIterable[Union[SearchResponse, Cursor]]:
+		"""
+		The papers of the pages not done yet, with a cursor after each page. Pages arrive out of order,
+		so the position has the number of pages, the first page not done and the pages done after it.
+		"""
+		position = position or {}
+		pages: Optional[int] = position.get('pages')
+		next_page: int = position.get('next', 0)
+		done = set(position.get('done', []))
+
+		def cursor(page: int) -> Cursor:
+			nonlocal next_page
+			done.add(page)
+			while next_page in done:
+				done.discard(next_page)
+				next_page += 1
+			return Cursor({'pages': pages, 'next': next_page, 'done': sorted(done)})
+
+		async def get_page(page: int) -> Tuple[int, List[Dict]]:
+			_, papers = await self.get_page(session, filter, page)
+			return page, papers
+
+		async with self._client_session() as session:
+			if pages is None:
+				hits, papers = await self.get_page(session, filter)
+				# The number of pages is known after the first one
+				pages = -(-hits // self.page_size)
+				for it in ACMSearch.get_papers(request, papers):
+					yield it
+				yield cursor(0)
 
+			# Up to `max_concurrent_pages` of the others are in flight, streamed in the order they arrive.
+			# A new page is only requested when one arrives, so a slow consumer holds back the requests.
+			remaining = (get_page(page) for page in range(max(1, next_page), pages) if page not in done)
+			async for page, papers in prefetch_unordered(remaining, self.max_concurrent_pages):
+				for it in ACMSearch.get_papers(request, papers):
+					yield it
+				yield cursor(page)
 
-class ACMSearch(SearchSource):
-	async def search(self, request: SearchRequest) -> AsyncIterable[SearchResponse]:
-		url = f"https://dl.acm.org/action/doSearch?"
-
-		async def get_response(filter: str, page: int = 0, page_size: int = 50) -> AsyncIterable:
-			params = f"fillQuickSearch=false&expand=dl&{filter}&startPage={page}&pageSize={page_size}"
-			async with session.get(f"{url}{params}") as response:
-				response_text = await response.text()
-				soup = BeautifulSoup(response_text, 'html.parser')
-				yield soup
-
-				results_num = find_class(soup, 'span.hitsLength')
-				results_num = int(results_num[0].strip().replace(',', '')) if results_num else 0
-				if results_num > page_size and page * page_size < results_num:
-					async for it in get_response(filter, page + 1, page_size):
-						yield it
-
-		async def get_papers(soup: BeautifulSoup) -> AsyncIterable[SearchResponse]:
-			def text_in_span(tag_item) -> Optional[str]:
-				try:
-					tag_item = tag_item[0]
-				except KeyError:
-					pass
-				except IndexError:
-					return None
-				if tag_item and tag_item.span:
-					return tag_item.span.get_text()
-				return None
-
-			body = find_class(soup, 'ul.items-results')
-			if not body or len(body) != 1:
-				return
-			body = body[0]
-			for it in find_class(body, 'div.issue-item__content'):
-				title = find_class(it, 'h5.issue-item__title')
-				if not title or not title[0].span or not title[0].span.a:
-					continue
-				title = title[0].span.a.get_text()
-
-				abstract = find_class(it, 'div.issue-item__abstract')
-				if abstract and abstract[0].p:
-					abstract = abstract[0].p.get_text()
-				else:
-					abstract = None
-
-				citation = text_in_span(find_class(it, 'span.citation'))
-				downloads = text_in_span(find_class(it, 'span.metric'))
-				doi = text_in_span(find_class(it, 'a.issue-item__doi'))
-				year = None
-				journal = None
-				details = find_class(it, 'div.issue-item__detail')
-				if details:
-					details = details[0]
-					it_year = find_class(details, 'span.dot-separator')
-					if it_year and len(it_year) > 0:
-						it_year = it_year[0]
-						year = text_in_span(it_year)
-						if ' ' in year and ',' in year:
-							year = year[year.index(' ') + 1:year.index(',')]
-						else:
-							year = None
-
-					journal = find_class(details, 'span.epub-section__title')
-					journal = journal[0].get_text() if journal else None
-
-				author = []
-				authors_tag = find_class(it, 'ul.loa')
-				if authors_tag:
-					for it_author in authors_tag[0].find_all('li'):
-						if it_author and it_author.a and it_author.a.span:
-							author.append(it_author.a.span.get_text())
-
-				yield SearchResponse(
-					request_source=SearchRequestSource(
-						request=request,
-						source=Source.ACM,
-					),
-					article=Article(
-						title=title,
-						author=author,
-						year=int(year) if year else None,
-						abstract=abstract,
-						journal=journal,
-						publisher='ACM',
-						citations=int(citation.replace(',', '')) if citation else None,
-						downloads=int(downloads.replace(',', '')) if downloads else None,
-						doi=doi,
-					),
-					raw=None,
-				)
-
-		# return SimpleNamespace(**response_json)
-		async with aiohttp.ClientSession() as session:
-			if request.token == SearchToken.Author:
-				filter = f"field1=ContribAuthor&text1={urllib.parse.quote(request.value)}"
-				async for soup in get_response(filter):
-					async for it in get_papers(soup):
-						yield it
-
-			elif request.token == SearchToken.Term:
-				term = f"Abstract:({urllib.parse.quote(request.value)})"
-				filter = f"AllField={term}"
-				async for soup in get_response(filter):
-					async for it in get_papers(soup):
-						yield it
-
-			elif request.token == SearchToken.Title:
-				filter = f"field1=Title&text1={urllib.parse.quote(request.value)}"
-				async for soup in get_response(filter):
-					async for it in get_papers(soup):
-						yield it
+	@staticmethod
+	def get_filter(request: SearchRequest) -> Optional[str]:
+		if request.token == SearchToken.Author:
+			return f"field1=ContribAuthor&text1={urllib.parse.quote(request.value)}"
+		elif request.token == SearchToken.Term:
+			term = f"Abstract:({urllib.parse.quote(request.value)})"
+			return f"AllField={term}"
+		elif request.token == SearchToken.Title:
+			return f"field1=Title&text1={urllib.parse.quote(request.value)}"
+		return None
+
+	def search(self, request: SearchRequest) -> AsyncIterable[SearchResponse]:
+		return self._responses(self.resume(request))
+
+	async def resume(
+			self, request: SearchRequest, position: Optional[Dict] = None,
+	) -> AsyncIterable[Union[SearchResponse, Cursor]]:
+		filter = ACMSearch.get_filter(request)
+		if filter:
+			async for it in self.get_all_papers(request, filter, position):
+				yield it
+		yield Cursor(complete=True)
 
 	def source(self) -> Source:
 		return Source.ACM
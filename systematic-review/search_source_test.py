@@ -1,6 +1,16 @@
 import unittest
 import asyncio
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+from typing import Awaitable, Dict
+from unittest import mock
+import aiohttp
 
+from cursor import Cursor
+from search_engine import SearchEngine
 from search_source import GoogleScholarSearch, ScopusSearch, IEEESearch, ACMSearch
 
 from search import SearchRequest, SearchToken
@@ -25,6 +35,75 @@ class GoogleScholarSearchTest(unittest.TestCase):
 		loop.run_until_complete(the_test())
 
 
+class FakePublication(object):
+	def __init__(self, title: str, delay_s: float = 0.1):
+		self.bib = {'title': title, 'author': 'Jose da Silva and Maria Souza', 'year': '2020'}
+		self.delay_s = delay_s
+
+	def fill(self):
+		time.sleep(self.delay_s)
+		return self
+
+
+class GoogleScholarThreadPoolTest(unittest.TestCase):
+	def test_fills_overlap(self):
+		search_source = GoogleScholarSearch(use_proxy=False, workers=4)
+		pubs = [FakePublication(f"Paper {i}") for i in range(8)]
+
+		async def the_test():
+			return [it async for it in search_source.search(SearchRequest(SearchToken.Title, "bft"))]
+
+		with mock.patch('search_source.scholarly') as scholarly:
+			scholarly.search_pubs.return_value = iter(pubs)
+			start = time.monotonic()
+			responses = loop.run_until_complete(the_test())
+			elapsed = time.monotonic() - start
+
+		self.assertEqual([f"Paper {i}" for i in range(8)], [it.article.title for it in responses])
+		self.assertLess(elapsed, 0.6)
+
+	def test_resume(self):
+		search_source = GoogleScholarSearch(use_proxy=False, workers=2)
+		pubs = [FakePublication(f"Paper {i}") for i in range(5)]
+
+		async def the_test():
+			return [it async for it in search_source.resume(SearchRequest(SearchToken.Title, "bft"), {'publication': 3})]
+
+		with mock.patch('search_source.scholarly') as scholarly:
+			scholarly.search_pubs.return_value = iter(pubs)
+			items = loop.run_until_complete(the_test())
+
+		self.assertEqual(["Paper 3", "Paper 4"], [it.article.title for it in items if not isinstance(it, Cursor)])
+		self.assertEqual(
+			[Cursor({'publication': 4}), Cursor({'publication': 5}), Cursor(complete=True)],
+			[it for it in items if isinstance(it, Cursor)],
+		)
+
+	def test_more_requests_than_threads(self):
+		# More streams than the scheduler runs at once plus the workers, each with more results than the queue holds
+		engine = SearchEngine()
+		engine.sleep_between_calls_ms = None
+		engine.sources.append(GoogleScholarSearch(use_proxy=False, iterator_workers=2))
+		engine.requests = {SearchRequest(SearchToken.Title, f"bft {i}") for i in range(20)}
+		threads = set()
+
+		def search_pubs(value: str):
+			for i in range(30):
+				threads.add(threading.current_thread().name)
+				yield FakePublication(f"{value} {i}", delay_s=0.001)
+
+		with tempfile.TemporaryDirectory() as directory:
+			engine.cache_file_name = os.path.join(directory, 'cache.sr')
+			engine.compress = False
+			with mock.patch('search_source.scholarly') as scholarly:
+				scholarly.search_pubs.side_effect = search_pubs
+				loop.run_until_complete(asyncio.wait_for(engine.run(), 30))
+
+		self.assertEqual(600, len(engine.found_titles))
+		self.assertEqual(2, len(threads))
+		self.assertTrue(all(it.startswith('scholar-iterator') for it in threads))
+
+
 class ScopusSearchTest(unittest.TestCase):
 	def __init__(self, method_name='runTest'):
 		super().__init__(methodName=method_name)
@@ -43,12 +122,379 @@ class IEEESearchTest(unittest.TestCase):
 		self.search_source = IEEESearch(api_key='123')
 		self.search_source.protocol = "http"
 
+	def test_is_quota_error(self):
+		responses = [
+			FakeResponse(429, ''), FakeResponse(403, '<h1>Developer Over Qps</h1>'),
+			FakeResponse(403, '<h1>Developer Over Rate</h1>'),
+			FakeResponse(403, '', {'X-Mashery-Error-Code': 'ERR_403_DEVELOPER_OVER_QPS'}),
+			FakeResponse(403, '<h1>Developer Inactive</h1>'),
+			FakeResponse(403, '<h1>Forbidden</h1> However, this key can not be used'),
+			FakeResponse(404, 'Over Qps'),
+		]
+
+		async def the_test():
+			return [await IEEESearch.is_quota_error(it) for it in responses]
+
+		self.assertEqual([True, True, True, True, False, False, False], loop.run_until_complete(the_test()))
+
 	def test_get_url(self):
 		url = "http://ieeexploreapi.ieee.org/api/v1/search/articles?apikey=123&format=json&max_records=50&sort_order=asc&sort_field=article_title&start_record=1"
 		get_url = self.search_source.get_url()
 		self.assertEqual(url, get_url)
 
 
+class FakeResponse(object):
+	def __init__(self, status: int, body: object, headers: Dict[str, str] = None):
+		self.status = status
+		self.body = body
+		self.headers = headers or {}
+
+	async def json(self):
+		return self.body
+
+	async def text(self):
+		return str(self.body)
+
+	def raise_for_status(self):
+		if self.status >= 400:
+			raise aiohttp.ClientError(f"status {self.status}")
+
+
+class FakeRequest(object):
+	def __init__(self, response: Awaitable[FakeResponse], session=None):
+		self.response = response
+		# Counts the responses of the session still open
+		self.session = session
+
+	async def __aenter__(self) -> FakeResponse:
+		if self.session:
+			self.session.open += 1
+		return await self.response
+
+	async def __aexit__(self, exc_type, exc_val, exc_tb):
+		if self.session:
+			self.session.open -= 1
+
+
+class FakeIEEESession(object):
+	def __init__(self, total_records: int, quota_errors: int = 0):
+		self.total_records = total_records
+		self.quota_errors = quota_errors
+		self.urls = []
+		self.in_flight = 0
+		self.max_in_flight = 0
+		self.open = 0
+
+	def get(self, url: str) -> FakeRequest:
+		self.urls.append(url)
+		return FakeRequest(self.respond(url), self)
+
+	async def respond(self, url: str) -> FakeResponse:
+		params = urllib.parse.parse_qs(urllib.parse.urlparse(url).query)
+		start_record = int(params['start_record'][0])
+		max_records = int(params['max_records'][0])
+		if start_record > 1 and self.quota_errors > 0:
+			self.quota_errors -= 1
+			return FakeResponse(403, '<h1>Developer Over Qps</h1>')
+		self.in_flight += 1
+		self.max_in_flight = max(self.max_in_flight, self.in_flight)
+		# later pages answer faster, so they arrive out of order
+		await asyncio.sleep(0.05 / start_record)
+		self.in_flight -= 1
+		last = min(self.total_records, start_record + max_records - 1)
+		return FakeResponse(200, {
+			'total_records': self.total_records,
+			'articles': [{'title': f"Paper {i}"} for i in range(start_record, last + 1)],
+		})
+
+
+class IEEEPaginationTest(unittest.TestCase):
+	def search(self, session: FakeIEEESession, **kwargs):
+		search_source = IEEESearch(api_key='123', **kwargs)
+		search_source.session = session
+
+		async def the_test():
+			return [it async for it in search_source.search(SearchRequest(SearchToken.Title, "bft"))]
+
+		return loop.run_until_complete(the_test())
+
+	def test_pages_in_order(self):
+		session = FakeIEEESession(total_records=230)
+		responses = self.search(session, prefetch_pages=3)
+		self.assertEqual([f"Paper {i}" for i in range(1, 231)], [it.article.title for it in responses])
+		self.assertEqual(5, len(session.urls))
+		self.assertEqual(3, session.max_in_flight)
+
+	def test_quota_backoff(self):
+		session = FakeIEEESession(total_records=120, quota_errors=2)
+		responses = self.search(session, prefetch_pages=1, backoff_s=0.01)
+		self.assertEqual(120, len(responses))
+		self.assertEqual(5, len(session.urls))
+
+	def test_backoff_out_of_the_response(self):
+		session = FakeIEEESession(total_records=120, quota_errors=2)
+		open_in_backoff = []
+		sleep = asyncio.sleep
+
+		async def backoff(delay):
+			# The fake session sleeps too
+			if delay >= 10:
+				open_in_backoff.append(session.open)
+			await sleep(delay if delay < 10 else 0)
+
+		with mock.patch('asyncio.sleep', backoff):
+			self.assertEqual(120, len(self.search(session, prefetch_pages=1, backoff_s=10)))
+		self.assertEqual([0, 0], open_in_backoff)
+
+	def resume(self, session: FakeIEEESession, request: SearchRequest, position=None):
+		search_source = IEEESearch(api_key='123', prefetch_pages=2)
+		search_source.session = session
+
+		async def the_test():
+			return [it async for it in search_source.resume(request, position)]
+
+		return loop.run_until_complete(the_test())
+
+	def test_cursors(self):
+		items = self.resume(FakeIEEESession(total_records=120), SearchRequest(SearchToken.Term, "bft"))
+		cursors = [it for it in items if isinstance(it, Cursor)]
+		self.assertEqual([
+			{'query': 0, 'start_record': 51}, {'query': 0, 'start_record': 101}, {'query': 0, 'start_record': 151},
+			{'query': 1, 'start_record': 1},
+			{'query': 1, 'start_record': 51}, {'query': 1, 'start_record': 101}, {'query': 1, 'start_record': 151},
+		], [it.position for it in cursors[:-1]])
+		self.assertTrue(cursors[-1].complete)
+		# Each cursor comes after the articles it covers
+		self.assertEqual(list(range(51, 121, 50)) + [121], [
+			int(items[i - 1].article.title.split(' ')[1]) + 1 for i, it in enumerate(items)
+			if isinstance(it, Cursor) and it.position and it.position['query'] == 0
+		])
+
+	def test_resume(self):
+		session = FakeIEEESession(total_records=230)
+		items = self.resume(session, SearchRequest(SearchToken.Term, "bft"), {'query': 1, 'start_record': 101})
+		self.assertEqual(
+			[f"Paper {i}" for i in range(101, 231)], [it.article.title for it in items if not isinstance(it, Cursor)],
+		)
+		self.assertEqual(3, len(session.urls))
+		self.assertTrue(all('abstract=bft' in it for it in session.urls))
+
+	def test_quota_retries_exhausted(self):
+		session = FakeIEEESession(total_records=120, quota_errors=10)
+		with self.assertRaises(aiohttp.ClientError):
+			self.search(session, prefetch_pages=1, max_retries=2, backoff_s=0.01)
+
+
+def acm_item(title: str, year: int = 2020) -> str:
+	return f'''
+<li class="search__item issue-item-container">
+<div class="issue-item issue-item--search clearfix"><div class="issue-item__content">
+<h5 class="issue-item__title"><span class="hlFld-Title"><a href="/doi/10.1145/{year}">{title}</a></span></h5>
+<ul class="rlist--inline loa truncate-list" aria-label="authors">
+<li><a href="/profile/1" title="José da Silva"><span>José da Silva</span></a></li>
+<li><a href="/profile/2" title="Maria Souza"><span>Maria Souza</span></a></li>
+</ul>
+<div class="issue-item__detail">
+<a href="/toc/1" title="Proceedings"><span class="epub-section__title">Proceedings of BFT</span></a>
+<span class="dot-separator"><span>October {year}, </span><span>pp 1–12</span></span>
+<a class="issue-item__doi dot-separator" href="https://doi.org/10.1145/{year}"><span>https://doi.org/10.1145/{year}</span></a>
+</div>
+<div class="issue-item__abstract truncate-text"><p>Abstract of {title}; with a separator.</p></div>
+<div class="issue-item__footer"><div class="issue-item__footer-info">
+<span class="citation"><i class="icon-quote"></i><span>1,024</span></span>
+<span class="metric"><i class="icon-metric"></i><span>2,048</span></span>
+</div></div>
+</div></div>
+</li>'''
+
+
+def acm_page(titles, hits: int) -> str:
+	items = ''.join(acm_item(title) for title in titles)
+	return f'''<html><body>
+<div class="search-result__info"><span class="result__count"><span class="hitsLength">{hits:,}</span> Results</span></div>
+<ul class="search-result__xsl-body items-results rlist--inline">{items}</ul>
+</body></html>'''
+
+
+class FakeACMSession(object):
+	def __init__(self, hits: int, page_size: int, throttled: Dict[int, int] = None):
+		self.hits = hits
+		self.page_size = page_size
+		# The number of 429 answers of a page before the page itself
+		self.throttled = dict(throttled or {})
+		self.pages = []
+		self.in_flight = 0
+		self.max_in_flight = 0
+		self.open = 0
+
+	def get(self, url: str) -> FakeRequest:
+		return FakeRequest(self.respond(url), self)
+
+	async def respond(self, url: str) -> FakeResponse:
+		page = int(urllib.parse.parse_qs(urllib.parse.urlparse(url).query)['startPage'][0])
+		self.pages.append(page)
+		if self.throttled.get(page):
+			self.throttled[page] -= 1
+			return FakeResponse(429, 'Too Many Requests')
+		self.in_flight += 1
+		self.max_in_flight = max(self.max_in_flight, self.in_flight)
+		# later pages answer faster, so they arrive out of order
+		await asyncio.sleep(0.05 / (page + 1))
+		self.in_flight -= 1
+		first = page * self.page_size
+		titles = [f"Paper {i}" for i in range(first, min(self.hits, first + self.page_size))]
+		return FakeResponse(200, acm_page(titles, self.hits))
+
+
+class ACMPaginationTest(unittest.TestCase):
+	def test_pages_fetched_concurrently(self):
+		session = FakeACMSession(hits=95, page_size=10)
+		search_source = ACMSearch(page_size=10, max_concurrent_pages=3)
+		search_source.session = session
+
+		async def the_test():
+			return [it async for it in search_source.search(SearchRequest(SearchToken.Title, "bft"))]
+
+		responses = loop.run_until_complete(the_test())
+		self.assertEqual(list(range(10)), sorted(session.pages))
+		self.assertEqual(3, session.max_in_flight)
+		self.assertEqual({f"Paper {i}" for i in range(95)}, {it.article.title for it in responses})
+		self.assertEqual(95, len(responses))
+		article = responses[0].article
+		self.assertEqual(["José da Silva", "Maria Souza"], article.author)
+		self.assertEqual(2020, article.year)
+		self.assertEqual("Proceedings of BFT", article.journal)
+		self.assertEqual(1024, article.citations)
+		self.assertEqual(2048, article.downloads)
+		self.assertEqual("https://doi.org/10.1145/2020", article.doi)
+
+	def test_parser_processes_closed(self):
+		search_source = ACMSearch(page_size=10, parser_processes=1)
+		search_source.session = FakeACMSession(hits=15, page_size=10)
+
+		async def the_test():
+			return [it async for it in search_source.search(SearchRequest(SearchToken.Title, "bft"))]
+
+		self.assertEqual(15, len(loop.run_until_complete(the_test())))
+		executor = search_source._ACMSearch__parser_executor
+		search_source.close()
+		self.assertIsNone(search_source._ACMSearch__parser_executor)
+		with self.assertRaises(RuntimeError):
+			executor.submit(len, '')
+		# Started again by the next search
+		self.assertEqual(15, len(loop.run_until_complete(the_test())))
+		search_source.close()
+
+	def test_slow_consumer_holds_back_pages(self):
+		session = FakeACMSession(hits=95, page_size=10)
+		search_source = ACMSearch(page_size=10, max_concurrent_pages=2)
+		search_source.session = session
+
+		async def the_test():
+			responses = search_source.search(SearchRequest(SearchToken.Title, "bft"))
+			# The first page and one result of the next
+			for _ in range(11):
+				await responses.__anext__()
+			await asyncio.sleep(0.2)
+			await responses.aclose()
+
+		loop.run_until_complete(the_test())
+		# The first page, the window of 2 and the one requested when the first of them arrived
+		self.assertLessEqual(len(session.pages), 4)
+
+	def test_backoff_out_of_the_page_limit(self):
+		session = FakeACMSession(hits=25, page_size=10, throttled={1: 1})
+		search_source = ACMSearch(page_size=10, max_concurrent_pages=1, backoff_s=0.2)
+
+		async def the_test():
+			pages = [search_source.get_page(session, 'field1=Title&text1=bft', page) for page in (1, 2)]
+			return await asyncio.gather(*pages)
+
+		self.assertEqual([10, 5], [len(papers) for _, papers in loop.run_until_complete(the_test())])
+		# The other page is requested while the throttled one waits
+		self.assertEqual([1, 2, 1], session.pages)
+		self.assertEqual(0, session.open)
+
+
+class FakeACMReferencesSession(FakeACMSession):
+	def __init__(self, hits: int, page_size: int, status: int = 200):
+		super().__init__(hits=hits, page_size=page_size)
+		self.status = status
+		self.articles = []
+
+	async def respond(self, url: str) -> FakeResponse:
+		if '/action/doSearch' in url:
+			return await super().respond(url)
+		self.articles.append(url)
+		return FakeResponse(self.status, '''<html><body><ol>
+<li class="references__item"><span class="references__note">Miguel Castro. 1999. Paper 1. In OSDI.
+<span class="references__suffix"><a href="/doi/10.5555/296806.296824">Digital Library</a></span></span></li>
+</ol></body></html>''')
+
+
+class ACMReferencesTest(unittest.TestCase):
+	def search(self, session: FakeACMSession, collect_references: bool):
+		search_source = ACMSearch(page_size=10, collect_references=collect_references)
+		search_source.session = session
+
+		async def the_test():
+			return [it async for it in search_source.search(SearchRequest(SearchToken.Title, "bft"))]
+
+		return loop.run_until_complete(the_test())
+
+	def test_references(self):
+		session = FakeACMReferencesSession(hits=3, page_size=10)
+		responses = self.search(session, collect_references=True)
+		self.assertEqual(["https://dl.acm.org/doi/10.1145/2020"] * 3, session.articles)
+		reference = responses[0].article.references[0]
+		self.assertEqual(("Paper 1", 1999, "10.5555/296806.296824"), (reference.title, reference.year, reference.doi))
+
+	def test_not_collected(self):
+		session = FakeACMReferencesSession(hits=3, page_size=10)
+		responses = self.search(session, collect_references=False)
+		self.assertEqual([], session.articles)
+		self.assertEqual([], responses[0].article.references)
+
+	def test_failed_page(self):
+		session = FakeACMReferencesSession(hits=3, page_size=10, status=404)
+		responses = self.search(session, collect_references=True)
+		self.assertEqual(3, len(responses))
+		self.assertEqual([], responses[0].article.references)
+
+
+class ACMResumeTest(unittest.TestCase):
+	def resume(self, session: FakeACMSession, position=None):
+		search_source = ACMSearch(page_size=10, max_concurrent_pages=3)
+		search_source.session = session
+
+		async def the_test():
+			return [it async for it in search_source.resume(SearchRequest(SearchToken.Title, "bft"), position)]
+
+		return loop.run_until_complete(the_test())
+
+	def test_cursors(self):
+		items = self.resume(FakeACMSession(hits=45, page_size=10))
+		cursors = [it for it in items if isinstance(it, Cursor)]
+		self.assertEqual(Cursor({'pages': 5, 'next': 1, 'done': []}), cursors[0])
+		# Later pages arrive first, they are kept until the pages before them are done
+		self.assertEqual({'pages': 5, 'next': 1, 'done': [3]}, cursors[1].position)
+		self.assertEqual([Cursor({'pages': 5, 'next': 5, 'done': []}), Cursor(complete=True)], cursors[-2:])
+		self.assertEqual(45, len(items) - len(cursors))
+
+	def test_resume(self):
+		session = FakeACMSession(hits=95, page_size=10)
+		items = self.resume(session, {'pages': 10, 'next': 3, 'done': [5, 7]})
+		self.assertEqual([3, 4, 6, 8, 9], sorted(session.pages))
+		titles = {it.article.title for it in items if not isinstance(it, Cursor)}
+		self.assertEqual({f"Paper {i}" for page in (3, 4, 6, 8, 9) for i in range(page * 10, min(95, page * 10 + 10))}, titles)
+		self.assertEqual([Cursor({'pages': 10, 'next': 10, 'done': []}), Cursor(complete=True)], items[-2:])
+
+	def test_resume_completed(self):
+		session = FakeACMSession(hits=95, page_size=10)
+		self.assertEqual([Cursor(complete=True)], self.resume(session, {'pages': 10, 'next': 10, 'done': []}))
+		self.assertEqual([], session.pages)
+
+
 class ACMSearchTest(unittest.TestCase):
 	def __init__(self, method_name='runTest'):
 		super().__init__(methodName=method_name)
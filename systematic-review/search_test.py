@@ -1,5 +1,11 @@
+import copyreg
+import io
+import pickle
 import unittest
+from unittest import mock
 from article import Article
+from author import Author
+from memory_benchmark import LegacyUnpickler
 from search import SearchRequest, SearchToken, SearchResponse, SearchRequestSource, Source
 
 
@@ -30,5 +36,72 @@ class SearchResponseTest(unittest.TestCase):
 		self.assertTrue("Silva" in list_to_str)
 
 
+class Legacy(object):
+	"""
+	Pickles as an instance of the class with the state, like the classes with a `__dict__` did.
+	"""
+
+	def __init__(self, cls: type, state: dict):
+		self.cls = cls
+		self.state = state
+
+	def __reduce__(self):
+		return copyreg._reconstructor, (self.cls, object, None), self.state
+
+
+class SlotsTest(unittest.TestCase):
+	def test_pickle(self):
+		request = SearchRequestSource(request=SearchRequest(token=SearchToken.Term, value="BFT"), source=Source.ACM)
+		response = SearchResponse(
+			request_source=request, article=Article(title="New BFT", author=["Jose da Silva"], journal="EuroSys"),
+			raw_key="abc",
+		)
+		loaded = pickle.loads(pickle.dumps(response))
+		self.assertEqual(response, loaded)
+		self.assertEqual("abc", loaded.raw_key)
+		self.assertEqual("new bft", loaded.article.normalized_title)
+		self.assertEqual(["Jose da Silva"], loaded.article.author)
+		self.assertFalse(hasattr(loaded.article, '__dict__'))
+		self.assertEqual(response.__getstate__(), {
+			'request_source': request, 'article': response.article, 'raw': None, 'raw_key': "abc",
+		})
+
+	def test_compact_only_legacy_state(self):
+		article = Article(title="New BFT", author=["Jose da Silva"], journal="EuroSys")
+		with mock.patch.object(Article, '_compact') as compact:
+			self.assertEqual(article, pickle.loads(pickle.dumps(article)))
+			compact.assert_not_called()
+
+		# The classes before the slots load the state of the slotted ones
+		legacy = LegacyUnpickler(io.BytesIO(pickle.dumps(article))).load()
+		self.assertEqual(("New BFT", "EuroSys"), (legacy.__dict__['_Article__title'], legacy.__dict__['journal']))
+
+	def test_legacy_state(self):
+		journal = ''.join(["Euro", "Sys"])
+		article = pickle.loads(pickle.dumps(Legacy(Article, {
+			'_Article__title': "New BFT", 'normalized_title': "new bft", 'author': ["Jose da Silva"], 'year': 2020,
+			'abstract': None, 'references': [], 'journal': journal, 'publisher': "ACM", 'citations': 3, 'doi': None,
+			'downloads': None,
+		})))
+		self.assertEqual("New BFT", article.title)
+		self.assertEqual(2020, article.year)
+		self.assertEqual([], article.key_words)
+		self.assertIs(article.journal, Article(title="Other", author=[], journal="EuroSys").journal)
+
+		request = SearchRequestSource(request=SearchRequest(token=SearchToken.Term, value="BFT"), source=Source.ACM)
+		response = pickle.loads(pickle.dumps(Legacy(SearchResponse, {
+			'request_source': request, 'article': article, 'raw': None,
+		})))
+		self.assertIsNone(response.raw_key)
+		self.assertEqual(article, response.article)
+
+		author = pickle.loads(pickle.dumps(Legacy(Author, {
+			'_Author__name': "Jose da Silva", 'normalized_name': "jose da silva", 'affiliation': None, 'citations': 3,
+			'interests': ["BFT"], 'h_index': None, 'i10_index': None,
+		})))
+		self.assertEqual("Jose da Silva", author.name)
+		self.assertEqual(["BFT"], author.interests)
+
+
 if __name__ == '__main__':
 	unittest.main()
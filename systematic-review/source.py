@@ -1,3 +1,4 @@
+from __future__ import annotations
 from enum import Enum
 
 
@@ -15,3 +16,11 @@ class Source(Enum):
 
 	def __repr__(self):
 		return self.__str__()
+
+	@staticmethod
+	def from_name(name: str) -> Source:
+		key = ''.join(x for x in name.lower() if x.isalnum())
+		for source in Source:
+			if source.name.lower() == key:
+				return source
+		raise ValueError(f"Unknown source: {name}")
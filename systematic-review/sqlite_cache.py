@@ -0,0 +1,300 @@
+from __future__ import annotations
+import os
+import pickle
+import sqlite3
+from article import Article
+from author import Author
+from cache import SearchCache
+from dedup import Deduplicator
+from search import SearchRequestSource, SearchResponse, SearchRequest, SearchToken
+from source import Source
+from typing import Iterable, Iterator, Mapping, NoReturn, Optional, Set, Union
+from util import normalize_text
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS request (
+	source TEXT NOT NULL,
+	token TEXT NOT NULL,
+	value TEXT NOT NULL,
+	PRIMARY KEY (source, token, value)
+);
+CREATE INDEX IF NOT EXISTS request_request ON request (token, value);
+CREATE TABLE IF NOT EXISTS response (
+	id INTEGER PRIMARY KEY,
+	source TEXT NOT NULL,
+	token TEXT NOT NULL,
+	value TEXT NOT NULL,
+	normalized_title TEXT NOT NULL,
+	doi TEXT,
+	data BLOB NOT NULL,
+	UNIQUE (source, token, value, normalized_title)
+);
+CREATE INDEX IF NOT EXISTS response_title ON response (normalized_title);
+CREATE INDEX IF NOT EXISTS response_doi ON response (doi);
+CREATE TABLE IF NOT EXISTS response_author (
+	response_id INTEGER NOT NULL REFERENCES response (id) ON DELETE CASCADE,
+	normalized_name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS response_author_name ON response_author (normalized_name);
+CREATE INDEX IF NOT EXISTS response_author_response ON response_author (response_id);
+CREATE TABLE IF NOT EXISTS author (
+	normalized_name TEXT PRIMARY KEY,
+	data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+	key TEXT PRIMARY KEY,
+	value TEXT NOT NULL
+);
+"""
+
+# The first bytes of every SQLite database file
+_HEADER = b'SQLite format 3\x00'
+
+
+def _key(item: SearchRequestSource) -> tuple:
+	return item.source.name, item.request.token.name, item.request.value
+
+
+class SQLiteAuthors(Mapping):
+	"""
+	Read only view of the authors table, with the same interface as `SearchCache.authors`.
+	"""
+
+	def __init__(self, connection: sqlite3.Connection):
+		self.__connection = connection
+
+	def __getitem__(self, key: str) -> Author:
+		row = self.__connection.execute("SELECT data FROM author WHERE normalized_name = ?", (key,)).fetchone()
+		if not row:
+			raise KeyError(key)
+		return pickle.loads(row[0])
+
+	def __iter__(self) -> Iterator[str]:
+		for row in self.__connection.execute("SELECT normalized_name FROM author"):
+			yield row[0]
+
+	def __len__(self) -> int:
+		return self.__connection.execute("SELECT COUNT(*) FROM author").fetchone()[0]
+
+	def values(self) -> Iterable[Author]:
+		for row in self.__connection.execute("SELECT data FROM author"):
+			yield pickle.loads(row[0])
+
+
+class SQLiteSearchCache(SearchCache):
+	"""
+	`SearchCache` stored in SQLite, with indexes on the source, request, normalized title, DOI and author
+	names. Lookups and listings read only the rows they need instead of loading the whole cache.
+	"""
+
+	def __init__(self, filename: str = ':memory:', ignore_case: bool = True):
+		super().__init__(ignore_case=ignore_case)
+		self.filename = filename
+		self.connection = sqlite3.connect(filename)
+		self.connection.execute("PRAGMA foreign_keys = ON")
+		self.connection.execute("PRAGMA journal_mode = WAL")
+		self.connection.executescript(_SCHEMA)
+		self.authors = SQLiteAuthors(self.connection)
+		self.__changes = 0
+		# Whether some response may keep its raw payload inline, unknown for the caches from before the flag
+		self.__inline_raw = self.__meta('inline_raw') != '0'
+
+	def __meta(self, key: str) -> Optional[str]:
+		row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+		return row[0] if row else None
+
+	def __set_meta(self, key: str, value: str):
+		self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+	def __contains__(self, item: SearchRequestSource) -> bool:
+		if self.ignore_case:
+			item.request.value = item.request.value.lower()
+		return self.connection.execute(
+			"SELECT 1 FROM request WHERE source = ? AND token = ? AND value = ?", _key(item),
+		).fetchone() is not None
+
+	def __getitem__(self, item: SearchRequestSource) -> Set[SearchResponse]:
+		if item not in self:
+			raise KeyError(f"Request {item.request} not found for source: {item.source}")
+		return {
+			pickle.loads(row[0]) for row in self.connection.execute(
+				"SELECT data FROM response WHERE source = ? AND token = ? AND value = ?", _key(item),
+			)
+		}
+
+	def __setitem__(self, item: SearchRequestSource, value: SearchResponse) -> NoReturn:
+		if self.ignore_case:
+			item.request.value = item.request.value.lower()
+		if not self._store_raw(value) and value.raw is not None and type(value.raw) is not object:
+			if not self.__inline_raw:
+				self.__inline_raw = True
+				self.__set_meta('inline_raw', '1')
+		key = _key(item)
+		self.connection.execute("INSERT OR IGNORE INTO request (source, token, value) VALUES (?, ?, ?)", key)
+		cursor = self.connection.execute(
+			"INSERT OR IGNORE INTO response (source, token, value, normalized_title, doi, data) VALUES (?, ?, ?, ?, ?, ?)",
+			key + (value.article.normalized_title, value.article.doi, pickle.dumps(value)),
+		)
+		if cursor.rowcount:
+			self.connection.executemany(
+				"INSERT INTO response_author (response_id, normalized_name) VALUES (?, ?)",
+				[(cursor.lastrowid, normalize_text(name)) for name in value.article.author],
+			)
+			self.__changes += 1
+
+	def __delitem__(self, key: Union[SearchRequestSource, SearchResponse]) -> NoReturn:
+		if type(key) is SearchRequestSource:
+			if key not in self:
+				raise KeyError(f"Request {key.request} not found for source: {key.source}")
+			self.connection.execute("DELETE FROM response WHERE source = ? AND token = ? AND value = ?", _key(key))
+			self.connection.execute("DELETE FROM request WHERE source = ? AND token = ? AND value = ?", _key(key))
+		elif type(key) is SearchResponse:
+			if key.request_source not in self:
+				raise KeyError(f"Request {key.request_source.request} not found for source: {key.request_source.source}")
+			cursor = self.connection.execute(
+				"DELETE FROM response WHERE source = ? AND token = ? AND value = ? AND normalized_title = ?",
+				_key(key.request_source) + (key.article.normalized_title,),
+			)
+			if not cursor.rowcount:
+				raise KeyError(f"Request {key} not found")
+		self.__changes += 1
+
+	def move_raw(self) -> int:
+		"""
+		Unpickles every response, so it only runs while some of them may still keep their raw payload inline.
+		"""
+		if not self.__inline_raw or not (self.blob_store or self.drop_raw):
+			return 0
+		count = 0
+		last_id = 0
+		while True:
+			rows = self.connection.execute(
+				"SELECT id, data FROM response WHERE id > ? ORDER BY id LIMIT 1000", (last_id,),
+			).fetchall()
+			if not rows:
+				break
+			updates = []
+			for row_id, data in rows:
+				it = pickle.loads(data)
+				if self._store_raw(it):
+					updates.append((pickle.dumps(it), row_id))
+			self.connection.executemany("UPDATE response SET data = ? WHERE id = ?", updates)
+			count += len(updates)
+			last_id = rows[-1][0]
+		self.__inline_raw = False
+		self.__set_meta('inline_raw', '0')
+		self.__changes += count
+		return count
+
+	def __len__(self) -> int:
+		return self.connection.execute("SELECT COUNT(*) FROM response").fetchone()[0]
+
+	def __str__(self) -> str:
+		return f"{type(self).__name__}({self.filename})"
+
+	def dump(self, filename: Optional[str] = None, compress: bool = True) -> NoReturn:
+		self.connection.commit()
+		self.__changes = 0
+		if filename and os.path.abspath(filename) != os.path.abspath(self.filename):
+			with sqlite3.connect(filename) as copy:
+				self.connection.backup(copy)
+
+	def checkpoint(self, filename: Optional[str] = None, compress: bool = True) -> int:
+		count = self.__changes
+		self.connection.commit()
+		self.__changes = 0
+		return count
+
+	def close(self):
+		self.connection.commit()
+		self.connection.close()
+
+	@staticmethod
+	def exists(filename: str) -> bool:
+		return os.path.isfile(filename)
+
+	@staticmethod
+	def is_database(filename: str) -> bool:
+		"""
+		Whether the file is missing, empty or a SQLite database, and not a pickle cache.
+		"""
+		if not os.path.isfile(filename) or not os.path.getsize(filename):
+			return True
+		with open(filename, 'rb') as in_file:
+			return in_file.read(len(_HEADER)) == _HEADER
+
+	@staticmethod
+	def load(filename: str, compress: bool = True) -> SQLiteSearchCache:
+		if not SQLiteSearchCache.is_database(filename):
+			raise ValueError(f"{filename} is not a SQLite cache, it may be a pickle cache of the other backend")
+		return SQLiteSearchCache(filename=filename)
+
+	def __responses(self, query: str, params: tuple = ()) -> Iterable[SearchResponse]:
+		for row in self.connection.execute(query, params):
+			yield pickle.loads(row[0])
+
+	def articles(self) -> Iterable[Article]:
+		for it in self.__responses("SELECT data FROM response"):
+			yield it.article
+
+	def unique_articles(self, deduplicator: Optional[Deduplicator] = None) -> Iterable[Article]:
+		if deduplicator:
+			return deduplicator.merge(self.__unique_articles())
+		return self.__unique_articles()
+
+	def __unique_articles(self) -> Iterator[Article]:
+		# Sorted by the normalized title, so only the duplicates of one article are in memory at a time
+		article: Optional[Article] = None
+		for it in self.__responses("SELECT data FROM response ORDER BY normalized_title"):
+			if article and article.normalized_title == it.article.normalized_title:
+				article.merge(it.article)
+			else:
+				if article:
+					yield article
+				article = it.article
+		if article:
+			yield article
+
+	def request_sources(self, title: str) -> Set[SearchRequestSource]:
+		return {
+			SearchRequestSource(request=SearchRequest(token=SearchToken[token], value=value), source=Source[source])
+			for source, token, value in self.connection.execute(
+				"SELECT source, token, value FROM response WHERE normalized_title = ?", (title,),
+			)
+		}
+
+	def find_articles(
+			self, title: Optional[str] = None, doi: Optional[str] = None, author: Optional[str] = None,
+	) -> Iterable[Article]:
+		conditions = []
+		params = []
+		if title:
+			conditions.append("normalized_title = ?")
+			params.append(normalize_text(title))
+		if doi:
+			conditions.append("doi = ?")
+			params.append(doi)
+		if author:
+			conditions.append("id IN (SELECT response_id FROM response_author WHERE normalized_name = ?)")
+			params.append(normalize_text(author))
+		where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+		for it in self.__responses(f"SELECT data FROM response{where}", tuple(params)):
+			yield it.article
+
+	def search_requests(self) -> Set[SearchRequest]:
+		return {
+			SearchRequest(token=SearchToken[token], value=value)
+			for token, value in self.connection.execute("SELECT DISTINCT token, value FROM request")
+		}
+
+	def sources(self) -> Set[Source]:
+		return {Source[row[0]] for row in self.connection.execute("SELECT DISTINCT source FROM request")}
+
+	def add_author(self, author: Author):
+		if author.normalized_name in self.authors:
+			author = self.authors[author.normalized_name].merge(author)
+		self.connection.execute(
+			"INSERT OR REPLACE INTO author (normalized_name, data) VALUES (?, ?)",
+			(author.normalized_name, pickle.dumps(author)),
+		)
+		self.__changes += 1
@@ -0,0 +1,128 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from article import Article
+from author import Author
+from cache import SearchCache
+from search import SearchRequestSource, SearchResponse, SearchRequest, SearchToken
+from source import Source
+from sqlite_cache import SQLiteSearchCache
+
+
+def response(value: str, source: Source, title: str, **kwargs) -> SearchResponse:
+	request_source = SearchRequestSource(request=SearchRequest(token=SearchToken.Term, value=value), source=source)
+	return SearchResponse(request_source=request_source, article=Article(title=title, **kwargs))
+
+
+class SQLiteSearchCacheTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.file_name = os.path.join(self.directory.name, 'cache.sqlite')
+		self.cache = SQLiteSearchCache.load(self.file_name)
+
+	def tearDown(self):
+		self.cache.close()
+		self.directory.cleanup()
+
+	def add(self, *responses: SearchResponse):
+		for it in responses:
+			self.cache[it.request_source] = it
+
+	def test_one_source(self):
+		bft = response("BFT", Source.Scopus, "New BFT", author=["Jose da Silva"])
+		self.assertFalse(bft.request_source in self.cache)
+		self.add(bft)
+		self.assertTrue(bft.request_source in self.cache)
+		self.assertEqual({bft}, self.cache[bft.request_source])
+		self.add(bft)
+		self.assertEqual(1, len(self.cache))
+
+		dbft = response("dBFT", Source.Scopus, "New dBFT", author=["Jose da Silva"])
+		self.assertFalse(dbft.request_source in self.cache)
+		with self.assertRaises(KeyError):
+			self.cache[dbft.request_source]
+		self.add(dbft)
+		self.assertEqual(2, len(self.cache))
+		self.assertEqual({Source.Scopus}, self.cache.sources())
+		self.assertEqual({"bft", "dbft"}, {it.value for it in self.cache.search_requests()})
+
+		del self.cache[bft]
+		self.assertEqual(1, len(self.cache))
+		self.assertTrue(bft.request_source in self.cache)
+		with self.assertRaises(KeyError):
+			del self.cache[bft]
+		del self.cache[dbft.request_source]
+		self.assertFalse(dbft.request_source in self.cache)
+
+	def test_unique_articles_and_find(self):
+		self.add(
+			response("BFT", Source.ACM, "New BFT", author=["José da Silva"], doi="10.1/1"),
+			response("BFT", Source.IEEE, "New BFT!", author=["Jose da Silva"], year=2020, citations=3),
+			response("dBFT", Source.ACM, "New dBFT", author=["Maria Souza"]),
+		)
+		unique = {it.normalized_title: it for it in self.cache.unique_articles()}
+		self.assertEqual(2, len(unique))
+		self.assertEqual("10.1/1", unique["new bft"].doi)
+		self.assertEqual(2020, unique["new bft"].year)
+
+		self.assertEqual(2, len(list(self.cache.find_articles(author="Jose da Silva"))))
+		self.assertEqual(["New dBFT"], [it.title for it in self.cache.find_articles(author="maria souza")])
+		self.assertEqual(["New BFT"], [it.title for it in self.cache.find_articles(doi="10.1/1")])
+		self.assertEqual(2, len(list(self.cache.find_articles(title="new bft"))))
+		self.assertEqual(
+			{Source.ACM, Source.IEEE}, {it.source for it in self.cache.request_sources("new bft")},
+		)
+		self.assertEqual({"bft"}, {it.request.value for it in self.cache.request_sources("new bft")})
+		self.assertEqual(set(), self.cache.request_sources("consensus"))
+
+	def test_persistence_and_authors(self):
+		self.add(response("BFT", Source.ACM, "New BFT", author=["Jose da Silva"]))
+		self.cache.add_author(Author(name="José da Silva", affiliation=None, citations=None, h_index=3))
+		self.cache.add_author(Author(name="Jose da Silva", affiliation="UnB", citations=10))
+		self.cache.dump()
+		self.cache.close()
+
+		self.cache = SQLiteSearchCache.load(self.file_name)
+		self.assertEqual(1, len(self.cache))
+		self.assertEqual(1, len(self.cache.authors))
+		author = self.cache.find_author("Jose da Silva")
+		self.assertEqual((3, "UnB", 10), (author.h_index, author.affiliation, author.citations))
+		self.assertIsNone(self.cache.find_author("Maria Souza"))
+
+	def test_move_raw_once(self):
+		self.add(response("BFT", Source.IEEE, "New BFT", author=[]))
+		inline = response("BFT", Source.IEEE, "Newer BFT", author=[])
+		inline.raw = {'title': 'Newer BFT'}
+		self.add(inline)
+		self.cache.drop_raw = True
+		self.assertEqual(1, self.cache.move_raw())
+
+	def test_pickle_cache(self):
+		file_name = os.path.join(self.directory.name, 'cache.sr')
+		cache = SearchCache()
+		cache.dump(file_name)
+		self.assertFalse(SQLiteSearchCache.is_database(file_name))
+		self.assertTrue(SQLiteSearchCache.is_database(self.file_name))
+		with self.assertRaisesRegex(ValueError, 'not a SQLite cache'):
+			SQLiteSearchCache.load(file_name)
+		self.cache.dump()
+		self.cache.close()
+
+		# Nothing left inline, the responses are not read again
+		self.cache = SQLiteSearchCache.load(self.file_name)
+		self.cache.drop_raw = True
+		with mock.patch('sqlite_cache.pickle.loads') as loads:
+			self.assertEqual(0, self.cache.move_raw())
+			loads.assert_not_called()
+
+		self.cache.drop_raw = False
+		inline = response("BFT", Source.IEEE, "Newest BFT", author=[])
+		inline.raw = {'title': 'Newest BFT'}
+		self.add(inline)
+		self.cache.drop_raw = True
+		self.assertEqual(1, self.cache.move_raw())
+
+
+if __name__ == '__main__':
+	unittest.main()
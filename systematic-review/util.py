@@ -1,8 +1,15 @@
+import asyncio
+import collections
+import copyreg
+import functools
+import itertools
 import logging
 import re
 import string
+import sys
 import unicodedata as ud
-from typing import Optional
+from concurrent.futures import Executor
+from typing import AsyncIterable, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
 
 
 def rm_diacritics_char(char):
@@ -21,8 +28,36 @@ def rm_diacritics_char(char):
 	return char
 
 
+class _TranslationTable(dict):
+	"""
+	Table for `str.translate` filled on first use of each character, the Latin blocks are
+	precomputed. Characters without a name raise ValueError, like `rm_diacritics_char`.
+	"""
+
+	def __init__(self, remove: str = ''):
+		super().__init__()
+		self.remove = set(remove)
+		for code in range(0x250):
+			try:
+				self[code]
+			except ValueError:
+				pass  # control characters have no name
+
+	def __missing__(self, code: int) -> Optional[str]:
+		char = rm_diacritics_char(chr(code))
+		value = None if char in self.remove else char
+		self[code] = value
+		return value
+
+
+_DIACRITICS = _TranslationTable()
+_DIACRITICS_PUNCTUATION = _TranslationTable(remove=string.punctuation)
+_PUNCTUATION = str.maketrans('', '', string.punctuation)
+_SPACES = re.compile(' +')
+
+
 def rm_diacritics(text: str):
-	return "".join([rm_diacritics_char(x) for x in text])
+	return text.translate(_DIACRITICS)
 
 
 def get_logger_child(name: str, logger: logging.Logger = None) -> logging.Logger:
@@ -33,14 +68,184 @@ def get_logger_child(name: str, logger: logging.Logger = None) -> logging.Logger
 
 
 def format_text(text: Optional[str]) -> Optional[str]:
-	return re.sub(' +', ' ', text.strip().replace('\n', ' ')) if text is not None else None
+	if text is None:
+		return None
+	text = text.strip().replace('\n', ' ')
+	return _SPACES.sub(' ', text) if '  ' in text else text
 
 
+@functools.lru_cache(maxsize=1 << 16)
 def normalize_text(text: str) -> str:
-	return rm_diacritics(format_text(text.strip().lower())).translate(
-		str.maketrans('', '', string.punctuation)
-	)
+	"""
+	Lower case text without diacritics, punctuation and repeated spaces.
+	Memoized, titles and names repeat a lot between sources and merges.
+	"""
+	text = format_text(text.strip().lower())
+	# Printable ASCII has no diacritics, a plain table is faster
+	return text.translate(_PUNCTUATION if text.isascii() and text.isprintable() else _DIACRITICS_PUNCTUATION)
+
+
+def normalize_texts(texts: Iterable[str]) -> List[str]:
+	"""
+	Normalizes a batch of texts, each distinct text only once.
+	"""
+	normalized: Dict[str, str] = {}
+	resp = []
+	for text in texts:
+		if text not in normalized:
+			normalized[text] = normalize_text(text)
+		resp.append(normalized[text])
+	return resp
 
 
 def empty_text(text: str) -> bool:
 	return not text or (len(text.strip()) == 0)
+
+
+def intern_text(text: Optional[str]) -> Optional[str]:
+	"""
+	The interned copy of the text, so repeated values like journals and author names are stored once.
+	"""
+	return sys.intern(text) if type(text) is str else text
+
+
+class Slotted(object):
+	"""
+	Base for the classes with `__slots__`. They are pickled with the dict of attributes, the same state
+	of the classes with a `__dict__`, so caches written before and after the slots load with each other.
+	"""
+	__slots__ = ()
+	__slot_names: Dict[type, Tuple[str, ...]] = {}
+
+	@classmethod
+	def slot_names(cls) -> Tuple[str, ...]:
+		resp = Slotted.__slot_names.get(cls)
+		if resp is None:
+			resp = Slotted.__slot_names[cls] = tuple(
+				# Private names are mangled, like _Article__title
+				f"_{klass.__name__.lstrip('_')}{it}" if it.startswith('__') and not it.endswith('__') else it
+				for klass in reversed(cls.__mro__) for it in getattr(klass, '__slots__', ())
+			)
+		return resp
+
+	def __getstate__(self) -> Dict[str, object]:
+		return {key: getattr(self, key) for key in self.slot_names() if hasattr(self, key)}
+
+	def __reduce_ex__(self, protocol):
+		# Pickled as (None, attributes), which the __dict__ classes load too, and which tells on load
+		# that the strings were interned when pickled and are already shared by the pickle memo
+		return copyreg.__newobj__, (type(self),), (None, self.__getstate__())
+
+	def __setstate__(self, state):
+		names = self.slot_names()
+		if type(state) is tuple and not state[0] and len(state[1]) == len(names):
+			# Pickled by these classes with every attribute set, the common case, kept short
+			for key, value in state[1].items():
+				object.__setattr__(self, key, value)
+			return
+		compact = type(state) is not tuple
+		if not compact:
+			state = {**(state[0] or {}), **(state[1] or {})}
+		# Attributes added after the state was pickled are None
+		for key in names:
+			object.__setattr__(self, key, state.get(key))
+		if compact:
+			self._compact()
+
+	def _compact(self):
+		"""
+		Interns the repeated strings of the state pickled by the __dict__ classes, after it is loaded.
+		"""
+
+
+async def iterate_blocking(factory: Callable[[], Iterable], executor: Executor, queue_size: int = 10) -> AsyncIterable:
+	"""
+	Creates a blocking iterable and takes its items one call at a time in the workers of the executor,
+	up to `queue_size` items ahead of the consumer. A worker is only held for the call, never while
+	the consumer is behind, so a bounded pool can serve more iterables than it has workers.
+	"""
+	loop = asyncio.get_event_loop()
+	queue = asyncio.Queue(maxsize=max(1, queue_size))
+	done = object()
+
+	async def produce():
+		try:
+			iterator = iter(await loop.run_in_executor(executor, factory))
+			while True:
+				item = await loop.run_in_executor(executor, next, iterator, done)
+				await queue.put((item, None))
+				if item is done:
+					return
+		except Exception as e:
+			await queue.put((done, e))
+
+	producer = asyncio.ensure_future(produce())
+	try:
+		while True:
+			item, error = await queue.get()
+			if error:
+				raise error
+			if item is done:
+				break
+			yield item
+	finally:
+		producer.cancel()
+
+
+def batched(iterable: Iterable, size: int) -> Iterable[List]:
+	"""
+	The items in lists of up to `size`.
+	"""
+	iterator = iter(iterable)
+	while True:
+		batch = list(itertools.islice(iterator, size))
+		if not batch:
+			return
+		yield batch
+
+
+async def to_async(iterable: Iterable) -> AsyncIterable:
+	for item in iterable:
+		yield item
+
+
+async def enumerate_async(iterable: AsyncIterable, start: int = 0) -> AsyncIterable[Tuple[int, object]]:
+	async for it in iterable:
+		yield start, it
+		start += 1
+
+
+async def prefetch(awaitables: Iterable[Awaitable], window: int) -> AsyncIterable:
+	"""
+	Runs up to `window` of the awaitables at the same time, yielding their results in order.
+	"""
+	pending = collections.deque()
+	try:
+		for awaitable in awaitables:
+			pending.append(asyncio.ensure_future(awaitable))
+			if len(pending) >= max(1, window):
+				yield await pending.popleft()
+		while pending:
+			yield await pending.popleft()
+	finally:
+		for future in pending:
+			future.cancel()
+
+
+async def prefetch_unordered(awaitables: Iterable[Awaitable], window: int) -> AsyncIterable:
+	"""
+	Runs up to `window` of the awaitables at the same time, yielding their results as they complete.
+	The next awaitable is only started when one completes, so a slow consumer holds back the producer.
+	"""
+	awaitables = iter(awaitables)
+	pending = {asyncio.ensure_future(it) for it in itertools.islice(awaitables, max(1, window))}
+	try:
+		while pending:
+			done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+			for future in done:
+				for awaitable in itertools.islice(awaitables, 1):
+					pending.add(asyncio.ensure_future(awaitable))
+				yield future.result()
+	finally:
+		for future in pending:
+			future.cancel()
@@ -0,0 +1,86 @@
+import argparse
+import random
+import re
+import string
+import time
+import unicodedata as ud
+from typing import List
+from util import normalize_text, normalize_texts
+
+
+def legacy_rm_diacritics_char(char):
+	desc = ud.name(char)
+	cutoff = desc.find(' WITH ')
+	if cutoff != -1:
+		desc = desc[:cutoff]
+		try:
+			char = ud.lookup(desc)
+		except KeyError:
+			pass
+	return char
+
+
+def legacy_normalize_text(text: str) -> str:
+	"""
+	`normalize_text` before the translation table, calling `unicodedata` for every character.
+	"""
+	text = text.strip().lower()
+	text = re.sub(' +', ' ', text.strip().replace('\n', ' '))
+	return "".join([legacy_rm_diacritics_char(x) for x in text]).translate(
+		str.maketrans('', '', string.punctuation)
+	)
+
+
+WORDS = (
+	"Byzantine fault-tolerant consensus for Ação em Sistemas Distribuídos: uma análise; Über die "
+	"Zuverlässigkeit of blockchain (smart) contracts, façade niño Øresund Łódź crème brûlée "
+	"state-machine replication at scale — a survey of \"asynchronous\" protocols!"
+).split(' ')
+
+
+def generate_titles(size: int, distinct: float, seed: int = 42) -> List[str]:
+	randomizer = random.Random(seed)
+	titles = [
+		'  '.join(randomizer.choice(WORDS) for _ in range(randomizer.randint(4, 14))) + ('\n' if i % 7 == 0 else '')
+		for i in range(max(1, int(size * distinct)))
+	]
+	return [titles[i % len(titles)] for i in range(size)]
+
+
+def timed(name: str, run, size: int) -> float:
+	start = time.perf_counter()
+	run()
+	elapsed = time.perf_counter() - start
+	print(f"{name}: {elapsed:.3f}s, {size / elapsed:,.0f} titles/s")
+	return elapsed
+
+
+def parse_args():
+	parser = argparse.ArgumentParser(description='normalize_text benchmark')
+	parser.add_argument('--size', default=1000000, type=int, help='Number of titles')
+	parser.add_argument(
+		'--distinct', default=0.2, type=float, help='Fraction of distinct titles, the others are repeated',
+	)
+	return parser.parse_args()
+
+
+def main():
+	args = parse_args()
+	titles = generate_titles(args.size, args.distinct)
+	print(f"{len(titles):,} titles, {len(set(titles)):,} distinct")
+
+	legacy = []
+	legacy_time = timed('legacy normalize_text', lambda: legacy.extend(legacy_normalize_text(it) for it in titles), len(titles))
+	normalize_text.cache_clear()
+	current = []
+	current_time = timed('normalize_text', lambda: current.extend(normalize_text(it) for it in titles), len(titles))
+	normalize_text.cache_clear()
+	batch = []
+	batch_time = timed('normalize_texts', lambda: batch.extend(normalize_texts(titles)), len(titles))
+	if legacy != current or legacy != batch:
+		raise AssertionError("normalize_text output differs from the legacy implementation")
+	print(f"Identical output, speedup: {legacy_time / current_time:.1f}x, batch: {legacy_time / batch_time:.1f}x")
+
+
+if __name__ == '__main__':
+	main()
@@ -1,5 +1,12 @@
+import asyncio
+import time
 import unittest
-from util import rm_diacritics, rm_diacritics_char
+from concurrent.futures import ThreadPoolExecutor
+from util import rm_diacritics, rm_diacritics_char, iterate_blocking, normalize_text, normalize_texts
+from util_benchmark import generate_titles, legacy_normalize_text
+
+loop = asyncio.get_event_loop()
+asyncio.set_event_loop(loop)
 
 
 class UtilTest(unittest.TestCase):
@@ -11,6 +18,51 @@ class UtilTest(unittest.TestCase):
 		self.assertEqual("agua", rm_diacritics("água"))
 		self.assertEqual("cachaca", rm_diacritics("cachaça"))
 
+	def test_normalize_text(self):
+		self.assertEqual("agua e cachaca", normalize_text("  Água   e\nCachaça! "))
+		self.assertEqual("new bft", normalize_text("New BFT"))
+		titles = generate_titles(2000, 0.5) + ["Łódź — Øresund", "ǅemal ﬁ", "İstanbul", ""]
+		self.assertEqual([legacy_normalize_text(it) for it in titles], [normalize_text(it) for it in titles])
+		self.assertEqual([legacy_normalize_text(it) for it in titles], normalize_texts(titles))
+
+
+class IterateBlockingTest(unittest.TestCase):
+	def test_items_in_order(self):
+		def blocking():
+			for i in range(5):
+				time.sleep(0.01)
+				yield i
+
+		async def the_test():
+			with ThreadPoolExecutor(max_workers=1) as executor:
+				return [it async for it in iterate_blocking(blocking, executor, queue_size=2)]
+
+		self.assertEqual([0, 1, 2, 3, 4], loop.run_until_complete(the_test()))
+
+	def test_error_is_raised(self):
+		def blocking():
+			yield 1
+			raise ValueError("blocking error")
+
+		async def the_test():
+			with ThreadPoolExecutor(max_workers=1) as executor:
+				return [it async for it in iterate_blocking(blocking, executor)]
+
+		with self.assertRaises(ValueError):
+			loop.run_until_complete(the_test())
+
+	def test_stop_early(self):
+		async def the_test():
+			with ThreadPoolExecutor(max_workers=1) as executor:
+				items = iterate_blocking(lambda: iter(range(1000)), executor, queue_size=1)
+				async for it in items:
+					if it == 2:
+						break
+				await items.aclose()
+			return it
+
+		self.assertEqual(2, loop.run_until_complete(the_test()))
+
 
 if __name__ == '__main__':
 	unittest.main()